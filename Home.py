@@ -1,6 +1,7 @@
 # Home.py
 import streamlit as st
 from utils.auth import role_country_selector
+from services.warmup import start_warmup, warmup_progress, warmup_status
 
 st.set_page_config(page_title="Corpus AI | Piloto Aseguradoras", page_icon="💚", layout="wide")
 
@@ -8,6 +9,7 @@ st.title("Corpus AI — Piloto de Interacciones (Aseguradoras)")
 st.write("Explora 4 aproximaciones de interfaz enfocadas en clientes **EPS (Colombia)** / **SGMM (México)**.")
 
 country, role = role_country_selector()
+start_warmup()  # precarga poblaciones de Dashboard/Worklist/Simulador en segundo plano
 
 st.markdown("""
 ### Módulos
@@ -19,3 +21,15 @@ st.markdown("""
 
 st.info(f"Contexto actual: **{country}** | Rol simulado: **{role}**. (Datos sintéticos)")
 st.caption("Nota: Este piloto no usa datos reales ni se conecta a una API de backend.")
+
+with st.sidebar.expander("Precarga de datos", expanded=False):
+    prog = warmup_progress()
+    st.progress(prog, text=f"{prog:.0%} de poblaciones listas")
+    for r in warmup_status():
+        st.caption(f"{r['página']} · {r['país']}: {r['estado']} ({r['segundos']:.1f}s)")
+    from services.shared_dirs import status as shared_status
+    for r in shared_status():
+        if r["vigente"]:
+            st.caption(f"↳ compartida {r['dataset']}: {r['MB']:.1f} MB, {r['procesos']} proceso(s)")
+    if prog < 1.0:
+        st.button("Actualizar estado")
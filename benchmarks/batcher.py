@@ -0,0 +1,132 @@
+# benchmarks/batcher.py
+# ---------------------------------------------------------------------
+# Cotizaciones/s y latencia p50/p99 de score_one bajo concurrencia:
+# directo (una fila por llamada) vs micro-batching (services/batcher.py).
+# Antes de medir verifica que un batch mixto (payloads con distintas
+# claves) da, fila por fila, lo mismo que score_row por separado, y que
+# un payload inválido en el batch sólo falla su propio request.
+#   python -m benchmarks.batcher
+#   python -m benchmarks.batcher --clients 64 --requests 20 --window-ms 2,5,10
+# ---------------------------------------------------------------------
+
+import argparse
+import sys
+import threading
+import time
+from typing import Callable, Dict, List
+
+import numpy as np
+
+from services import batcher
+from services.data_io import generate_dummy_population
+from services.risk_api import score_one as score_one_direct
+from services.risk_api import score_row
+
+CHECK_FIELDS = ("risk_factor", "care_gaps", "cohort_label", "top_features")   # sin el jitter de la curva
+
+
+def load(fn: Callable, payloads: List[dict], clients: int, per_client: int) -> Dict:
+    """`clients` hilos lanzan `per_client` requests cada uno, sin pausa."""
+    lat: List[float] = []
+    lock = threading.Lock()
+    barrier = threading.Barrier(clients + 1)
+
+    def worker(w: int):
+        mine = []
+        barrier.wait()
+        for j in range(per_client):
+            p = payloads[(w * per_client + j) % len(payloads)]
+            t0 = time.perf_counter()
+            fn(p)
+            mine.append(time.perf_counter() - t0)
+        with lock:
+            lat.extend(mine)
+
+    threads = [threading.Thread(target=worker, args=(w,)) for w in range(clients)]
+    for t in threads:
+        t.start()
+    barrier.wait()
+    t0 = time.perf_counter()
+    for t in threads:
+        t.join()
+    dt = time.perf_counter() - t0
+    ms = np.asarray(lat) * 1e3
+    return {"qps": len(lat) / dt, "p50_ms": float(np.percentile(ms, 50)),
+            "p99_ms": float(np.percentile(ms, 99))}
+
+def check_mixed(payloads: List[dict], seed: int = 0) -> int:
+    """Batch con claves faltantes al azar vs score_row fila a fila -> filas distintas."""
+    rng = np.random.default_rng(seed)
+    mixed = [{k: v for k, v in p.items() if k in ("age", "sex", "region") or rng.random() < 0.6}
+             for p in payloads]
+    batched = batcher._score_payloads(mixed)
+    bad = 0
+    for p, got in zip(mixed, batched):
+        ref = score_row(p)
+        if any(got[f] != ref[f] for f in CHECK_FIELDS if f != "risk_factor") or \
+                not np.isclose(got["risk_factor"], ref["risk_factor"], rtol=0, atol=1e-12):
+            bad += 1
+    return bad
+
+def check_bad_payload(payloads: List[dict]) -> List[str]:
+    """
+    Buenos + uno inválido coalescidos en un batch: los buenos como
+    score_row, el inválido con la misma excepción que score_one directo.
+    """
+    good = payloads[:2]
+    bad = dict(payloads[2], age="abc")
+    try:
+        score_one_direct(bad)
+        expected = None
+    except Exception as e:
+        expected = type(e)
+    b = batcher.MicroBatcher(batcher._score_payloads, window_ms=200, name="check-batcher")
+    futs = [b.submit(p) for p in (good[0], bad, good[1])]      # misma ventana: un solo batch
+    problems = []
+    for i, (p, fut) in enumerate(zip((good[0], bad, good[1]), futs)):
+        err = fut.exception(timeout=60)
+        if p is bad:
+            if expected is None or not isinstance(err, expected):
+                problems.append(f"inválido: {err!r} (directo: {expected and expected.__name__})")
+        elif err is not None:
+            problems.append(f"payload {i} falló por el inválido: {err!r}")
+        elif not np.isclose(fut.result()["risk_factor"], score_row(p)["risk_factor"], rtol=0, atol=1e-12):
+            problems.append(f"payload {i}: riesgo distinto de score_row")
+    if b.stats()["batches"] != 1:
+        problems.append(f"no se coalescieron ({b.stats()['batch_size_hist']})")
+    return problems
+
+def _row(label: str, r: Dict, extra: str = "") -> str:
+    return f"  {label:<22} {r['qps']:>9,.0f} cot/s   p50={r['p50_ms']:7.2f} ms   p99={r['p99_ms']:7.2f} ms  {extra}"
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description="Micro-batching de score_one bajo carga.")
+    ap.add_argument("--clients", type=int, default=32)
+    ap.add_argument("--requests", type=int, default=20, help="Requests por cliente.")
+    ap.add_argument("--window-ms", default="2,5")
+    ap.add_argument("--max-batch", type=int, default=batcher.MAX_BATCH)
+    args = ap.parse_args(argv)
+
+    payloads = generate_dummy_population(n=1000, country="México - SGMM", seed=1).to_dict("records")
+    bad = check_mixed(payloads[:200])
+    print(f"batch mixto vs score_row: {'OK' if not bad else f'{bad} filas distintas'}")
+    if bad:
+        return 1
+    problems = check_bad_payload(payloads)
+    print(f"payload inválido en el batch: {'OK (sólo falla el suyo)' if not problems else '; '.join(problems)}")
+    if problems:
+        return 1
+    print(f"clientes={args.clients} requests/cliente={args.requests}")
+    print(_row("directo", load(score_one_direct, payloads, args.clients, args.requests)))
+    for w in (float(x) for x in args.window_ms.split(",")):
+        b = batcher.configure(window_ms=w, max_batch=args.max_batch)
+        b.reset_stats()
+        r = load(batcher.score_one, payloads, args.clients, args.requests)
+        s = b.stats()
+        print(_row(f"batch window={w:g}ms", r,
+                   f"batch medio={s['mean_batch']:.1f}  cola máx={s['max_queue_depth']}"))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
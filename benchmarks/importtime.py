@@ -0,0 +1,138 @@
+# benchmarks/importtime.py
+# ---------------------------------------------------------------------
+# Auditoría de tiempo de import por página (`python -X importtime`).
+# Para cada página toma los imports de nivel superior (los que corren en
+# el primer paint, incluidos los anidados en bloques `with` / `try` del
+# script, p.ej. dentro de un expander) y los ejecuta en un proceso
+# limpio; los de funciones o ramas `if` quedan fuera. Reporta el tiempo
+# acumulado, los módulos pesados cargados (pandas, numpy, altair,
+# pyarrow) y compara contra benchmarks/importtime_budget.json.
+#
+#   python -m benchmarks.importtime                 # audita y valida budget
+#   python -m benchmarks.importtime --save-budget   # fija budget = medido × 1.5
+# ---------------------------------------------------------------------
+
+import argparse
+import ast
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+from typing import Dict, List
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+BUDGET_PATH = os.path.join(HERE, "importtime_budget.json")
+
+PAGES = [
+    "Home.py",
+    "pages/1_Dashboard.py",
+    "pages/2_Worklist.py",
+    "pages/3_Suscripcion.py",
+    "pages/4_Simulador.py",
+    "pages/5_Generador_CSV.py",
+]
+HEAVY = ("pandas", "numpy", "altair", "pyarrow")
+_LINE = re.compile(r"import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)")
+
+
+def _unconditional(body) -> List[ast.stmt]:
+    """Sentencias que corren siempre: el cuerpo más los bloques with / try."""
+    out = []
+    for node in body:
+        out.append(node)
+        if isinstance(node, ast.With):
+            out.extend(_unconditional(node.body))
+        elif isinstance(node, ast.Try):
+            out.extend(_unconditional(node.body + node.finalbody))
+    return out
+
+def top_level_imports(path: str) -> List[str]:
+    """Sentencias import que corren en cada ejecución del script (no las de funciones / ramas)."""
+    with open(os.path.join(ROOT, path), encoding="utf-8") as f:
+        tree = ast.parse(f.read())
+    stmts = []
+    for node in _unconditional(tree.body):
+        if isinstance(node, (ast.Import, ast.ImportFrom)):
+            stmts.append(ast.unparse(node))
+    return stmts
+
+def measure(stmts: List[str]) -> Dict:
+    """Ejecuta los imports con -X importtime en un proceso nuevo."""
+    code = "\n".join(stmts) or "pass"
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=ROOT, capture_output=True, text=True,
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(proc.stderr[-2000:])
+    total_us, loaded = 0, set()
+    for line in proc.stderr.splitlines():
+        m = _LINE.match(line)
+        if not m:
+            continue
+        cumulative, indent, name = int(m.group(2)), len(m.group(3)), m.group(4)
+        if indent == 1:  # módulo importado directamente (nivel superior)
+            total_us += cumulative
+        loaded.add(name.split(".")[0])
+    return {"total_ms": total_us / 1e3, "heavy": sorted(loaded.intersection(HEAVY))}
+
+def audit(repeat: int = 3) -> Dict[str, Dict]:
+    out = {}
+    for page in PAGES:
+        stmts = top_level_imports(page)
+        runs = [measure(stmts) for _ in range(repeat)]
+        out[page] = {
+            "total_ms": statistics.median(r["total_ms"] for r in runs),
+            "heavy": runs[0]["heavy"],
+        }
+    return out
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description="Budget de import por página (-X importtime).")
+    ap.add_argument("--repeat", type=int, default=3)
+    ap.add_argument("--budget", default=BUDGET_PATH)
+    ap.add_argument("--save-budget", action="store_true")
+    ap.add_argument("--slack", type=float, default=1.5, help="Factor de holgura al guardar el budget.")
+    args = ap.parse_args(argv)
+
+    res = audit(args.repeat)
+    for page, r in res.items():
+        print(f"{page:<26} {r['total_ms']:8.1f} ms   pesados: {', '.join(r['heavy']) or '—'}")
+
+    if args.save_budget:
+        budget = {p: {"max_ms": round(r["total_ms"] * args.slack, 1), "heavy": r["heavy"]}
+                  for p, r in res.items()}
+        with open(args.budget, "w", encoding="utf-8") as f:
+            json.dump(budget, f, indent=2, ensure_ascii=False)
+        print(f"Budget guardado: {args.budget}")
+        return 0
+
+    if not os.path.exists(args.budget):
+        print("Sin budget; usa --save-budget para crearlo.")
+        return 0
+    with open(args.budget, encoding="utf-8") as f:
+        budget = json.load(f)
+    failures = []
+    for page, r in res.items():
+        b = budget.get(page)
+        if not b:
+            continue
+        if r["total_ms"] > b["max_ms"]:
+            failures.append(f"{page}: {r['total_ms']:.1f} ms > budget {b['max_ms']:.1f} ms")
+        extra = set(r["heavy"]) - set(b.get("heavy", []))
+        if extra:
+            failures.append(f"{page}: importa módulos pesados nuevos: {', '.join(sorted(extra))}")
+    if failures:
+        print("\nFuera de budget:")
+        for f_ in failures:
+            print("  -", f_)
+        return 1
+    print("Dentro de budget.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,158 @@
+# benchmarks/kernels.py
+# ---------------------------------------------------------------------
+# Kernels fusionados (utils/kernels.py): equivalencia + tiempos.
+#   python -m benchmarks.kernels                    # n = 1e5, 1e6
+#   python -m benchmarks.kernels --sizes 1e6,1e7
+# 1) Equivalencia: el cuerpo del kernel (Numba compilado si está
+#    disponible; si no, el mismo código en Python puro sobre una muestra
+#    chica) contra el fallback NumPy, y `grouped` contra pandas groupby.
+#    Sale con código 1 si alguna diferencia supera la tolerancia.
+# 2) Tiempos por backend disponible: score_curves y los groupbys del
+#    Dashboard (grouped vs. pandas). score_batch completo está en
+#    benchmarks.run (lo domina armar los records, no el kernel).
+# ---------------------------------------------------------------------
+
+import argparse
+import statistics
+import sys
+import time
+from typing import Callable, List
+
+import numpy as np
+import pandas as pd
+
+from services.data_io import LazyPopulation
+from services.risk_api import score_batch
+from utils import kernels
+from utils.chart_data import add_dashboard_bands, grouped
+
+TOL = 1e-12
+MONTHS = np.arange(1, 13, dtype=float)
+CUTS = np.array([0.15, 0.35, 0.55, 0.75])
+KVALS = np.array([1.35, 1.10, 1.00, 0.90, 0.80])
+
+
+def _inputs(n: int, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    X = np.column_stack([rng.uniform(18, 90, n), rng.normal(28, 4.5, n), rng.integers(0, 2, n),
+                         rng.normal(6.8, 1.6, n), rng.normal(78, 25, n)] +
+                        [rng.integers(0, 2, n) for _ in range(4)] +
+                        [rng.integers(0, 15, n), rng.integers(1, 24, n)]).astype(float)
+    w = np.array([0.03, 0.05, 0.6, 0.25, -0.02, 0.4, 0.5, 0.6, 0.8, 0.08, 0.03])
+    return (X, w, -3.2, rng.normal(0, 0.1, n), 1.2, (0.0, 0.92), rng.normal(0, 0.03, n),
+            CUTS, KVALS, MONTHS)
+
+def _reference(args):
+    """Cuerpo del kernel: compilado con Numba o, sin Numba, en Python puro."""
+    X = args[0]
+    n = X.shape[0]
+    out, cum = np.empty((5, n)), np.empty((n, len(MONTHS)))
+    a = (args[1], float(args[2]), args[3], float(args[4]), float(args[5][0]), float(args[5][1]),
+         args[6], args[7], args[8], args[9])
+    if kernels.backend() == "numba":
+        kernels._jit(kernels._score_curves_factory)(X, *a, out, cum)
+    else:
+        kernels._score_curves_kernel(X, *a, out, cum)
+    return {"risk": out[0], "k": out[1], "lam": out[2], "cum": cum, "tw_start": out[3], "tw_end": out[4]}
+
+def check_equivalence(n: int) -> List[str]:
+    errors = []
+    args = _inputs(n)
+    ref = _reference(args)
+    prev = kernels.backend()
+    kernels.set_backend("numpy")
+    npy = kernels.score_curves(*args)
+    for k in ref:
+        d = float(np.max(np.abs(ref[k] - npy[k])))
+        print(f"  score_curves.{k:<9} max|Δ| = {d:.2e}")
+        if not d <= TOL:
+            errors.append(f"score_curves.{k}: {d:.2e}")
+
+    rng = np.random.default_rng(1)
+    codes = rng.integers(-1, 15, n)
+    vals = np.where(rng.random(n) < 0.01, np.nan, rng.random(n))
+    wts = rng.uniform(0.5, 2.0, n)
+    part = np.zeros((3, 3, 15))
+    npy = kernels.group_sums(codes, 15, vals, wts)
+    kernels.set_backend(prev)
+    if kernels.backend() == "numba":
+        kernels._jit(kernels._group_sums_factory)(codes, 15, vals, wts, 3, part)
+    else:
+        kernels._group_sums_kernel(codes, 15, vals, wts, 3, part)
+    for j, k in enumerate(["size", "vsum", "vn"]):
+        d = float(np.max(np.abs(part.sum(axis=0)[j] - npy[k])))
+        print(f"  group_sums.{k:<11} max|Δ| = {d:.2e}")
+        if not d <= 1e-9:
+            errors.append(f"group_sums.{k}: {d:.2e}")
+
+    df = pd.DataFrame({"region": rng.choice(["A", "B", "C"], n), "risk_factor": vals,
+                       "has_gap": rng.random(n) < 0.4})
+    df["risk_band"] = pd.cut(df["risk_factor"], [0, 0.15, 0.3, 1.0], include_lowest=True)
+    g = grouped(df, ["risk_band", "has_gap"], value="risk_factor")
+    p = df.groupby(["risk_band", "has_gap"], as_index=False, observed=False).agg(
+        size=("risk_factor", "size"), mean=("risk_factor", "mean"))
+    same = g[["size"]].equals(p[["size"]]) and np.allclose(g["mean"], p["mean"], equal_nan=True)
+    print(f"  grouped vs pandas      {'OK' if same else 'DIFIERE'}")
+    if not same:
+        errors.append("grouped != pandas groupby")
+
+    # claves no categóricas: pandas devuelve sólo las combinaciones observadas
+    plain = pd.DataFrame({"region": rng.choice(["A", "B", "C"], 30), "band": rng.integers(0, 6, 30),
+                          "risk_factor": rng.random(30)})
+    g = grouped(plain, ["region", "band"], value="risk_factor")
+    p = plain.groupby(["region", "band"], as_index=False, observed=False).agg(
+        size=("risk_factor", "size"), mean=("risk_factor", "mean"))
+    same = g[["region", "band", "size"]].equals(p[["region", "band", "size"]]) and np.allclose(g["mean"], p["mean"])
+    print(f"  grouped (sin categ.)   {'OK' if same else 'DIFIERE'}")
+    if not same:
+        errors.append("grouped (claves planas) != pandas groupby")
+    return errors
+
+def _median(fn: Callable, repeat: int = 3) -> float:
+    fn()
+    ts = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        ts.append(time.perf_counter() - t0)
+    return statistics.median(ts)
+
+def timings(n: int, backends: List[str]) -> None:
+    args = _inputs(n)
+    raw = LazyPopulation(n, "Colombia - EPS", seed=42).materialize()
+    scored = add_dashboard_bands(score_batch(raw, seed=1)[0])
+    keys = ["risk_band", "has_gap"]
+    pandas_s = _median(lambda: scored.groupby(keys, observed=False)["risk_factor"]
+                       .agg(["size", "mean"]).reset_index())
+    for b in backends:
+        kernels.set_backend(b)
+        print(f"  [{b:<5}] n={n:>10,}  score_curves={_median(lambda: kernels.score_curves(*args))*1e3:9.1f} ms"
+              f"  grouped={_median(lambda: grouped(scored, keys, value='risk_factor'))*1e3:7.1f} ms"
+              f"  (pandas {pandas_s*1e3:.1f} ms)")
+    kernels.set_backend(None)
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description="Kernels Numba vs NumPy: equivalencia y tiempos.")
+    ap.add_argument("--sizes", default="1e5,1e6")
+    ap.add_argument("--check-n", type=int, default=2_000,
+                    help="Filas de la comprobación (Python puro si no hay Numba).")
+    args = ap.parse_args(argv)
+
+    backends = ["numpy"] + (["numba"] if kernels.set_backend("numba") == "numba" else [])
+    kernels.set_backend(None)
+    print(f"backend por defecto: {kernels.backend()}  (disponibles: {', '.join(backends)})")
+    print(f"Equivalencia kernel ({'numba' if 'numba' in backends else 'Python puro'}) vs NumPy:")
+    kernels.set_backend(backends[-1])                 # compilado si hay Numba, aunque no sea el defecto
+    errors = check_equivalence(args.check_n if backends[-1] != "numba" else 200_000)
+    kernels.set_backend(None)
+    print("Tiempos:")
+    for n in (int(float(x)) for x in args.sizes.split(",") if x.strip()):
+        timings(n, backends)
+    if errors:
+        print("Fallas de equivalencia:\n  " + "\n  ".join(errors))
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
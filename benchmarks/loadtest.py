@@ -0,0 +1,408 @@
+# benchmarks/loadtest.py
+# ---------------------------------------------------------------------
+# Prueba de carga: N sesiones simuladas concurrentes (hilos, un mismo
+# proceso como el servidor de Streamlit) recorriendo Home + páginas 1–5
+# con streamlit.testing.v1.AppTest e interacciones realistas:
+#   filtros de cohorte, cambio de país (role_country_selector), barrido
+#   de sliders del Simulador, cotización y generación de CSV.
+# Por página: latencia de rerun p50/p95/p99, reruns/s y RSS del proceso.
+#   python -m benchmarks.loadtest                          # 4 sesiones × 1 ronda
+#   python -m benchmarks.loadtest --sessions 16 --rounds 3 --label v42
+#   python -m benchmarks.loadtest --compare benchmarks/results/loadtest_v41.json
+# Guarda benchmarks/results/loadtest_<label>.json (para comparar versiones).
+#
+# AppTest instala un Runtime simulado global en cada run() y lo borra al
+# terminar, y Streamlit cachea la lista de páginas en un global sin
+# distinguir el script principal; para correr sesiones en paralelo se
+# comparte UN runtime simulado y la lista de páginas se cachea por
+# script (_share_runtime, que restaura todo al terminar la carga). Cada
+# sesión tiene su propio session_state.
+# Quedan otros globals de AppTest no pensados para hilos: con muchas
+# páginas distintas en paralelo, ocasionalmente un widget no aparece en
+# el árbol (KeyError); se re-renderiza y reintenta una vez (_apply) y, si
+# persiste, cuenta como error de la página (error_samples lo muestra).
+# Una interacción cuyo widget no está en la página se omite y se reporta
+# por página y paso (skipped). Antes de la carga, check_progressive
+# verifica que el modo progresivo del Dashboard no deje elementos de la
+# vista aproximada junto a los exactos.
+# ---------------------------------------------------------------------
+
+import argparse
+import json
+import os
+import random
+import resource
+import sys
+import threading
+import time
+import traceback
+from collections import Counter
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from benchmarks.run import environment  # noqa: E402
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+RESULTS_DIR = os.path.join(HERE, "results")
+COUNTRIES = ["México - SGMM", "Colombia - EPS"]
+
+
+# ---------------------------
+# Runtime compartido (AppTest concurrente)
+# ---------------------------
+@contextmanager
+def _share_runtime():
+    from unittest.mock import MagicMock
+
+    from streamlit import source_util
+    from streamlit.runtime import Runtime
+    from streamlit.runtime.caching.storage.dummy_cache_storage import MemoryCacheStorageManager
+    from streamlit.runtime.media_file_manager import MediaFileManager
+    from streamlit.runtime.memory_media_file_storage import MemoryMediaFileStorage
+    from streamlit.testing.v1.util import patch_config_options
+
+    shared = MagicMock(spec=Runtime)
+    shared.media_file_mgr = MediaFileManager(MemoryMediaFileStorage("/mock/media"))
+    shared.cache_storage_manager = MemoryCacheStorageManager()
+    saved = {"instance": Runtime.__dict__["instance"], "exists": Runtime.__dict__["exists"]}
+    get_pages, by_script = source_util.get_pages, {}
+
+    def pages_for(main_script_path):
+        pages = by_script.get(main_script_path)
+        if pages is None:
+            with source_util._pages_cache_lock:
+                source_util._cached_pages = None
+                pages = by_script[main_script_path] = dict(get_pages(main_script_path))
+                source_util._cached_pages = None
+        return pages
+
+    Runtime.instance = classmethod(lambda cls: shared)
+    Runtime.exists = classmethod(lambda cls: True)
+    source_util.get_pages = pages_for
+    try:
+        with patch_config_options({"global.appTest": True}):   # activo para todas las sesiones
+            yield
+    finally:
+        for name, attr in saved.items():
+            setattr(Runtime, name, attr)
+        source_util.get_pages = get_pages
+        with source_util._pages_cache_lock:
+            source_util._cached_pages = None
+
+def rss_bytes() -> int:
+    """RSS actual del proceso (Linux: /proc; si no, el pico de getrusage)."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024
+
+
+# ---------------------------
+# Escenarios por página
+# ---------------------------
+def _widget(at, kind: str, label: str):
+    for w in getattr(at, kind):
+        if w.label == label:
+            return w
+    return None
+
+def _set(kind: str, label: str, value) -> Callable:
+    def step(at):
+        w = _widget(at, kind, label)
+        if w is None:
+            return False
+        w.set_value(value)
+        return True
+    step.__name__ = f"{kind}:{label}"
+    return step
+
+def _click(label: str) -> Callable:
+    def step(at):
+        w = _widget(at, "button", label)
+        if w is None:
+            return False
+        w.click()
+        return True
+    step.__name__ = f"click:{label}"
+    return step
+
+def _switch_country(at):
+    w = at.selectbox(key="country_select")
+    w.set_value(COUNTRIES[1 - COUNTRIES.index(w.value)])
+    return True
+
+def _switch_role(at):
+    w = at.selectbox(key="role_select")
+    w.set_value(next(o for o in w.options if o != w.value))
+    return True
+
+def _cohort_steps(rng: random.Random) -> List[Callable]:
+    lo = rng.choice([18, 30, 40, 50])
+    return [
+        _set("slider", "Edad", (lo, rng.choice([65, 75, 90]))),
+        _set("multiselect", "Diagnósticos (CIE-10)", rng.sample(["I10", "E11", "N18", "I21", "E78"], 2)),
+        _set("select_slider", "Banda de riesgo", rng.choice(["Medio (0.15-0.3)", "Alto (≥0.3)", "Todos"])),
+    ]
+
+def scenario(page: str, rng: random.Random) -> List[Callable]:
+    """Interacciones (cada una = un rerun) después del primer paint."""
+    if page == "Home.py":
+        return [_switch_role, _switch_country]   # "Actualizar estado" sólo existe durante el warm-up
+    if page == "pages/1_Dashboard.py":
+        return _cohort_steps(rng) + [_switch_country, _set("toggle", "Modo debug (curvas)", True)]
+    if page == "pages/2_Worklist.py":
+        return _cohort_steps(rng)[:2] + [_switch_country]
+    if page == "pages/3_Suscripcion.py":
+        return [_set("slider", "Deducible (USD)", d) for d in (0, 1500, 3000)] + \
+               [_click("Calcular prima y riesgo"), _set("selectbox", "Plan", "Premium")]
+    if page == "pages/4_Simulador.py":
+        return [_set("slider", "Reducción de hazard (efecto del programa)", r) for r in range(0, 55, 10)] + \
+               _cohort_steps(rng)[:1] + [_switch_country]
+    if page == "pages/5_Generador_CSV.py":
+        return [_set("number_input", "Tamaño de la cohorte", rng.choice([1000, 2500, 5000])),
+                _set("radio", "Generador", rng.choice(["Secuencial", "Por contador (Philox)"])),
+                _click("Generar y puntuar CSV")]
+    raise ValueError(f"Página sin escenario: {page}")
+
+PAGES = ["Home.py", "pages/1_Dashboard.py", "pages/2_Worklist.py", "pages/3_Suscripcion.py",
+         "pages/4_Simulador.py", "pages/5_Generador_CSV.py"]
+
+
+# ---------------------------
+# Chequeo: modo progresivo del Dashboard
+# ---------------------------
+def _slot_elements(at, subheader: str) -> Optional[List[tuple]]:
+    """Elementos (tipo, contenido) del bloque que tiene como hijo el subheader dado; None si no está."""
+    def walk(node):
+        kids = getattr(node, "children", None)
+        if kids is None:
+            return None
+        if any(getattr(c, "type", "") == "subheader" and c.value == subheader for c in kids.values()):
+            return node
+        for child in kids.values():
+            hit = walk(child)
+            if hit is not None:
+                return hit
+        return None
+
+    def flat(node):
+        out = []
+        for i in sorted(node.children):
+            c = node.children[i]
+            if getattr(c, "children", None) is not None and not hasattr(c, "value"):
+                out += flat(c)
+            elif getattr(c, "type", "") in ("caption", "markdown", "subheader", "info"):
+                out.append((c.type, c.value))
+            else:
+                out.append((getattr(c, "type", type(c).__name__), str(getattr(c, "proto", ""))))
+        return out
+
+    slot = walk(at._tree)
+    return None if slot is None else flat(slot)
+
+def check_progressive(timeout: float = 300.0, sample_n: int = 300) -> List[str]:
+    """
+    Con modo progresivo, tras la pasada exacta el slot de gráficos debe
+    tener sólo los elementos exactos (nada de la vista aproximada). -> problemas.
+    """
+    from streamlit.testing.v1 import AppTest
+
+    page = os.path.join(ROOT, "pages/1_Dashboard.py")
+    exact = AppTest.from_file(page, default_timeout=timeout).run()
+    prog = AppTest.from_file(page, default_timeout=timeout).run()
+    prog.toggle(key="dash_progressive").set_value(True).run()
+    prog.number_input(key="dash_sample_n").set_value(sample_n).run()
+    marker = "Curvas de riesgo acumulado por decil"
+    got, ref = _slot_elements(prog, marker) or [], _slot_elements(exact, marker) or []
+    if not got or got[0] != ("caption", "Resultados exactos (reemplazaron la vista aproximada)."):
+        return ["la cohorte no supera la muestra: no hubo pasada aproximada"]
+    got = got[1:]
+    problems = [f"resto de la muestra: {e[1][:60]}" for e in got if e[0] == "caption" and "sin ponderar" in e[1]]
+    if len(got) != len(ref):
+        problems.append(f"{len(got)} elementos tras la pasada exacta vs {len(ref)} en la vista exacta")
+    elif got != ref:
+        problems.append(f"{sum(a != b for a, b in zip(got, ref))} elementos difieren de la vista exacta")
+    return problems
+
+
+# ---------------------------
+# Sesiones
+# ---------------------------
+class PageStats:
+    __slots__ = ("latencies", "errors", "rss_max", "skipped")
+
+    def __init__(self):
+        self.latencies: List[float] = []
+        self.errors: List[str] = []
+        self.rss_max = 0
+        self.skipped: Counter = Counter()    # nombre del paso -> veces omitido
+
+def _timed_run(at, timeout: float) -> float:
+    t0 = time.perf_counter()
+    at.run(timeout=timeout)
+    return time.perf_counter() - t0
+
+def _apply(at, step: Callable, timeout: float) -> bool:
+    """
+    Aplica la interacción; si el árbol de elementos quedó inconsistente
+    (KeyError del harness, ver cabecera) re-renderiza una vez y reintenta.
+    """
+    try:
+        return step(at)
+    except KeyError:
+        at.run(timeout=timeout)
+        return step(at)
+
+def run_session(sid: int, pages: List[str], rounds: int, think_s: float, timeout: float,
+                stats: Dict[str, PageStats], lock: threading.Lock, seed: int) -> None:
+    from streamlit.testing.v1 import AppTest
+
+    rng = random.Random(seed * 1000 + sid)
+    for _ in range(rounds):
+        for page in pages:
+            lat, errors, skipped = [], [], []
+            try:
+                at = AppTest.from_file(os.path.join(ROOT, page), default_timeout=timeout)
+                lat.append(_timed_run(at, timeout))
+                for step in scenario(page, rng):
+                    if think_s:
+                        time.sleep(rng.uniform(0, 2 * think_s))
+                    if not _apply(at, step, timeout):
+                        skipped.append(step.__name__)
+                        continue
+                    lat.append(_timed_run(at, timeout))
+                errors += [str(e.value)[:200] for e in at.exception]
+            except Exception as e:  # timeout / fallo del harness: cuenta como error de la página
+                where = traceback.extract_tb(e.__traceback__)[-1]
+                errors.append(f"{type(e).__name__}: {e} @ {os.path.basename(where.filename)}:{where.lineno}"[:200])
+            rss = rss_bytes()
+            with lock:
+                s = stats[page]
+                s.latencies += lat
+                s.errors += errors
+                s.skipped.update(skipped)
+                s.rss_max = max(s.rss_max, rss)
+
+def _pct(values: List[float], q: float) -> float:
+    return float(np.percentile(values, q)) if values else float("nan")
+
+def run_load(sessions: int = 4, rounds: int = 1, pages: Optional[List[str]] = None, think_ms: float = 0.0,
+             timeout: float = 300.0, seed: int = 0, warm: bool = True) -> Dict:
+    """Corre la carga y devuelve {pages: {...}, total: {...}}."""
+    pages = pages or PAGES
+    if warm:  # precarga las poblaciones (como el warm-up de Home) fuera de la medición
+        from services.warmup import get_population
+        for c in COUNTRIES:
+            for p in ("dashboard", "worklist", "simulador"):
+                get_population(p, c)
+    stats = {p: PageStats() for p in pages}
+    lock = threading.Lock()
+    rss0 = rss_bytes()
+    threads = [threading.Thread(target=run_session, name=f"session-{i}",
+                                args=(i, pages, rounds, think_ms / 1e3, timeout, stats, lock, seed))
+               for i in range(sessions)]
+    with _share_runtime():
+        t0 = time.perf_counter()
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        wall = time.perf_counter() - t0
+
+    out, all_lat = {}, []
+    for p, s in stats.items():
+        all_lat += s.latencies
+        out[p] = {
+            "reruns": len(s.latencies), "errors": len(s.errors), "skipped_steps": sum(s.skipped.values()),
+            "p50_ms": _pct(s.latencies, 50) * 1e3, "p95_ms": _pct(s.latencies, 95) * 1e3,
+            "p99_ms": _pct(s.latencies, 99) * 1e3,
+            "busy_s": float(sum(s.latencies)),
+            "rss_max_mb": s.rss_max / 2**20,
+            "error_samples": s.errors[:3],
+            "skipped": dict(s.skipped),
+        }
+    total = {
+        "sessions": sessions, "rounds": rounds, "wall_s": wall,
+        "reruns": len(all_lat), "reruns_per_s": len(all_lat) / wall if wall else float("nan"),
+        "p50_ms": _pct(all_lat, 50) * 1e3, "p95_ms": _pct(all_lat, 95) * 1e3, "p99_ms": _pct(all_lat, 99) * 1e3,
+        "rss_start_mb": rss0 / 2**20, "rss_end_mb": rss_bytes() / 2**20,
+    }
+    return {"pages": out, "total": total}
+
+
+# ---------------------------
+# Reporte / comparación
+# ---------------------------
+def print_report(res: Dict, ref: Optional[Dict] = None) -> None:
+    def delta(cur: float, old: Optional[float]) -> str:
+        if old is None or not old or old != old:
+            return ""
+        return f" ({100 * (cur - old) / old:+.0f}%)"
+
+    print(f"{'página':<26}{'reruns':>7}{'err':>5}{'omit':>5}{'p50 ms':>16}{'p95 ms':>16}{'p99 ms':>16}{'RSS MB':>9}")
+    for p, r in res["pages"].items():
+        o = (ref or {}).get("pages", {}).get(p, {})
+        print(f"{p:<26}{r['reruns']:>7}{r['errors']:>5}{r.get('skipped_steps', 0):>5}"
+              f"{r['p50_ms']:>9.0f}{delta(r['p50_ms'], o.get('p50_ms')):>7}"
+              f"{r['p95_ms']:>9.0f}{delta(r['p95_ms'], o.get('p95_ms')):>7}"
+              f"{r['p99_ms']:>9.0f}{delta(r['p99_ms'], o.get('p99_ms')):>7}{r['rss_max_mb']:>9.0f}")
+        for e in r["error_samples"]:
+            print(f"    ! {e}")
+        for step, n in r.get("skipped", {}).items():
+            print(f"    - omitido {step} × {n} (widget ausente)")
+    t, o = res["total"], (ref or {}).get("total", {})
+    print(f"total: {t['sessions']} sesiones × {t['rounds']} rondas, {t['reruns']} reruns en {t['wall_s']:.1f} s "
+          f"= {t['reruns_per_s']:.2f} reruns/s{delta(t['reruns_per_s'], o.get('reruns_per_s'))}; "
+          f"p95 {t['p95_ms']:.0f} ms{delta(t['p95_ms'], o.get('p95_ms'))}; "
+          f"RSS {t['rss_start_mb']:.0f} → {t['rss_end_mb']:.0f} MB")
+
+def _git_rev() -> str:
+    try:
+        import subprocess
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                              text=True, timeout=10).stdout.strip()
+    except Exception:
+        return ""
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description="Carga concurrente de sesiones sobre las páginas (AppTest).")
+    ap.add_argument("--sessions", type=int, default=4)
+    ap.add_argument("--rounds", type=int, default=1, help="Recorridos completos por sesión.")
+    ap.add_argument("--pages", default="", help="Subconjunto (coma), p.ej. pages/1_Dashboard.py")
+    ap.add_argument("--think-ms", type=float, default=0.0, help="Pausa media entre interacciones.")
+    ap.add_argument("--timeout", type=float, default=300.0, help="Timeout por rerun (s).")
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--no-warm", action="store_true", help="No precargar poblaciones antes de medir.")
+    ap.add_argument("--label", default="latest", help="Sufijo del archivo de resultados.")
+    ap.add_argument("--compare", default="", help="JSON de una corrida anterior para comparar.")
+    args = ap.parse_args(argv)
+
+    pages = [p.strip() for p in args.pages.split(",") if p.strip()] or None
+    problems = check_progressive(args.timeout) if "pages/1_Dashboard.py" in (pages or PAGES) else []
+    print("Modo progresivo: " + ("; ".join(problems) if problems else "OK (sólo elementos exactos)"))
+    res = run_load(args.sessions, args.rounds, pages, args.think_ms, args.timeout, args.seed, not args.no_warm)
+    ref = None
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            ref = json.load(f)
+    print_report(res, ref)
+
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    path = os.path.join(RESULTS_DIR, f"loadtest_{args.label}.json")
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"environment": {**environment(), "git": _git_rev()},
+                   "params": vars(args), **res}, f, indent=2, ensure_ascii=False)
+    print(f"\nResultados: {path}")
+    return 1 if problems or any(r["errors"] for r in res["pages"].values()) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
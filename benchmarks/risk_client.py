@@ -0,0 +1,95 @@
+# benchmarks/risk_client.py
+# ---------------------------------------------------------------------
+# Throughput/latencia del cliente pooled (Arrow IPC) contra el servidor
+# local (services/risk_server.py), sin red externa:
+#   python -m benchmarks.risk_client                       # score_population
+#   python -m benchmarks.risk_client --endpoint batch --n 2000 --chunk 250
+#   python -m benchmarks.risk_client --in-flight 1,2,4,8
+# Reporta filas/s y p50/p99 por request para cada nivel de concurrencia.
+# Antes verifica que un request inválido (frame, config o valores) da
+# 4xx y el cliente falla de inmediato, sin reintentos.
+# ---------------------------------------------------------------------
+
+import argparse
+import sys
+import time
+from typing import Dict, List
+
+from services.data_io import generate_dummy_population
+from services.risk_client import RiskAPIError, RiskClient
+from services.risk_server import start_background_server
+
+
+def run_case(url: str, df, endpoint: str, in_flight: int, chunk: int, repeat: int) -> Dict:
+    with RiskClient(url, max_in_flight=in_flight, chunk_rows=chunk) as client:
+        fn = client.score_batch if endpoint == "batch" else client.score_population
+        fn(df.iloc[:chunk])  # calienta conexiones/imports
+        client.latencies.clear()
+        t0 = time.perf_counter()
+        for _ in range(repeat):
+            fn(df)
+        dt = time.perf_counter() - t0
+        lat = client.latency_summary()
+    return {
+        "in_flight": in_flight,
+        "rows_s": len(df) * repeat / dt,
+        "p50_ms": lat.get("p50_ms", 0.0),
+        "p99_ms": lat.get("p99_ms", 0.0),
+        "requests": lat.get("requests", 0),
+    }
+
+def check_client_errors(url: str) -> List[str]:
+    """Requests inválidos -> 4xx sin reintentos (la respuesta llega en un solo intento)."""
+    cases = {
+        "frame corrupto": ("/v1/score_population", b"no es arrow", {}, "HTTP 400"),
+        "X-Score-Config inválido": ("/v1/score_population", b"", {"X-Score-Config": "{nope"}, "HTTP 400"),
+        "valores inválidos": ("/v1/score_one", b'{"age": "abc"}', {}, "HTTP 422"),
+    }
+    problems = []
+    with RiskClient(url, retries=3, backoff=1.0) as client:
+        for name, (path, body, headers, want) in cases.items():
+            try:
+                client._post(path, body, headers)
+                problems.append(f"{name}: respondió 200")
+            except RiskAPIError as e:
+                if not str(e).startswith(want):
+                    problems.append(f"{name}: {str(e)[:80]}")
+        if client.latency_summary().get("requests", 0) != len(cases):
+            problems.append("hubo reintentos")
+    return problems
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description="Benchmark del cliente de riesgo (Arrow IPC).")
+    ap.add_argument("--endpoint", choices=["population", "batch"], default="population")
+    ap.add_argument("--n", type=int, default=None, help="Filas (default: 200k population, 2k batch).")
+    ap.add_argument("--chunk", type=int, default=None, help="Filas por request.")
+    ap.add_argument("--in-flight", default="1,2,4")
+    ap.add_argument("--repeat", type=int, default=3)
+    args = ap.parse_args(argv)
+
+    batch = args.endpoint == "batch"
+    n = args.n or (2_000 if batch else 200_000)
+    chunk = args.chunk or (250 if batch else 20_000)
+    df = generate_dummy_population(n=min(n, 100_000), country="México - SGMM", seed=42)
+    if n > len(df):
+        df = df.sample(n=n, replace=True, random_state=0).reset_index(drop=True)
+
+    server, url = start_background_server(port=0)
+    try:
+        problems = check_client_errors(url)
+        print(f"requests inválidos -> 4xx sin reintentos: {'; '.join(problems) if problems else 'OK'}")
+        if problems:
+            return 1
+        print(f"{args.endpoint}: n={n:,} chunk={chunk:,} servidor={url}")
+        for k in (int(x) for x in args.in_flight.split(",")):
+            r = run_case(url, df, args.endpoint, k, chunk, args.repeat)
+            print(f"  en vuelo={r['in_flight']:<3} {r['rows_s']:>12,.0f} filas/s   "
+                  f"p50={r['p50_ms']:8.1f} ms   p99={r['p99_ms']:8.1f} ms   ({r['requests']} req)")
+    finally:
+        server.shutdown()
+        server.server_close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,393 @@
+# benchmarks/run.py
+# ---------------------------------------------------------------------
+# Suite de benchmarks de rutas calientes (sin servidor Streamlit):
+#   generación -> scoring -> máscara de cohorte -> KPIs -> datos de gráficos
+#
+# Uso (desde la raíz del repo):
+#   python -m benchmarks.run                          # n = 1e3, 1e4, 1e5
+#   python -m benchmarks.run --sizes 1e3,1e5,1e7      # hasta 1e7
+#   python -m benchmarks.run --only score_population,kpis
+#   python -m benchmarks.run --save-baseline          # actualiza baseline.json
+#
+# Escribe benchmarks/results/latest.json y compara contra
+# benchmarks/baseline.json: falla (exit 1) si la mediana de tiempo o el
+# pico de memoria superan el baseline en más de --time-tol / --mem-tol
+# (y la diferencia absoluta supera el umbral de ruido). Antes de medir,
+# check_adequacy verifica que la re-tarificación por defecto (Suscripción)
+# dé suficiencia de orden 1 en ambos países.
+# ---------------------------------------------------------------------
+
+import argparse
+import gc
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from services.data_io import LazyPopulation, evolve_population, generate_dummy_population  # noqa: E402
+from services.rating import SEVERITY_FX, RatedBook, RateStructure  # noqa: E402
+from services.risk_api import score_batch, score_one, score_population  # noqa: E402
+from utils.chart_data import (  # noqa: E402
+    add_dashboard_bands,
+    band_counts,
+    dashboard_bands,
+    gap_by_band,
+    region_heat_data,
+    risk_hist_data,
+    survival_deciles_data,
+)
+from services.calibration import calibrate  # noqa: E402
+from services.cashflow import effect_curve, project as cashflow_project  # noqa: E402
+from services.drift import compare as drift_compare, profile as drift_profile  # noqa: E402
+from services.snapshots import SnapshotStore, refresh_snapshot  # noqa: E402
+from services.whatif import clear_whatif_cache, compare_configs  # noqa: E402
+from utils.care_gaps import evaluate_gaps  # noqa: E402
+from utils.cohort_batch import cohort_grid, evaluate_cohorts  # noqa: E402
+from utils.cohorts import DX_OPTIONS, cohort_mask  # noqa: E402
+from utils.kpis import cohort_kpis, compute_core_kpis  # noqa: E402
+from utils.sampling import stratified_sample, stratum_codes  # noqa: E402
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+BASELINE_PATH = os.path.join(HERE, "baseline.json")
+RESULTS_PATH = os.path.join(HERE, "results", "latest.json")
+
+COUNTRY = "Colombia - EPS"
+DEFAULT_SIZES = [1_000, 10_000, 100_000]
+FIXTURE_BASE_N = 100_000  # por encima se remuestrea (rápido) en vez de generar
+
+
+# ---------------------------
+# Fixtures (no se cronometran)
+# ---------------------------
+_FIXTURES: Dict[int, Dict[str, pd.DataFrame]] = {}
+
+def _fixture(n: int) -> Dict[str, pd.DataFrame]:
+    """Población cruda y puntuada de tamaño n (cacheada por tamaño)."""
+    if n in _FIXTURES:
+        return _FIXTURES[n]
+    base_n = min(n, FIXTURE_BASE_N)
+    raw = generate_dummy_population(n=base_n, country=COUNTRY, seed=42)
+    if n > base_n:
+        raw = raw.sample(n=n, replace=True, random_state=0).reset_index(drop=True)
+        raw["patient_id"] = [f"P{100000+i}" for i in range(n)]
+    scored = score_population(raw)
+    scored["gap_mask"] = evaluate_gaps(scored)
+    _FIXTURES.clear()  # sólo un tamaño vivo a la vez (memoria)
+    _FIXTURES[n] = {"raw": raw, "scored": scored}
+    return _FIXTURES[n]
+
+
+# ---------------------------
+# Casos de benchmark
+# ---------------------------
+def _bench_generate(n):
+    return lambda: generate_dummy_population(n=n, country=COUNTRY, seed=42)
+
+def _bench_generate_lazy(n):
+    return lambda: LazyPopulation(n, COUNTRY, seed=42).materialize()
+
+def _bench_lazy_sample(n):
+    # 1.000 afiliados al azar de un libro virtual de n: costo O(1000), no O(n)
+    pop = LazyPopulation(n, COUNTRY, seed=42)
+    return lambda: pop.sample(1_000, seed=0)
+
+def _bench_score_batch(n):
+    raw = _fixture(n)["raw"]
+    return lambda: score_batch(raw, seed=123)
+
+def _bench_score_population(n):
+    raw = _fixture(n)["raw"]
+    return lambda: score_population(raw)
+
+def _bench_score_one(n):
+    rows = _fixture(n)["raw"].to_dict("records")
+    return lambda: [score_one(r) for r in rows]
+
+def _bench_cohort_mask(n):
+    df = _fixture(n)["scored"]
+    regions = sorted(df["region"].unique().tolist())
+    return lambda: cohort_mask(df, (40, 75), ["F", "M"], regions, ["E11", "N18"], "Todos")
+
+def _bench_cohort_batch(n):
+    # reporte actuarial: región × edad × dx × banda = 540 cohortes en una pasada
+    df = _fixture(n)["scored"]
+    regions = [[r] for r in sorted(df["region"].unique().tolist())]
+    specs = cohort_grid(region=regions, age_range=[(18, 39), (40, 59), (60, 90)],
+                        dx=[[]] + [[d] for d in DX_OPTIONS],
+                        risk_band=["Todos", "Bajo (<0.15)", "Medio (0.15-0.3)", "Alto (≥0.3)"])
+    return lambda: evaluate_cohorts(df, specs)
+
+def _bench_rerate_book(n):
+    # cambio de plan sobre un libro ya preparado: primas + tabla por celda + suficiencia
+    book = RatedBook(_fixture(n)["scored"])
+    rs = RateStructure("Premium", 1_000, 10, claims_fx=SEVERITY_FX)
+    return lambda: book.adequacy(rs)
+
+def _bench_drift(n):
+    # perfil en streaming (chunks de 1e6) de la corrida nueva + PSI/KS contra la referencia
+    df = _fixture(n)["scored"]
+    ref = drift_profile(df.iloc[::-1])
+    return lambda: drift_compare(ref, drift_profile(df))
+
+def _bench_calibrate(n):
+    # riesgo medio 15 % + 35 % del riesgo en el decil superior (intercepto anidado en la escala)
+    raw = _fixture(n)["raw"]
+    calibrate(raw, mean_risk=0.15)   # predictor lineal cacheado (fuera del cronómetro)
+    return lambda: calibrate(raw, mean_risk=0.15, top_decile_share=0.35)
+
+def _bench_cashflow(n):
+    # cohorte × mes por región con reducción de hazard desde el mes 3 (ramp-up de 3 meses)
+    df = score_batch(_fixture(n)["raw"], seed=123)[0]   # con weibull_k / weibull_lam
+    effect = effect_curve(0.2, start=3, ramp=3)
+    return lambda: cashflow_project(df, by="region", effect=effect)
+
+def _bench_whatif(n):
+    # dos configs sobre la misma población, con la matriz de diseño armada en cada corrida (en frío)
+    raw = _fixture(n)["raw"]
+    cfg_b = {"weights": {"hba1c": 0.30, "intercept": -2.6}, "scale": 1.2, "region_uplift": {"Bogotá": 0.2}}
+
+    def run():
+        clear_whatif_cache()
+        return compare_configs(raw, None, cfg_b)
+    return run
+
+def _bench_kpis(n):
+    df = _fixture(n)["scored"]
+    return lambda: compute_core_kpis(df, COUNTRY)
+
+def _bench_progressive_sample(n):
+    # muestra estratificada (región × banda) de 2.000 + KPIs con IC
+    df = _fixture(n)["scored"]
+    strata = pd.DataFrame({"region": df["region"], "risk_band": dashboard_bands(df)["risk_band"]})
+
+    def run():
+        s = stratified_sample(stratum_codes(strata, ["region", "risk_band"]), 2_000)
+        cohort_kpis(df.iloc[s.positions], s)
+    return run
+
+def _bench_chart_data(n):
+    df = _fixture(n)["scored"]
+
+    def run():
+        risk_hist_data(df)
+        region_heat_data(df)
+        survival_deciles_data(df, rng=np.random.default_rng(0))
+        bands = add_dashboard_bands(df.copy(deep=False))
+        band_counts(bands)
+        gap_by_band(bands)
+    return run
+
+def _bench_snapshot_refresh(n):
+    # mes anterior guardado (no cronometrado) + 5 % de afiliados con cambios
+    store = SnapshotStore(tempfile.mkdtemp(prefix="bench_snap_"))
+    raw = _fixture(n)["raw"]
+    refresh_snapshot(raw, "2026-01", COUNTRY, store)
+    nxt = evolve_population(raw, COUNTRY, seed=1, p_change=0.05)
+    return lambda: refresh_snapshot(nxt, "2026-02", COUNTRY, store)
+
+# nombre -> (fábrica, n máximo por defecto). Las rutas fila-a-fila se
+# limitan para que la suite completa siga siendo práctica.
+BENCHMARKS: Dict[str, tuple] = {
+    "generate_dummy_population": (_bench_generate, 100_000),
+    "generate_lazy": (_bench_generate_lazy, None),
+    "lazy_sample": (_bench_lazy_sample, None),
+    "score_batch": (_bench_score_batch, 100_000),
+    "score_population": (_bench_score_population, None),
+    "score_one": (_bench_score_one, 1_000),
+    "cohort_mask": (_bench_cohort_mask, None),
+    "compute_core_kpis": (_bench_kpis, None),
+    "cohort_batch": (_bench_cohort_batch, None),
+    "rerate_book": (_bench_rerate_book, None),
+    "drift": (_bench_drift, None),
+    "calibrate": (_bench_calibrate, None),
+    "cashflow": (_bench_cashflow, None),
+    "whatif": (_bench_whatif, None),
+    "chart_data": (_bench_chart_data, None),
+    "progressive_sample": (_bench_progressive_sample, None),
+    "snapshot_refresh": (_bench_snapshot_refresh, 100_000),
+}
+
+
+# ---------------------------
+# Medición
+# ---------------------------
+def _time(fn: Callable, repeat: int) -> List[float]:
+    times = []
+    for _ in range(repeat):
+        gc.collect()
+        t0 = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - t0)
+    return times
+
+def _peak_mem(fn: Callable) -> int:
+    gc.collect()
+    tracemalloc.start()
+    try:
+        fn()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return int(peak)
+
+def _repeats(n: int, requested: Optional[int]) -> int:
+    if requested:
+        return requested
+    return 5 if n <= 10_000 else (3 if n <= 1_000_000 else 1)
+
+def run_suite(sizes, only=None, repeat=None, max_n=None, measure_mem=True) -> Dict:
+    results = {}
+    for n in sizes:
+        for name, (factory, cap) in BENCHMARKS.items():
+            if only and name not in only:
+                continue
+            limit = max_n if max_n is not None else cap
+            if limit is not None and n > limit:
+                continue
+            fn = factory(n)
+            t0 = time.perf_counter()
+            fn()  # warm-up (imports, cachés)
+            warm_s = time.perf_counter() - t0
+            # casos lentos (>2 s) se miden una sola vez salvo --repeat explícito
+            times = _time(fn, _repeats(n, repeat) if (repeat or warm_s <= 2.0) else 1)
+            entry = {
+                "bench": name, "n": n,
+                "median_s": statistics.median(times), "min_s": min(times),
+                "repeat": len(times),
+            }
+            if measure_mem:
+                entry["peak_bytes"] = _peak_mem(fn)
+            results[f"{name}@{n}"] = entry
+            print(f"{name:<28} n={n:>10,}  median={entry['median_s']*1e3:10.2f} ms"
+                  + (f"  peak={entry['peak_bytes']/2**20:9.1f} MiB" if measure_mem else ""))
+    return results
+
+def environment() -> Dict:
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "numpy": np.__version__,
+        "pandas": pd.__version__,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+
+
+# ---------------------------
+# Comparación contra baseline
+# ---------------------------
+def compare(results: Dict, baseline: Dict, time_tol: float, mem_tol: float,
+            min_abs_s: float = 0.005, min_abs_bytes: int = 1 << 20) -> List[str]:
+    """Lista de regresiones (vacía si todo está dentro de umbral)."""
+    regressions = []
+    base = baseline.get("results", {})
+    for key, cur in results.items():
+        ref = base.get(key)
+        if not ref:
+            continue
+        dt = cur["median_s"] - ref["median_s"]
+        if dt > min_abs_s and cur["median_s"] > ref["median_s"] * (1 + time_tol):
+            regressions.append(
+                f"{key}: tiempo {ref['median_s']*1e3:.2f} → {cur['median_s']*1e3:.2f} ms "
+                f"(+{100*dt/ref['median_s']:.0f}%)"
+            )
+        if "peak_bytes" in cur and "peak_bytes" in ref:
+            dm = cur["peak_bytes"] - ref["peak_bytes"]
+            if dm > min_abs_bytes and cur["peak_bytes"] > ref["peak_bytes"] * (1 + mem_tol):
+                regressions.append(
+                    f"{key}: memoria {ref['peak_bytes']/2**20:.1f} → {cur['peak_bytes']/2**20:.1f} MiB"
+                )
+    return regressions
+
+# ---------------------------
+# Chequeo: suficiencia por defecto
+# ---------------------------
+ADEQUACY_RANGE = (0.1, 10.0)   # "orden 1": prima y siniestro esperado en la misma escala
+
+def check_adequacy(countries=("México - SGMM", "Colombia - EPS")) -> List[str]:
+    """Libro de la población del Dashboard con cada plan y los defaults de la página. -> problemas."""
+    from services.populations import build_scored_population
+    lo, hi = ADEQUACY_RANGE
+    problems = []
+    for country in countries:
+        book = RatedBook(build_scored_population("dashboard", country)["df"])
+        for plan in ("Básico", "Estándar", "Premium"):
+            a = book.adequacy(RateStructure(plan, 500, 20, claims_fx=SEVERITY_FX))["adequacy"]
+            if not lo <= a <= hi:
+                problems.append(f"{country} / {plan}: suficiencia {a:.3f} fuera de [{lo}, {hi}]")
+    return problems
+
+def _parse_sizes(s: str) -> List[int]:
+    return [int(float(x)) for x in s.split(",") if x.strip()]
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description="Benchmarks de rutas calientes (datos/scoring/gráficos).")
+    ap.add_argument("--sizes", default=",".join(str(n) for n in DEFAULT_SIZES),
+                    help="Tamaños separados por coma (admite 1e3..1e7).")
+    ap.add_argument("--only", default="", help="Subconjunto de benchmarks (coma).")
+    ap.add_argument("--repeat", type=int, default=None, help="Repeticiones por caso.")
+    ap.add_argument("--max-n", type=float, default=None,
+                    help="Ignora los topes por benchmark y usa este n máximo para todos.")
+    ap.add_argument("--no-mem", action="store_true", help="No medir pico de memoria.")
+    ap.add_argument("--out", default=RESULTS_PATH)
+    ap.add_argument("--baseline", default=BASELINE_PATH)
+    ap.add_argument("--save-baseline", action="store_true")
+    ap.add_argument("--time-tol", type=float, default=0.25, help="Regresión tolerada de tiempo (0.25 = +25%%).")
+    ap.add_argument("--mem-tol", type=float, default=0.20, help="Regresión tolerada de memoria.")
+    args = ap.parse_args(argv)
+
+    only = {x.strip() for x in args.only.split(",") if x.strip()} or None
+    problems = check_adequacy()
+    print("Suficiencia por defecto: " + ("; ".join(problems) if problems else "OK (orden 1 en ambos países)"))
+    if problems:
+        return 1
+    results = run_suite(
+        _parse_sizes(args.sizes), only=only, repeat=args.repeat,
+        max_n=int(args.max_n) if args.max_n else None, measure_mem=not args.no_mem,
+    )
+    payload = {"environment": environment(), "results": results}
+
+    os.makedirs(os.path.dirname(args.out), exist_ok=True)
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump(payload, f, indent=2)
+    print(f"\nResultados: {args.out}")
+
+    if args.save_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(payload, f, indent=2)
+        print(f"Baseline actualizado: {args.baseline}")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print("Sin baseline; usa --save-baseline para crearlo.")
+        return 0
+    with open(args.baseline, encoding="utf-8") as f:
+        baseline = json.load(f)
+    regressions = compare(results, baseline, args.time_tol, args.mem_tol)
+    missing = sorted(set(results) - set(baseline.get("results", {})))
+    if missing:   # sin referencia no se comparan: avisar en vez de reportar "sin regresiones"
+        print(f"\nSin baseline ({len(missing)} casos, no comparados): {', '.join(missing)}")
+        print("  -> python -m benchmarks.run --save-baseline")
+    if regressions:
+        print("\nRegresiones vs baseline:")
+        for r in regressions:
+            print("  -", r)
+        return 1
+    print(f"Sin regresiones vs baseline ({len(results) - len(missing)} casos comparados).")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
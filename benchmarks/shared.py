@@ -0,0 +1,119 @@
+# benchmarks/shared.py
+# ---------------------------------------------------------------------
+# Memoria con N procesos: población publicada una vez en el directorio
+# compartido (services.shared_store) y adjuntada por cada proceso
+# (memory_map, cero copia) vs. una copia privada por proceso (lo que
+# pasaba sin el store). Cada proceso recorre todas las columnas y
+# reporta Rss / Pss / privada desde /proc/self/smaps_rollup (Linux);
+# Pss reparte las páginas compartidas entre quienes las mapean, así que
+# la suma de Pss es la RAM real del conjunto.
+# Al final publica una versión nueva y verifica que la anterior se
+# barre cuando los procesos sueltan sus leases.
+#   python -m benchmarks.shared                     # 1e6 filas, 1/2/4 procesos
+#   python -m benchmarks.shared --rows 200000 --procs 1,4,8
+# ---------------------------------------------------------------------
+
+import argparse
+import multiprocessing as mp
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+KEY = "bench__shared"
+
+
+def _smaps() -> dict:
+    out = {}
+    with open("/proc/self/smaps_rollup") as fh:
+        for line in fh:
+            parts = line.split()
+            if len(parts) >= 2 and parts[1].isdigit():
+                out[parts[0].rstrip(":")] = int(parts[1]) / 1024.0   # kB -> MB
+    return out
+
+def _worker(mode: str, base: str, version: str, barrier, queue) -> None:
+    import numpy as np
+    import pyarrow as pa
+    import pyarrow.ipc as ipc
+    from services import shared_store
+
+    before = _smaps()
+    t0 = time.perf_counter()
+    if mode == "shared":
+        pop = shared_store.attach(KEY, version, base)
+        df = pop["df"]
+    else:   # copia privada: leer sin mmap (cada proceso retiene sus buffers)
+        with open(os.path.join(base, KEY, version, "df.arrow"), "rb") as fh:
+            table = ipc.open_file(pa.py_buffer(fh.read())).read_all()
+        df = table.to_pandas()
+        del table
+    total = sum(float(np.nan_to_num(np.sum(df[c].to_numpy()))) for c in df.columns if df[c].dtype.kind in "fiu")
+    load_s = time.perf_counter() - t0
+    after = _smaps()
+    barrier.wait()                        # todos vivos a la vez al medir
+    queue.put({"load_s": load_s, "checksum": total,
+               **{k: after.get(k, 0.0) - before.get(k, 0.0)
+                  for k in ("Rss", "Pss", "Private_Clean", "Private_Dirty")}})
+    barrier.wait()
+
+def _run(mode: str, procs: int, base: str, version: str):
+    ctx = mp.get_context("spawn")
+    barrier, queue = ctx.Barrier(procs), ctx.Queue()
+    ps = [ctx.Process(target=_worker, args=(mode, base, version, barrier, queue)) for _ in range(procs)]
+    for p in ps:
+        p.start()
+    rows = [queue.get() for _ in ps]
+    for p in ps:
+        p.join()
+    return rows
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description=__doc__)
+    ap.add_argument("--rows", type=float, default=1e6)
+    ap.add_argument("--procs", default="1,2,4")
+    args = ap.parse_args(argv)
+
+    from services import shared_store
+    from services.data_io import generate_dummy_population
+    from services.risk_api import score_population
+
+    n = int(args.rows)
+    base = tempfile.mkdtemp(prefix="corpus-shared-bench-", dir="/dev/shm" if os.path.isdir("/dev/shm") else None)
+    try:
+        print(f"Generando población de {n:,} filas…")
+        df = score_population(generate_dummy_population(n=n, country="Colombia - EPS", seed=42))
+        shared_store.publish(KEY, "v1", {"df": df}, base)
+        del df
+        mb = sum(r["MB"] for r in shared_store.status(base))
+        print(f"Publicada: {mb:,.1f} MB en {base}\n")
+        print(f"{'modo':<9}{'procesos':>9}{'Σ Pss MB':>11}{'Σ privada MB':>14}{'Rss/proc MB':>13}{'carga s':>9}")
+        for procs in [int(p) for p in args.procs.split(",")]:
+            for mode in ("private", "shared"):
+                rows = _run(mode, procs, base, "v1")
+                assert len({round(r["checksum"], 3) for r in rows}) == 1
+                pss = sum(r["Pss"] for r in rows)
+                priv = sum(r["Private_Clean"] + r["Private_Dirty"] for r in rows)
+                rss = max(r["Rss"] for r in rows)
+                load = max(r["load_s"] for r in rows)
+                print(f"{mode:<9}{procs:>9}{pss:>11.1f}{priv:>14.1f}{rss:>13.1f}{load:>9.2f}")
+
+        # Reemplazo: v2 vigente, v1 sin leases vivos -> se barre
+        shared_store.publish(KEY, "v2", {"df": shared_store.attach(KEY, "v1", base)["df"]}, base)
+        import gc
+        gc.collect()     # suelta el lease del attach de arriba
+        removed = shared_store.sweep(KEY, base)
+        left = [r["versión"] for r in shared_store.status(base)]
+        print(f"\nReemplazo: versiones barridas={removed}, quedan={left}")
+        return 0 if left == ["v2"] else 1
+    finally:
+        shutil.rmtree(base, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
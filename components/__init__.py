@@ -1,11 +1,7 @@
 # components/__init__.py
-from .charts import (
-    risk_hist,
-    region_heat,
-    survival_deciles,
-    top_features_bar,
-    scenario_bars,
-)
+# Exports perezosos (PEP 562): `import components` o `components.cards`
+# no cargan charts/Altair hasta que se usa un gráfico.
+import importlib
 
 __all__ = [
     "risk_hist",
@@ -14,3 +10,8 @@ __all__ = [
     "top_features_bar",
     "scenario_bars",
 ]
+
+def __getattr__(name):
+    if name in __all__:
+        return getattr(importlib.import_module(".charts", __name__), name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,36 @@
+# components/cashflow_panel.py
+# ---------------------------------------------------------------------
+# Panel de proyección mensual (Dashboard): PMPM y loss ratio por mes de
+# la cohorte activa, total y por grupo. La proyección sale cacheada por
+# cohorte (services.cashflow.projection_for), así que re-pintar el panel
+# con la misma cohorte no recalcula nada.
+# ---------------------------------------------------------------------
+
+import pandas as pd
+import streamlit as st
+
+GROUPS = {"Cohorte clínica": "cohort_label", "Región": "region", "Banda de riesgo": "risk_band"}
+
+
+def render_cashflow_panel(view) -> None:
+    from components.charts import cashflow_lines
+    from services.cashflow import projection_for
+
+    with st.expander("Proyección mensual de siniestros (PMPM / loss ratio)", expanded=False):
+        st.caption("Eventos por mes = incremento de la curva Weibull de cada afiliado × costo por evento, "
+                   "más el gasto base (costo 12m / 12). Loss ratio contra la UPC mensual.")
+        label = st.selectbox("Agrupar por", list(GROUPS), key="cf_by")
+        with st.spinner("Proyectando…"):
+            cf = projection_for(view, by=GROUPS[label])
+        total = cf.total()
+        m = st.columns(3)
+        m[0].metric("PMPM mes 1", f"${total.pmpm()[0, 0]:,.0f}")
+        m[1].metric("PMPM mes 12", f"${total.pmpm()[0, -1]:,.0f}")
+        m[2].metric("Siniestros 12m", f"${total.claims.sum():,.0f}")
+        cashflow_lines(cf.frame(), y="pmpm", color="group", title=f"PMPM proyectado por {label.lower()}",
+                       y_title="PMPM")
+        table = pd.concat([total.matrix("pmpm"), cf.matrix("pmpm")]).round(0)
+        lr = pd.concat([total.matrix("loss_ratio"), cf.matrix("loss_ratio")]).round(2)
+        tab1, tab2 = st.tabs(["PMPM", "Loss ratio"])
+        tab1.dataframe(table, use_container_width=True)
+        tab2.dataframe(lr, use_container_width=True)
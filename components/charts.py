@@ -1,54 +1,219 @@
 # components/charts.py
 # -----------------------------------------------
 # Gráficos reutilizables para el piloto de CorpusAI
+# - render_chart convierte el gráfico Altair a spec Vega-Lite con los
+#   datos como datasets Arrow con nombre (hash del contenido): capas o
+#   gráficos apilados con los mismos datos los envían UNA vez.
+# - Cache de specs (LRU del proceso) por (gráfico, clave): la clave es
+#   huella de cohorte + parámetros; show_cached() pinta el spec guardado
+#   sin armar ni serializar nada (reruns por widgets que no lo afectan).
 # -----------------------------------------------
 
-import altair as alt
-import numpy as np
+import hashlib
+import threading
+from collections import OrderedDict
+from contextlib import nullcontext
+from typing import Hashable, Optional
+
 import pandas as pd
 import streamlit as st
 
-__all__ = ["risk_hist", "region_heat", "survival_deciles", "top_features_bar", "scenario_bars"]
+from utils.chart_data import (
+    region_heat_data,
+    risk_hist_data,
+    scenario_long,
+    survival_deciles_data,
+    top_features_data,
+)
+from utils.memory import register_cache
+from utils.profiling import count, current_trace, span
+
+__all__ = ["risk_hist", "region_heat", "survival_deciles", "top_features_bar", "scenario_bars", "cashflow_lines",
+           "render_chart",
+           "show_cached", "spec_cache_stats", "clear_spec_cache", "get_altair"]
+
+_ALT = None
+
+SPEC_CACHE_MAX = 96                      # specs guardados (LRU, compartidos entre sesiones)
+_SPECS: "OrderedDict[tuple, tuple]" = OrderedDict()   # (name, key) -> (spec, payload_bytes)
+_SPECS_LOCK = threading.Lock()
+_CONVERT_LOCK = threading.Lock()         # el data transformer de Altair es global
+_STATS = {"hits": 0, "misses": 0}
+register_cache("charts.specs", lambda: _SPECS)
+
+def get_altair():
+    """
+    Importa Altair en el primer gráfico (no al importar el módulo) y
+    lo deja sin límite de filas (por si pasas DF grandes).
+    """
+    global _ALT
+    if _ALT is None:
+        import altair as alt
+        try:
+            alt.data_transformers.disable_max_rows()
+        except Exception:
+            pass
+        _ALT = alt
+    return _ALT
+
 
-# Altair sin límite de filas (por si pasas DF grandes)
-try:
-    alt.data_transformers.disable_max_rows()
-except Exception:
-    pass
+def _arrow_bytes(data) -> bytes:
+    """DataFrame -> Arrow IPC (stream), el formato que Streamlit envía tal cual."""
+    import pyarrow as pa
+    table = pa.Table.from_pandas(data)
+    sink = pa.BufferOutputStream()
+    with pa.RecordBatchStreamWriter(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+def chart_spec(chart) -> dict:
+    """
+    Spec Vega-Lite de un gráfico Altair con los datos en spec["datasets"]
+    (Arrow IPC, nombre = hash del contenido). Datos iguales en varias
+    capas -> un solo dataset. Altair toma el transformer y el tema de
+    registros globales (st.altair_chart también los cambia, sin lock):
+    todo gráfico de la app pasa por aquí / render_chart, nunca por
+    st.altair_chart, para que _CONVERT_LOCK los serialice.
+    """
+    alt = get_altair()
+    datasets = {}
+
+    def named(data):
+        raw = _arrow_bytes(data)
+        name = hashlib.blake2b(raw, digest_size=12).hexdigest()
+        datasets[name] = raw
+        return {"name": name}
+
+    with _CONVERT_LOCK:
+        alt.data_transformers.register("corpus_named", named)
+        with alt.themes.enable("none") if alt.themes.active == "default" else nullcontext():
+            with alt.data_transformers.enable("corpus_named"):
+                spec = chart.to_dict()
+    spec["datasets"] = {**spec.get("datasets", {}), **datasets}
+    return spec
+
+def _spec_bytes(spec: dict) -> int:
+    return sum(len(v) for v in spec.get("datasets", {}).values() if isinstance(v, bytes))
+
+def show_cached(name: str, key: Optional[Hashable]) -> bool:
+    """
+    Pinta el spec guardado para (name, key) y devuelve True; False si no
+    está (el llamador arma el gráfico y lo guarda con render_chart(..., key=)).
+    """
+    if key is None:
+        return False
+    with _SPECS_LOCK:
+        hit = _SPECS.get((name, key))
+        if hit is not None:
+            _SPECS.move_to_end((name, key))
+            _STATS["hits"] += 1
+        else:
+            _STATS["misses"] += 1
+    if hit is None:
+        count("chart.spec_cache.miss")
+        return False
+    spec, payload = hit
+    with span(f"chart.{name}.render", "chart") as sp:
+        sp.set(cache="hit", payload_bytes=payload)
+        count("chart.spec_cache.hit")
+        st.vega_lite_chart(dict(spec), use_container_width=True)
+    return True
+
+def render_chart(chart, name: str, key: Optional[Hashable] = None) -> None:
+    """
+    Gráfico Altair -> spec con datasets Arrow -> st.vega_lite_chart. Con
+    `key` el spec queda en la cache (ver show_cached). Con perfilado activo
+    registra el tiempo de conversión/render y el tamaño de los datos (payload).
+    """
+    with span(f"chart.{name}.render", "chart") as sp:
+        spec = chart_spec(chart)
+        payload = _spec_bytes(spec)
+        if current_trace() is not None:
+            sp.set(payload_bytes=payload, cache="miss" if key is not None else "off")
+            count("chart.payload_bytes", payload)
+        if key is not None:
+            with _SPECS_LOCK:
+                _SPECS[(name, key)] = (spec, payload)
+                _SPECS.move_to_end((name, key))
+                while len(_SPECS) > SPEC_CACHE_MAX:
+                    _SPECS.popitem(last=False)
+        st.vega_lite_chart(dict(spec), use_container_width=True)
+
+def spec_cache_stats() -> dict:
+    with _SPECS_LOCK:
+        return {"entries": len(_SPECS), "max": SPEC_CACHE_MAX, **_STATS}
+
+def clear_spec_cache() -> None:
+    with _SPECS_LOCK:
+        _SPECS.clear()
 
 
 # ---------------------------
 # 1) Histograma de riesgo
 # ---------------------------
-def risk_hist(df: pd.DataFrame) -> None:
-    """Histograma de risk_factor con bins automáticos."""
+def risk_hist(df: pd.DataFrame, key: Optional[Hashable] = None, weight: Optional[str] = None) -> None:
+    """
+    Histograma de risk_factor con bins automáticos; con `weight` (muestra)
+    la altura es Σ pesos = pacientes estimados. También acepta un histograma ya agregado (FixedHistogram o
+    RiskDistribution de utils.sketches), p.ej. combinado de particiones.
+    """
+    hist = getattr(df, "hist", df)
+    if hasattr(hist, "to_frame") and hasattr(hist, "counts"):
+        with span("chart.risk_hist.data", "chart"):
+            bins = hist.to_frame()
+        _risk_hist_binned(bins, key)
+        return
+
     if df is None or df.empty or "risk_factor" not in df.columns:
         st.info("No hay datos de riesgo para graficar el histograma.")
         return
 
-    data = df[["risk_factor"]].dropna()
+    with span("chart.risk_hist.data", "chart"):
+        data = risk_hist_data(df, weight)
     if data.empty:
         st.info("No hay valores válidos de 'risk_factor' para el histograma.")
         return
 
+    alt = get_altair()
+    n = f"sum({weight}):Q" if weight else "count():Q"
     chart = (
         alt.Chart(data)
         .mark_bar()
         .encode(
             x=alt.X("risk_factor:Q", bin=alt.Bin(maxbins=30), title="Riesgo"),
-            y=alt.Y("count():Q", title="Pacientes"),
-            tooltip=[alt.Tooltip("count():Q", title="N")],
+            y=alt.Y(n, title="Pacientes"),
+            tooltip=[alt.Tooltip(n, title="N", format=",.0f")],
         )
         .properties(height=260)
     )
-    st.altair_chart(chart, use_container_width=True)
+    render_chart(chart, "risk_hist", key=key)
+
+
+def _risk_hist_binned(bins: pd.DataFrame, key: Optional[Hashable] = None) -> None:
+    """Histograma desde bins precalculados (bin_start, bin_end, count)."""
+    if bins.empty or bins["count"].sum() == 0:
+        st.info("No hay valores válidos de 'risk_factor' para el histograma.")
+        return
+    alt = get_altair()
+    chart = (
+        alt.Chart(bins)
+        .mark_bar()
+        .encode(
+            x=alt.X("bin_start:Q", bin="binned", title="Riesgo"),
+            x2="bin_end:Q",
+            y=alt.Y("count:Q", title="Pacientes"),
+            tooltip=[alt.Tooltip("count:Q", title="N")],
+        )
+        .properties(height=260)
+    )
+    render_chart(chart, "risk_hist", key=key)
 
 
 # ---------------------------
 # 2) “Heat” por región
 # ---------------------------
-def region_heat(df: pd.DataFrame) -> None:
-    """Barra coloreada por región según riesgo promedio (heat simple)."""
+def region_heat(df: pd.DataFrame, key: Optional[Hashable] = None, weight: Optional[str] = None) -> None:
+    """Barra coloreada por región según riesgo promedio (heat simple); `weight` como en risk_hist."""
     if (
         df is None
         or df.empty
@@ -58,16 +223,14 @@ def region_heat(df: pd.DataFrame) -> None:
         st.info("No hay datos suficientes para graficar el 'heat' por región.")
         return
 
-    agg = (
-        df.groupby("region", as_index=False, observed=False)
-        .agg(risk_mean=("risk_factor", "mean"), n=("patient_id", "count"))
-        .sort_values("risk_mean", ascending=False)
-    )
+    with span("chart.region_heat.data", "chart"):
+        agg = region_heat_data(df, weight)
 
     if agg.empty:
         st.info("No hay agregaciones para mostrar por región.")
         return
 
+    alt = get_altair()
     chart = (
         alt.Chart(agg)
         .mark_bar()
@@ -81,17 +244,19 @@ def region_heat(df: pd.DataFrame) -> None:
         )
         .properties(height=260)
     )
-    st.altair_chart(chart, use_container_width=True)
+    render_chart(chart, "region_heat", key=key)
 
 
 # -----------------------------------------------
 # 3) Curvas acumuladas por (hasta) 10 “deciles”
 #    -> versión con separación real (Weibull)
 # -----------------------------------------------
-def survival_deciles(df: pd.DataFrame, debug: bool = False) -> None:
+def survival_deciles(df: pd.DataFrame, debug: bool = False, cuts=None, key: Optional[Hashable] = None) -> None:
     """
     Curvas de riesgo acumulado por grupos (hasta 10).
     - Si no se puede segmentar, muestra una curva única "Cohorte".
+    - `cuts`: bordes de decil precalculados (p.ej. RiskDistribution.decile_cuts()
+      de un sketch combinado); evita ordenar toda la columna.
     - Usa Weibull para lograr separación visible entre deciles y formas distintas:
       * Deciles bajos: riesgo final 12m pequeño, algunos tardíos (k>1).
       * Deciles medios: intermedios, mix de formas.
@@ -113,99 +278,23 @@ def survival_deciles(df: pd.DataFrame, debug: bool = False) -> None:
         return
 
     # --- Preparación ---
-    df = df.copy()
-    df["risk_factor"] = pd.to_numeric(df["risk_factor"], errors="coerce")
-    before = len(df)
-    df = df.dropna(subset=["risk_factor"])
-    after = len(df)
-
-    n = len(df)
-    if n == 0:
+    with span("chart.survival_deciles.data", "chart"):
+        prep = survival_deciles_data(df, cuts=cuts)
+    if prep["n_valid"] == 0:
         st.info("No hay 'risk_factor' válido para graficar.")
         if debug:
             with st.expander("DEBUG — survival_deciles", expanded=True):
-                st.write(f"Registros (original → válidos): {before} → {after} → {n}")
+                st.write(f"Registros (original → válidos): {prep['n_in']} → {prep['n_valid']}")
         return
 
-    nunique = df["risk_factor"].nunique(dropna=True)
-    q_try = int(max(2, min(10, nunique, n)))  # 2..10 grupos
-
-    # --- Segmentación ---
-    seg_ok = True
-    try:
-        df["risk_decile"] = pd.qcut(
-            df["risk_factor"], q_try,
-            labels=[f"D{i}" for i in range(1, q_try + 1)],
-            duplicates="drop",
-        )
-    except Exception:
-        seg_ok = False
-        try:
-            df["risk_decile"] = pd.cut(
-                df["risk_factor"], q_try,
-                labels=[f"D{i}" for i in range(1, q_try + 1)],
-                include_lowest=True,
-            )
-            seg_ok = True
-        except Exception:
-            pass
-
-    force_single = (not seg_ok) or df["risk_decile"].isna().all()
-    months = np.arange(1, 13, dtype=int)
-    records = []
-
-    def _weibull_curve(c12: float, k: float, months_vec: np.ndarray) -> np.ndarray:
-        """
-        Construye riesgo acumulado mensual con Weibull.
-        c12 = P(evento a 12m). Calculamos lambda para que F(12)=c12 con forma k.
-        """
-        c12 = float(np.clip(c12, 1e-6, 0.999))
-        lam = (-np.log(1.0 - c12)) ** (1.0 / k) / 12.0  # lambda
-        t = months_vec.astype(float)
-        return 1.0 - np.exp(-(lam * t) ** k)
-
-    if force_single:
-        # Curva única usando la media de riesgo como objetivo a 12m
-        c12 = float(np.clip(df["risk_factor"].mean(), 0.03, 0.85))
-        k = 1.0  # forma neutra
-        cum = _weibull_curve(c12, k, months)
-        for m, c in zip(months, cum):
-            records.append({"decile": "Cohorte", "month": int(m), "cum_risk": float(np.clip(c, 0, 0.95))})
-    else:
-        # Orden categórico para leyenda
-        if pd.api.types.is_categorical_dtype(df["risk_decile"].dtype):
-            order = df["risk_decile"].cat.categories.astype(str).tolist()
-        else:
-            order = sorted(df["risk_decile"].dropna().astype(str).unique().tolist())
-
-        # Mapa de formas alternadas para variedad visual (temprano/tardío/mixto)
-        shape_cycle = [0.8, 1.3, 1.0, 0.7, 1.5]  # k<1 early hazard; k>1 late hazard; k~1 ~ lineal
-        shape_by_rank = {i + 1: shape_cycle[i % len(shape_cycle)] for i in range(len(order))}
-
-        # Curvas por grupo: forzamos contraste usando el rango del decil
-        for idx, (d, sub) in enumerate(df.dropna(subset=["risk_decile"]).groupby("risk_decile", observed=False), start=1):
-            # Target de riesgo 12m por decil: de ~5% a ~65%, con jitter.
-            r = (idx - 1) / max(1, (len(order) - 1))  # 0..1
-            base_c12 = 0.05 + 0.60 * r
-            jitter = np.random.uniform(-0.02, 0.02)
-            c12 = float(np.clip(base_c12 + jitter, 0.02, 0.90))
-
-            # Forma (k): alterna según rank; pequeños ajustes con la media de riesgo observada
-            k = float(shape_by_rank[idx])
-            mean_rf = float(np.clip(sub["risk_factor"].mean(), 0.01, 0.95))
-            # Si el grupo ya tiene riesgo medio alto, empuja un poco a k<1 (temprano)
-            k = float(np.clip(k - 0.25 * (mean_rf - 0.5), 0.6, 1.7))
-
-            cum = _weibull_curve(c12, k, months)
-            for m, c in zip(months, cum):
-                records.append({"decile": str(d), "month": int(m), "cum_risk": float(np.clip(c, 0, 0.95))})
-
-    data = pd.DataFrame(records)
+    data, order = prep["data"], prep["order"]
+    force_single = order is None
     if data.empty:
         st.warning("No fue posible construir la curva de riesgo acumulado (data vacía).")
         return
 
     # --- Gráfico ---
+    alt = get_altair()
     chart = (
         alt.Chart(data)
         .mark_line()
@@ -217,37 +306,28 @@ def survival_deciles(df: pd.DataFrame, debug: bool = False) -> None:
         )
         .properties(height=260)
     )
-    st.altair_chart(chart, use_container_width=True)
+    render_chart(chart, "survival_deciles", key=key)
 
 
 # ---------------------------------------------------
 # 4) Barras de “feature contributions” (suscripción)
 # ---------------------------------------------------
-def top_features_bar(contribs, top_n: int = 10, title: str = "Contribución al riesgo (±)") -> None:
+def top_features_bar(contribs, top_n: int = 10, title: str = "Contribución al riesgo (±)",
+                     key: Optional[Hashable] = None) -> None:
     """
     Dibuja barras horizontales con contribuciones (positivas/negativas).
-    - `contribs` puede ser dict {feature: value} o DataFrame con
-      columnas ['feature', 'contribution'] (se intentan inferencias).
+    - `contribs` puede ser dict {feature: value}, Series, lista de
+      {name, contrib} (top_features) o DataFrame con columnas
+      ['feature', 'contribution'] (p.ej. risk_api.attribution_summary).
+    - Barras y etiquetas comparten el mismo dataset en el spec.
     """
-    # Normalización de input
-    if isinstance(contribs, dict):
-        df = pd.DataFrame({"feature": list(contribs.keys()), "contribution": list(contribs.values())})
-    else:
-        df = pd.DataFrame(contribs).copy()
-        # Intento de inferir nombres
-        cols = {c.lower(): c for c in df.columns}
-        fcol = cols.get("feature") or cols.get("name") or list(df.columns)[0]
-        vcol = cols.get("contribution") or cols.get("value") or list(df.columns)[1]
-        df = df.rename(columns={fcol: "feature", vcol: "contribution"})[["feature", "contribution"]]
-
+    with span("chart.top_features.data", "chart"):
+        df = top_features_data(contribs, top_n)
     if df.empty:
         st.info("No hay contribuciones para mostrar.")
         return
 
-    df["abs"] = df["contribution"].abs()
-    df = df.sort_values("abs", ascending=False).head(top_n)
-    df["sign"] = np.where(df["contribution"] >= 0, "Aumenta riesgo", "Disminuye riesgo")
-
+    alt = get_altair()
     chart = (
         alt.Chart(df)
         .mark_bar()
@@ -263,64 +343,23 @@ def top_features_bar(contribs, top_n: int = 10, title: str = "Contribución al r
     # Etiquetas al final de las barras
     text = chart.mark_text(align="left", dx=4).encode(text=alt.Text("contribution:Q", format=".3f"))
 
-    st.altair_chart(chart + text, use_container_width=True)
+    render_chart(chart + text, "top_features", key=key)
 
 
 # --------------------------------------------
 # 5) Barras de escenarios (simulador financiero)
 # --------------------------------------------
 def scenario_bars(data, x=None, y=None, color=None, title: str = "Escenarios") -> None:
-    # ... (SIN CAMBIOS)
-    if isinstance(data, dict):
-        df = pd.DataFrame([{"scenario": k, "value": v} for k, v in data.items()])
-    elif isinstance(data, list):
-        df = pd.DataFrame(data)
-    else:
-        df = pd.DataFrame(data).copy()
-
-    if df.empty:
+    with span("chart.scenario_bars.data", "chart"):
+        long_df = scenario_long(data, x=x, y=y, color=color)
+    if long_df is None:
+        st.info("Estructura de escenarios no reconocida.")
+        return
+    if long_df.empty:
         st.info("No hay datos de escenarios para graficar.")
         return
 
-    cols_low = [c.lower() for c in df.columns]
-    colmap = {c.lower(): c for c in df.columns}
-
-    if {"scenario", "metric", "value"}.issubset(set(cols_low)):
-        scenario_col = colmap["scenario"]
-        metric_col = colmap["metric"]
-        value_col = colmap["value"]
-        long_df = df[[scenario_col, metric_col, value_col]].rename(columns={
-            scenario_col: "scenario", metric_col: "metric", value_col: "value"
-        })
-    else:
-        if "scenario" in cols_low:
-            scenario_col = colmap["scenario"]
-            metric_cols = [c for c in df.columns if c != scenario_col]
-            if len(metric_cols) == 0:
-                long_df = df.rename(columns={df.columns[0]: "scenario", df.columns[1]: "value"})
-                long_df["metric"] = "valor"
-                long_df = long_df[["scenario", "metric", "value"]]
-            else:
-                long_df = df.melt(id_vars=[scenario_col], var_name="metric", value_name="value")
-                long_df = long_df.rename(columns={scenario_col: "scenario"})
-        else:
-            if set(["name", "value"]).issubset(set(cols_low)):
-                long_df = df.rename(columns={colmap["name"]: "scenario", colmap["value"]: "value"})
-                long_df["metric"] = "valor"
-                long_df = long_df[["scenario", "metric", "value"]]
-            elif df.shape[1] >= 2:
-                long_df = df.iloc[:, :2].copy()
-                long_df.columns = ["scenario", "value"]
-                long_df["metric"] = "valor"
-                long_df = long_df[["scenario", "metric", "value"]]
-            else:
-                st.info("Estructura de escenarios no reconocida.")
-                return
-
-    if x: long_df = long_df.rename(columns={x: "scenario"})
-    if y: long_df = long_df.rename(columns={y: "value"})
-    if color: long_df = long_df.rename(columns={color: "metric"})
-
+    alt = get_altair()
     chart = (
         alt.Chart(long_df)
         .mark_bar()
@@ -332,4 +371,27 @@ def scenario_bars(data, x=None, y=None, color=None, title: str = "Escenarios") -
         )
         .properties(height=320, title=title)
     )
-    st.altair_chart(chart, use_container_width=True)
+    render_chart(chart, "scenario_bars")
+
+def cashflow_lines(data: pd.DataFrame, y: str = "claims", color: str = "scenario",
+                   title: str = "Siniestros proyectados por mes", y_title: str = "Siniestros",
+                   key: Optional[Hashable] = None) -> None:
+    """Líneas mes × `y` por `color` (formato largo de services.cashflow)."""
+    if key is not None and show_cached("cashflow_lines", key):
+        return
+    if data is None or data.empty:
+        st.info("No hay proyección para graficar.")
+        return
+    alt = get_altair()
+    chart = (
+        alt.Chart(data[["month", color, y]])
+        .mark_line(point=True)
+        .encode(
+            x=alt.X("month:O", title="Mes"),
+            y=alt.Y(f"{y}:Q", title=y_title),
+            color=alt.Color(f"{color}:N", title=None),
+            tooltip=["month", color, alt.Tooltip(f"{y}:Q", format=",.0f")],
+        )
+        .properties(height=300, title=title)
+    )
+    render_chart(chart, "cashflow_lines", key=key)
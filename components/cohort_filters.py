@@ -1,6 +1,7 @@
 # components/cohort_filters.py
 import streamlit as st
 import pandas as pd
+from utils.cohorts import DX_OPTIONS, GAP_OPTIONS, RISK_BAND_OPTIONS, cohort_mask, cohort_description
 
 def cohort_builder(df: pd.DataFrame):
     with st.expander("Filtros de cohorte", expanded=True):
@@ -8,22 +9,13 @@ def cohort_builder(df: pd.DataFrame):
         sex = st.multiselect("Sexo", options=["F","M"], default=["F","M"])
         region = st.multiselect("Región", options=sorted(df["region"].unique().tolist()),
                                 default=sorted(df["region"].unique().tolist()))
-        dx = st.multiselect("Diagnósticos (CIE-10)", options=["I10","E11","N18","I21","E78"], default=[])
-        risk_band = st.select_slider("Banda de riesgo", options=["Todos","Bajo (<0.15)","Medio (0.15-0.3)","Alto (≥0.3)"], value="Todos")
+        dx = st.multiselect("Diagnósticos (CIE-10)", options=DX_OPTIONS, default=[])
+        risk_band = st.select_slider("Banda de riesgo", options=RISK_BAND_OPTIONS, value="Todos")
+        gap_labels = []
+        if "gap_mask" in df.columns:
+            gap_labels = st.multiselect("Brechas de cuidado (alguna)", options=list(GAP_OPTIONS), default=[])
+        gaps = [GAP_OPTIONS[g] for g in gap_labels]
 
-    mask = (
-        (df["age"].between(age_min, age_max)) &
-        (df["sex"].isin(sex)) &
-        (df["region"].isin(region))
-    )
-    if dx:
-        mask &= df["dx_cie10"].str.contains("|".join(dx))
-    if risk_band == "Bajo (<0.15)":
-        mask &= df["risk_factor"] < 0.15
-    elif risk_band == "Medio (0.15-0.3)":
-        mask &= df["risk_factor"].between(0.15, 0.3)
-    elif risk_band == "Alto (≥0.3)":
-        mask &= df["risk_factor"] >= 0.3
-
-    desc = f"Edad {age_min}-{age_max}, Sexos {','.join(sex)}, Regiones {len(region)}, Dx {','.join(dx) if dx else '—'}, Banda {risk_band}"
+    mask = cohort_mask(df, (age_min, age_max), sex, region, dx, risk_band, gaps)
+    desc = cohort_description((age_min, age_max), sex, region, dx, risk_band, gaps)
     return mask, desc
@@ -0,0 +1,63 @@
+# components/drift_panel.py
+# ---------------------------------------------------------------------
+# Panel de drift (PSI / KS): compara la población actual o un snapshot
+# mensual contra otro snapshot (por defecto, el último guardado) antes
+# de confiar en la corrida nueva. Perfiles y reporte cacheados por par
+# de datasets (services.drift.drift_report).
+# ---------------------------------------------------------------------
+
+import streamlit as st
+
+CURRENT = "Población actual"
+
+
+def render_drift_panel(df, country: str) -> None:
+    from services.drift import PSI_MAJOR, PSI_MODERATE, drift_report
+    from services.snapshots import SnapshotStore
+
+    store = SnapshotStore()
+    months = store.months(country)
+
+    with st.expander("Drift de población (PSI / KS)", expanded=False):
+        st.caption(
+            "PSI y KS por variable del score, riesgo, mezcla por región y prevalencia de "
+            f"códigos CIE-10 / ATC. PSI < {PSI_MODERATE:g} estable; {PSI_MODERATE:g}–{PSI_MAJOR:g} "
+            f"moderado; > {PSI_MAJOR:g} significativo."
+        )
+        if not months:
+            st.info("Sin snapshots guardados para este país: registra uno en el panel de snapshots "
+                    "para tener una corrida de referencia.")
+            return
+        c1, c2, c3 = st.columns([1, 1, 1])
+        with c1:
+            ref = st.selectbox("Referencia", months[::-1], key="drift_ref")
+        with c2:
+            cur = st.selectbox("Comparar", [CURRENT] + months[::-1], key="drift_cur")
+        with c3:
+            st.write("")
+            only = st.toggle("Sólo con drift", value=False, key="drift_only",
+                             help=f"Muestra sólo variables con PSI ≥ {PSI_MODERATE:g}.")
+
+        with st.spinner("Calculando drift…"):
+            rep = drift_report(store.path(country, ref), df if cur == CURRENT else store.path(country, cur))
+
+        m = st.columns(3)
+        m[0].metric("PSI máximo", f"{rep['psi'].max():.3f}",
+                    rep.loc[rep["psi"].idxmax(), "label"] if len(rep) else None, delta_color="off")
+        m[1].metric("Significativas", int((rep["level"] == "significativo").sum()))
+        m[2].metric("Moderadas", int((rep["level"] == "moderado").sum()))
+
+        view = rep[rep["psi"] >= PSI_MODERATE] if only else rep
+        st.dataframe(
+            view.sort_values("psi", ascending=False)[["label", "kind", "psi", "ks", "ref", "cur", "level"]],
+            use_container_width=True, hide_index=True,
+            column_config={
+                "label": "Variable", "kind": "Tipo", "level": "Nivel",
+                "psi": st.column_config.NumberColumn("PSI", format="%.4f"),
+                "ks": st.column_config.NumberColumn("KS", format="%.4f",
+                                                    help="Categorías y códigos: máx |Δ proporción|."),
+                "ref": st.column_config.NumberColumn(f"Ref. ({ref})", format="%.3f",
+                                                     help="Media (numéricas) o proporción."),
+                "cur": st.column_config.NumberColumn(f"{cur}", format="%.3f"),
+            },
+        )
@@ -0,0 +1,89 @@
+# components/profiling_panel.py
+# ---------------------------------------------------------------
+# Panel de perfilado por rerun (modo debug): waterfall de spans en
+# la barra lateral + descarga de la traza (JSON / Chrome trace) +
+# bytes retenidos por la sesión y por las caches del proceso.
+# ---------------------------------------------------------------
+
+import streamlit as st
+
+from utils.profiling import Trace, begin_trace, current_trace, enabled_by_env, end_trace
+
+def start_page_trace(page: str) -> Trace:
+    """
+    Dibuja el toggle de perfilado y, si está activo, inicia la traza del
+    rerun. Llamar al inicio de la página (después del selector País/Rol).
+    Por defecto se activa con CORPUS_PROFILING=1.
+    """
+    on = st.sidebar.toggle("Perfilado (debug)", value=enabled_by_env(), key="profiling_on",
+                           help="Mide tiempos de carga, scoring, cohorte, KPIs y gráficos en cada rerun.")
+    return begin_trace(page, enabled=on)
+
+def render_trace_panel(trace=None) -> None:
+    """Cierra la traza activa y dibuja el waterfall en la barra lateral."""
+    tr = trace if trace is not None else current_trace()
+    end_trace()
+    if tr is None:
+        return
+
+    import pandas as pd
+
+    spans = pd.DataFrame(tr.spans)
+    with st.sidebar.expander(f"⏱️ Perfil del rerun — {tr.elapsed*1e3:,.0f} ms", expanded=True):
+        if spans.empty:
+            st.caption("Sin spans registrados en este rerun.")
+        else:
+            from components.charts import get_altair, render_chart
+
+            alt = get_altair()
+            spans = spans.sort_values("start_ms").reset_index(drop=True)
+            spans["end_ms"] = spans["start_ms"] + spans["dur_ms"]
+            spans["label"] = ["  " * d + n for d, n in zip(spans["depth"], spans["name"])]
+            spans["payload_kb"] = [
+                (a or {}).get("payload_bytes", 0) / 1024 for a in spans["args"]
+            ]
+            chart = (
+                alt.Chart(spans[["label", "cat", "start_ms", "end_ms", "dur_ms", "payload_kb"]])
+                .mark_bar()
+                .encode(
+                    y=alt.Y("label:N", sort=None, title=None),
+                    x=alt.X("start_ms:Q", title="ms desde inicio del rerun"),
+                    x2="end_ms:Q",
+                    color=alt.Color("cat:N", title="Tipo", legend=alt.Legend(orient="bottom")),
+                    tooltip=["label", alt.Tooltip("dur_ms:Q", format=".1f"),
+                             alt.Tooltip("payload_kb:Q", format=".1f", title="payload KB")],
+                )
+                .properties(height=max(120, 18 * len(spans)))
+            )
+            render_chart(chart, "trace_waterfall")   # sin cache: cada rerun tiene su traza
+
+        if tr.counters:
+            st.dataframe(
+                pd.DataFrame([{"contador": k, "valor": v} for k, v in tr.counters.items()]),
+                use_container_width=True, hide_index=True,
+            )
+        c1, c2 = st.columns(2)
+        c1.download_button("JSON", tr.to_json(), file_name=f"trace_{tr.name}.json",
+                           mime="application/json", key="trace_json")
+        c2.download_button("Chrome", tr.to_chrome_trace(), file_name=f"trace_{tr.name}.chrome.json",
+                           mime="application/json", key="trace_chrome",
+                           help="Abrir en chrome://tracing o ui.perfetto.dev")
+
+    render_memory_panel()
+
+def render_memory_panel() -> None:
+    """Bytes por clave de st.session_state y por cache compartida (utils/memory)."""
+    import pandas as pd
+
+    from utils.memory import cache_memory, fmt_bytes, session_memory
+
+    rows = session_memory(st.session_state)
+    caches = cache_memory()
+    total = sum(r["bytes"] for r in rows)
+    shared = sum(r["bytes"] for r in caches)
+    with st.sidebar.expander(f"💾 Memoria — sesión {fmt_bytes(total)}", expanded=False):
+        st.caption(f"Caches compartidas por todas las sesiones del proceso: {fmt_bytes(shared)}")
+        if rows:
+            st.dataframe(pd.DataFrame(rows[:20]), use_container_width=True, hide_index=True)
+        if caches:
+            st.dataframe(pd.DataFrame(caches), use_container_width=True, hide_index=True)
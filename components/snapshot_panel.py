@@ -0,0 +1,63 @@
+# components/snapshot_panel.py
+# ---------------------------------------------------------------------
+# Panel de snapshots mensuales: registra el mes siguiente (simulado con
+# evolve_population) con scoring incremental y muestra el reporte delta.
+# ---------------------------------------------------------------------
+
+import datetime as _dt
+
+import streamlit as st
+
+
+def _next_month(month: str) -> str:
+    y, m = map(int, month.split("-"))
+    return f"{y + m // 12}-{m % 12 + 1:02d}"
+
+def render_snapshot_panel(df, country: str) -> None:
+    from services.data_io import evolve_population
+    from services.snapshots import SnapshotStore, input_columns, refresh_snapshot
+
+    store = SnapshotStore()
+    months = store.months(country)
+    key = f"snapshot_report::{country}"
+
+    with st.expander("Snapshots mensuales (scoring incremental)", expanded=False):
+        st.caption(
+            "Cada mes se guarda la población puntuada; al registrar el siguiente sólo se "
+            "re-puntúan altas y afiliados cuyo contenido cambió (hash por fila)."
+        )
+        st.write(f"Meses guardados: {', '.join(months) if months else '—'}")
+        c1, c2 = st.columns([1, 1])
+        with c1:
+            churn = st.slider("Afiliados con cambios (%)", 0.0, 30.0, 5.0, 0.5, key="snapshot_churn")
+        with c2:
+            st.write("")
+            go = st.button("Registrar mes siguiente", key="snapshot_go")
+
+        if go:
+            with st.spinner("Actualizando snapshot…"):
+                if not months:
+                    raw = df[input_columns(df)]
+                    month = _dt.date.today().strftime("%Y-%m")
+                else:
+                    last = store.load(country, months[-1])
+                    raw = evolve_population(last[input_columns(last)], country, seed=len(months),
+                                            p_change=churn / 100.0)
+                    month = _next_month(months[-1])
+                _, rep = refresh_snapshot(raw, month, country, store)
+            st.session_state[key] = rep
+
+        rep = st.session_state.get(key)
+        if rep:
+            s = rep["summary"]
+            st.markdown(f"**{s['month']}** vs {s['prev_month'] or '—'}")
+            m = st.columns(5)
+            m[0].metric("Re-puntuados", f"{s['rescored']:,}", f"de {s['n_now']:,}", delta_color="off")
+            m[1].metric("Altas / bajas", f"{s['entered']:,} / {s['left']:,}")
+            m[2].metric("Cambiados", f"{s['changed']:,}")
+            m[3].metric("→ Alto riesgo", f"{s['to_high']:,}")
+            m[4].metric("Alto riesgo →", f"{s['from_high']:,}")
+            st.dataframe(rep["kpis"], use_container_width=True, hide_index=True)
+            if not rep["to_high"].empty:
+                st.markdown("Afiliados que entran a alto riesgo")
+                st.dataframe(rep["to_high"].head(50), use_container_width=True, hide_index=True)
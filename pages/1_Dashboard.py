@@ -1,154 +1,272 @@
 # pages/1_Dashboard.py
-import streamlit as st
+import time
+
 import pandas as pd
-import numpy as np
-import altair as alt
+import streamlit as st
 
 from utils.auth import role_country_selector
-from services.data_io import generate_dummy_population
-from services.risk_api import score_batch
-from utils.kpis import compute_core_kpis
+from services.warmup import get_population
+from utils.chart_data import dashboard_bands, band_counts, band_means, gap_by_band, gap_counts_by_band
+from utils.cohort_view import CohortView
 import components.charts as ch             # <- import del módulo completo
 from components.cohort_filters import cohort_builder
+from components.profiling_panel import start_page_trace, render_trace_panel
+from utils.profiling import count, span
+from utils.kpis import cohort_kpis, format_cohort_kpis
+from utils.sampling import accuracy_rows, refine_in_background, stratified_sample, stratum_codes
+from services.risk_api import attribution_summary
 
 st.set_page_config(page_title="Dashboard Ejecutivo", page_icon="📊", layout="wide")
 
-try:
-    alt.data_transformers.disable_max_rows()
-except Exception:
-    pass
-
 # Única llamada al selector + toggle debug
 country, role = role_country_selector()
 debug = st.sidebar.toggle("Modo debug (curvas)", value=False, key="debug_curves")
+trace = start_page_trace("Dashboard")
 
-@st.cache_data(show_spinner=False)
-def get_scored_population(country):
-    df = generate_dummy_population(n=2500, country=country, seed=42)
-    df_scored, _ = score_batch(df, seed=123)
-    return df_scored
-
-df = get_scored_population(country)
+# Población compartida por proceso (precargada por el warm-up)
+with span("population.load", "data"):
+    pop = get_population("dashboard", country)
+df = pop["df"]
 
 st.header("Dashboard Ejecutivo — Población & Riesgo")
-kpis = compute_core_kpis(df, country)
+kpis = pop["kpis"].format(country)       # KPIs precalculados de la población completa
 from components.cards import render_cards
 render_cards(kpis)
 
 st.divider()
 mask, desc = cohort_builder(df)
-df_cohort = df[mask].copy()
-st.caption(f"Cohorte activa: {len(df_cohort):,} afiliados — {desc}")
+view = CohortView(df, mask.to_numpy())     # sin copia: base compartido + filas
+st.caption(f"Cohorte activa: {len(view):,} afiliados — {desc}")
 
-col1, col2 = st.columns([1.1, 1])
-with col1:
-    st.subheader("Distribución de riesgo")
-    if df_cohort.empty:
-        st.info("No hay datos para la cohorte seleccionada.")
-    else:
-        ch.risk_hist(df_cohort)
+# Banda de riesgo, franjas etarias y brechas (columnas derivadas de la vista)
+with span("chart.bands.data", "chart"):
+    view = view.assign(**dashboard_bands(view))
 
-with col2:
-    st.subheader("Riesgo por región (heat)")
-    if df_cohort.empty:
+# Modo progresivo: primero KPIs/gráficos desde una muestra estratificada
+# (región × banda) con IC 95 %, luego el resultado exacto reemplaza la vista
+progressive = st.sidebar.toggle("Modo progresivo (muestra)", value=False, key="dash_progressive",
+                                help="Pinta primero desde una muestra estratificada y refina a exacto.")
+sample_n = int(st.sidebar.number_input("Tamaño de muestra", min_value=200, max_value=50_000, value=2_000,
+                                       step=100, key="dash_sample_n", disabled=not progressive))
+
+def render_cohort_kpis(v, sample=None):
+    cards, helps = format_cohort_kpis(cohort_kpis(v, sample))
+    render_cards(cards, cols=4, helps=helps)
+
+def render_charts(v, weight=None):
+    """
+    Gráficos de la cohorte `v`; con `weight` (columna de pesos) los conteos y medias son
+    estimados. Deciles, B, C y F muestran filas de la muestra: se rotulan "sin ponderar".
+    Specs cacheados por (gráfico, huella de la cohorte, parámetros): un rerun que no
+    cambia la cohorte (p.ej. otro widget) no arma ni serializa ningún gráfico.
+    """
+    wcols = [weight] if weight else []
+
+    def raw():      # gráficos de filas: en la muestra no se ponderan
+        if weight:
+            st.caption("Muestra (sin ponderar)")
+        else:
+            st.empty()   # mismo número de elementos en ambas pasadas (ver charts_slot)
+
+    with span("chart.signature", "chart"):
+        key = (v.signature(), weight)
+    col1, col2 = st.columns([1.1, 1])
+    with col1:
+        st.subheader("Distribución de riesgo")
+        if v.empty:
+            st.info("No hay datos para la cohorte seleccionada.")
+        elif not ch.show_cached("risk_hist", key):
+            ch.risk_hist(v.frame(["risk_factor"] + wcols), key=key, weight=weight)
+
+    with col2:
+        st.subheader("Riesgo por región (heat)")
+        if v.empty:
+            st.info("No hay datos para la cohorte seleccionada.")
+        elif not ch.show_cached("region_heat", key):
+            ch.region_heat(v.frame(["region", "risk_factor", "patient_id"] + wcols), key=key, weight=weight)
+
+    st.subheader("Curvas de riesgo acumulado por decil")
+    raw()
+    if v.empty:
         st.info("No hay datos para la cohorte seleccionada.")
+    elif not ch.show_cached("survival_deciles", key):
+        ch.survival_deciles(v.frame(["risk_factor"]), debug=debug, key=key)
+
+    # ================================
+    # Exploraciones adicionales (5)
+    # ================================
+    st.divider()
+    st.subheader("Exploraciones adicionales (piloto)")
+
+    if v.empty:
+        st.info("No hay datos para graficar visualizaciones adicionales.")
     else:
-        ch.region_heat(df_cohort)
+        alt = ch.get_altair()              # Altair se carga al primer gráfico
+
+        # (A) Conteo por banda
+        c1, c2 = st.columns(2)
+        with c1:
+            st.markdown("**A. Conteo por banda de riesgo**")
+            if not ch.show_cached("A1", key):
+                with span("chart.A1.data", "chart"):
+                    agg_cnt = band_counts(v.frame(["risk_band"] + wcols), weight)
+                chart_a1 = alt.Chart(agg_cnt).mark_bar().encode(
+                    x=alt.X("risk_band:N", title="Banda de riesgo", sort=["Bajo (<0.15)","Medio (0.15–0.30)","Alto (≥0.30)"]),
+                    y=alt.Y("size:Q", title="Pacientes"),
+                    tooltip=["risk_band","size"]
+                ).properties(height=240)
+                ch.render_chart(chart_a1, "A1", key=key)
+
+        with c2:
+            st.markdown("**A2. Riesgo promedio por banda**")
+            if not ch.show_cached("A2", key):
+                with span("chart.A2.data", "chart"):
+                    agg_mean = band_means(v.frame(["risk_band", "risk_factor"] + wcols), weight)
+                chart_a2 = alt.Chart(agg_mean).mark_bar().encode(
+                    x=alt.X("risk_mean:Q", title="Riesgo promedio"),
+                    y=alt.Y("risk_band:N", title=None, sort=["Bajo (<0.15)","Medio (0.15–0.30)","Alto (≥0.30)"]),
+                    tooltip=["risk_band","risk_mean"]
+                ).properties(height=240)
+                ch.render_chart(chart_a2, "A2", key=key)
+
+        # (B) Riesgo vs eGFR con tendencia
+        st.markdown("**B. Riesgo vs eGFR (con tendencia)**")
+        raw()
+        if not ch.show_cached("B", key):   # dispersión y tendencia: un solo dataset
+            scatter = alt.Chart(v.frame(["patient_id","egfr","risk_factor","age","region","risk_band"])).mark_circle(size=30, opacity=0.35).encode(
+                x=alt.X("egfr:Q", title="eGFR"),
+                y=alt.Y("risk_factor:Q", title="Riesgo"),
+                tooltip=["patient_id","egfr","risk_factor","age","region","risk_band"]
+            )
+            trend = scatter.transform_regression("egfr", "risk_factor").mark_line()
+            ch.render_chart((scatter + trend).properties(height=260), "B", key=key)
+
+        # (C) Boxplots por región
+        st.markdown("**C. Distribución de riesgo por región (boxplot)**")
+        raw()
+        if not ch.show_cached("C", key):
+            chart_box = alt.Chart(v.frame(["region", "risk_factor"])).mark_boxplot().encode(
+                x=alt.X("region:N", title="Región"),
+                y=alt.Y("risk_factor:Q", title="Riesgo"),
+                color=alt.Color("region:N", legend=None),
+                tooltip=["region"]
+            ).properties(height=260)
+            ch.render_chart(chart_box, "C", key=key)
+
+        # (D) Heatmap Utilizaciones vs Riesgo (binned en canales)
+        st.markdown("**D. Uso de servicios vs Riesgo (heatmap binned)**")
+        if not ch.show_cached("D", key):
+            n_d = f"sum({weight}):Q" if weight else "count():Q"   # muestra: Σ pesos = N estimado
+            hmap = alt.Chart(v.frame(["utilizations_12m", "risk_factor"] + wcols)).mark_rect().encode(
+                x=alt.X("utilizations_12m:Q", bin=alt.Bin(maxbins=20), title="Utilizaciones 12m (binned)"),
+                y=alt.Y("risk_factor:Q",       bin=alt.Bin(maxbins=20), title="Riesgo (binned)"),
+                color=alt.Color(n_d, title="N"),
+                tooltip=[alt.Tooltip(n_d, title="N", format=",.0f")]
+            ).properties(height=260)
+            ch.render_chart(hmap, "D", key=key)
+
+        # (E) Brechas de cuidado por banda
+        st.markdown("**E. Brechas de cuidado por banda de riesgo**")
+        if not ch.show_cached("E", key):
+            with span("chart.E.data", "chart"):
+                agg_gap = gap_by_band(v.frame(["risk_band", "has_gap"] + wcols), weight)
+            chart_gap = alt.Chart(agg_gap).mark_bar().encode(
+                x=alt.X("risk_band:N", title="Banda", sort=["Bajo (<0.15)","Medio (0.15–0.30)","Alto (≥0.30)"]),
+                y=alt.Y("size:Q", title="Pacientes"),
+                color=alt.Color("has_gap_label:N", title="Estado"),
+                tooltip=["risk_band","has_gap_label","size"]
+            ).properties(height=260)
+            ch.render_chart(chart_gap, "E", key=key)
 
-st.subheader("Curvas de riesgo acumulado por decil")
-if df_cohort.empty:
-    st.info("No hay datos para la cohorte seleccionada.")
-else:
-    ch.survival_deciles(df_cohort, debug=debug)
+        st.markdown("**E2. Pacientes por brecha y banda de riesgo**")
+        if not ch.show_cached("E2", key):
+            with span("chart.E2.data", "chart"):
+                agg_gap2 = gap_counts_by_band(v.frame(["risk_band", "gap_mask"] + wcols), weight=weight)
+            chart_gap2 = alt.Chart(agg_gap2).mark_bar().encode(
+                x=alt.X("n:Q", title="Pacientes"),
+                y=alt.Y("gap:N", title=None),
+                color=alt.Color("risk_band:N", title="Banda", sort=["Bajo (<0.15)","Medio (0.15–0.30)","Alto (≥0.30)"]),
+                tooltip=["gap","risk_band","n"]
+            ).properties(height=160)
+            ch.render_chart(chart_gap2, "E2", key=key)
+
+        # (F) Atribuciones exactas de la cohorte (precalculadas con la población)
+        st.markdown("**F. Factores de riesgo de la cohorte (contribución media al logit)**")
+        raw()
+        if not ch.show_cached("top_features", key):
+            with span("chart.F.data", "chart"):
+                summary = attribution_summary(pop["attr"].iloc[v.rows])
+            ch.top_features_bar(summary, title="Contribución media vs. paciente de referencia", key=key)
+        if not ch.show_cached("F", key):
+            with span("chart.F.data", "chart"):
+                by_band = attribution_summary(pop["attr"].iloc[v.rows], by=v.col("risk_band"), how="mean_abs")
+            heat_f = alt.Chart(by_band).mark_rect().encode(
+                x=alt.X("group:N", title="Banda", sort=["Bajo (<0.15)","Medio (0.15–0.30)","Alto (≥0.30)"]),
+                y=alt.Y("feature:N", title=None),
+                color=alt.Color("contribution:Q", title="|Contribución| media"),
+                tooltip=["group","feature",alt.Tooltip("contribution:Q", format=".3f")]
+            ).properties(height=300)
+            ch.render_chart(heat_f, "F", key=key)
+
+kpi_slot, charts_slot = st.empty(), st.empty()
+approx = progressive and len(view) > sample_n
+if approx:
+    t0 = time.perf_counter()
+    with span("progressive.sample", "cohort"):
+        sample = stratified_sample(stratum_codes(view, ["region", "risk_band"]), sample_n, keys=view.rows)
+        sv = view.filter(sample.positions).assign(w=sample.weights)
+        exact_fut = refine_in_background(cohort_kpis, view)   # KPIs exactos en segundo plano
+        est = cohort_kpis(sv, sample)
+    with kpi_slot.container():
+        render_cohort_kpis(sv, sample)
+    with charts_slot.container():
+        st.caption(f"≈ Vista aproximada: muestra estratificada de {len(sample):,} de {len(view):,} "
+                   "afiliados (región × banda de riesgo); refinando a resultados exactos…")
+        render_charts(sv, weight="w")
+    approx_s = time.perf_counter() - t0
+
+    with span("progressive.exact", "cohort"):
+        exact = exact_fut.result()
+        rows = accuracy_rows(est, {k: v["value"] for k, v in exact.items()})
+    count("progressive.kpis_in_ci", sum(r["en_IC95"] for r in rows))
+    log = st.session_state.setdefault("progressive_accuracy", [])
+    log.append({"cohorte": len(view), "muestra": len(sample), "s_aprox": round(approx_s, 3),
+                **{f"err_rel {r['métrica']}": r["error_rel"] for r in rows},
+                "en_IC95": f"{sum(r['en_IC95'] for r in rows)}/{len(rows)}"})
+    del log[:-50]
+
+# La pasada exacta reescribe los mismos slots. Streamlit compone los mensajes
+# pendientes con el mismo delta path y un container nuevo hereda los hijos del
+# anterior: vaciar el slot no alcanza si todavía no se envió. Por eso ambas
+# pasadas escriben la misma secuencia de elementos (raw() deja un st.empty()
+# donde la muestra rotula) y cada elemento exacto pisa al aproximado de su
+# índice. benchmarks/loadtest.py::check_progressive lo verifica.
+if approx:
+    kpi_slot.empty()
+    charts_slot.empty()
+with kpi_slot.container():
+    render_cohort_kpis(view)
+with charts_slot.container():
+    if approx:
+        st.caption("Resultados exactos (reemplazaron la vista aproximada).")
+    render_charts(view)
+
+if progressive:
+    with st.expander("Precisión del modo progresivo (muestra vs. exacto)", expanded=False):
+        if approx:
+            st.dataframe(pd.DataFrame(rows), use_container_width=True, hide_index=True)
+        else:
+            st.caption(f"La cohorte ({len(view):,}) no supera la muestra ({sample_n:,}): se calculó exacto.")
+        if st.session_state.get("progressive_accuracy"):
+            st.caption("Historial de la sesión")
+            st.dataframe(pd.DataFrame(st.session_state["progressive_accuracy"]), use_container_width=True)
 
-# ================================
-# Exploraciones adicionales (5)
-# ================================
 st.divider()
-st.subheader("Exploraciones adicionales (piloto)")
-
-if df_cohort.empty:
-    st.info("No hay datos para graficar visualizaciones adicionales.")
-else:
-    df_cohort = df_cohort.copy()
-
-    # Banda de riesgo
-    df_cohort["risk_band"] = pd.cut(
-        df_cohort["risk_factor"],
-        bins=[0, 0.15, 0.3, 1.0],
-        labels=["Bajo (<0.15)", "Medio (0.15–0.30)", "Alto (≥0.30)"],
-        include_lowest=True
-    )
-    # Franjas etarias
-    df_cohort["age_band"] = pd.cut(
-        df_cohort["age"], bins=[18, 40, 55, 70, 90],
-        labels=["18–39", "40–55", "56–70", "71–90"], include_lowest=True
-    )
-    # Tiene brechas
-    df_cohort["has_gap"] = df_cohort["care_gaps"].fillna("").str.len().gt(0)
-
-    # (A) Conteo por banda
-    c1, c2 = st.columns(2)
-    with c1:
-        st.markdown("**A. Conteo por banda de riesgo**")
-        agg_cnt = df_cohort.groupby("risk_band", dropna=False, as_index=False, observed=False).size()
-        chart_a1 = alt.Chart(agg_cnt).mark_bar().encode(
-            x=alt.X("risk_band:N", title="Banda de riesgo", sort=["Bajo (<0.15)","Medio (0.15–0.30)","Alto (≥0.30)"]),
-            y=alt.Y("size:Q", title="Pacientes"),
-            tooltip=["risk_band","size"]
-        ).properties(height=240)
-        st.altair_chart(chart_a1, use_container_width=True)
-
-    with c2:
-        st.markdown("**A2. Riesgo promedio por banda**")
-        agg_mean = df_cohort.groupby("risk_band", dropna=False, as_index=False, observed=False).agg(
-            risk_mean=("risk_factor","mean")
-        )
-        chart_a2 = alt.Chart(agg_mean).mark_bar().encode(
-            x=alt.X("risk_mean:Q", title="Riesgo promedio"),
-            y=alt.Y("risk_band:N", title=None, sort=["Bajo (<0.15)","Medio (0.15–0.30)","Alto (≥0.30)"]),
-            tooltip=["risk_band","risk_mean"]
-        ).properties(height=240)
-        st.altair_chart(chart_a2, use_container_width=True)
-
-    # (B) Riesgo vs eGFR con tendencia
-    st.markdown("**B. Riesgo vs eGFR (con tendencia)**")
-    scatter = alt.Chart(df_cohort).mark_circle(size=30, opacity=0.35).encode(
-        x=alt.X("egfr:Q", title="eGFR"),
-        y=alt.Y("risk_factor:Q", title="Riesgo"),
-        tooltip=["patient_id","egfr","risk_factor","age","region","risk_band"]
-    )
-    trend = scatter.transform_regression("egfr", "risk_factor").mark_line()
-    st.altair_chart((scatter + trend).properties(height=260), use_container_width=True)
-
-    # (C) Boxplots por región
-    st.markdown("**C. Distribución de riesgo por región (boxplot)**")
-    chart_box = alt.Chart(df_cohort).mark_boxplot().encode(
-        x=alt.X("region:N", title="Región"),
-        y=alt.Y("risk_factor:Q", title="Riesgo"),
-        color=alt.Color("region:N", legend=None),
-        tooltip=["region"]
-    ).properties(height=260)
-    st.altair_chart(chart_box, use_container_width=True)
-
-    # (D) Heatmap Utilizaciones vs Riesgo (binned en canales)
-    st.markdown("**D. Uso de servicios vs Riesgo (heatmap binned)**")
-    hmap = alt.Chart(df_cohort).mark_rect().encode(
-        x=alt.X("utilizations_12m:Q", bin=alt.Bin(maxbins=20), title="Utilizaciones 12m (binned)"),
-        y=alt.Y("risk_factor:Q",       bin=alt.Bin(maxbins=20), title="Riesgo (binned)"),
-        color=alt.Color("count():Q", title="N"),
-        tooltip=[alt.Tooltip("count():Q", title="N")]
-    ).properties(height=260)
-    st.altair_chart(hmap, use_container_width=True)
-
-    # (E) Brechas de cuidado por banda
-    st.markdown("**E. Brechas de cuidado por banda de riesgo**")
-    agg_gap = df_cohort.groupby(["risk_band","has_gap"], as_index=False, observed=False).size()
-    agg_gap["has_gap_label"] = agg_gap["has_gap"].map({True:"Con brecha", False:"Sin brecha"})
-    chart_gap = alt.Chart(agg_gap).mark_bar().encode(
-        x=alt.X("risk_band:N", title="Banda", sort=["Bajo (<0.15)","Medio (0.15–0.30)","Alto (≥0.30)"]),
-        y=alt.Y("size:Q", title="Pacientes"),
-        color=alt.Color("has_gap_label:N", title="Estado"),
-        tooltip=["risk_band","has_gap_label","size"]
-    ).properties(height=260)
-    st.altair_chart(chart_gap, use_container_width=True)
+from components.cashflow_panel import render_cashflow_panel
+render_cashflow_panel(view)
+from components.drift_panel import render_drift_panel
+render_drift_panel(df, country)
+from components.snapshot_panel import render_snapshot_panel
+render_snapshot_panel(df, country)
+
+render_trace_panel(trace)
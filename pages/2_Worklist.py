@@ -2,40 +2,38 @@
 import streamlit as st
 import pandas as pd
 from utils.auth import role_country_selector
-from services.data_io import generate_dummy_population
-from services.risk_api import score_batch
+from services.warmup import get_population
 from components.cohort_filters import cohort_builder
+from components.profiling_panel import start_page_trace, render_trace_panel
+from utils.profiling import span
+from utils.cohort_view import CohortView
 
 st.set_page_config(page_title="Worklist Operativa", page_icon="🗂️", layout="wide")
 
 country, role = role_country_selector()
+trace = start_page_trace("Worklist")
 
-@st.cache_data(show_spinner=False)
-def get_scored_population(country):
-    df = generate_dummy_population(n=1500, country=country, seed=7)
-    df_scored, _ = score_batch(df, seed=55)
-    # “Proximidad temporal” sintética para ordenar: menor tw_start primero
-    df_scored["urgency"] = df_scored["risk_factor"] * (1.0 / (df_scored["tw_start"] + 0.1))
-    return df_scored
-
-df = get_scored_population(country)
+# Población compartida (incluye “urgency”; precargada por el warm-up)
+with span("population.load", "data"):
+    df = get_population("worklist", country)["df"]
 st.header("Worklist Operativa — Gestión de Casos")
 
 mask, desc = cohort_builder(df)
-sub = df[mask].copy()
+sub = CohortView(df, mask.to_numpy())     # sin copia de la cohorte
 st.caption(f"Filtro: {desc}")
 
-# Orden priorizado
-sub = sub.sort_values(["tw_start","risk_factor","urgency"], ascending=[True, False, False])
-
 # Tabla editable con “siguiente acción”
 actions = ["Llamar", "Agendar control", "Recordatorio SMS", "Referir a nefrología", "Sin acción"]
 if "actions_log" not in st.session_state:
     st.session_state["actions_log"] = []
 
 st.write("**Bandeja priorizada (Top 300)**")
-edit_cols = ["patient_id","age","sex","region","risk_factor","tw_start","tw_end","care_gaps","next_action","nota"]
-view = sub.head(300).copy()
+edit_cols = ["patient_id","age","sex","region","risk_factor","urgency","tw_start","tw_end","care_gaps",
+             "next_action","nota"]
+# Orden priorizado por P(evento a 3 meses) (continua, sin empates por
+# ventana); sólo se materializan las 300 filas visibles
+with span("worklist.sort", "cohort"):
+    view = sub.top(300, ["urgency","tw_start"], ascending=[False, True], columns=edit_cols[:-2])
 view["next_action"] = ""
 view["nota"] = ""
 edited = st.data_editor(
@@ -44,6 +42,9 @@ edited = st.data_editor(
     num_rows="fixed",
     column_config={
         "risk_factor": st.column_config.NumberColumn(format="%.3f"),
+        "urgency": st.column_config.NumberColumn("P(evento 3m)", format="%.3f"),
+        "tw_start": st.column_config.NumberColumn(format="%.1f"),
+        "tw_end": st.column_config.NumberColumn(format="%.1f"),
         "next_action": st.column_config.SelectboxColumn(options=actions),
         "nota": st.column_config.TextColumn(max_chars=120),
     },
@@ -71,3 +72,5 @@ with st.expander("Bitácora de acciones", expanded=False):
         st.dataframe(pd.DataFrame(st.session_state["actions_log"]), use_container_width=True)
     else:
         st.caption("Aún no hay acciones registradas.")
+
+render_trace_panel(trace)
@@ -1,17 +1,16 @@
 # pages/3_Suscripcion.py
 import streamlit as st
-import pandas as pd
 from utils.auth import role_country_selector
-from services.risk_api import score_one
-from components.charts import top_features_bar
+from components.profiling_panel import start_page_trace, render_trace_panel
 
 st.set_page_config(page_title="Suscripción & Tarificación", page_icon="🧮", layout="wide")
 
 country, role = role_country_selector()
+trace = start_page_trace("Suscripcion")
 st.header("Suscripción & Tarificación — Cotiza con IA (Piloto)")
 
 plan = st.selectbox("Plan", ["Básico", "Estándar", "Premium"], index=1)
-deducible = st.slider("Deducible (USD o COP equiv.)", 0, 5000, 500, step=250)
+deducible = st.slider("Deducible (USD)", 0, 5000, 500, step=250)
 coaseguro = st.slider("Coaseguro (%)", 0, 40, 20, step=5)
 
 with st.form("cotizador"):
@@ -35,6 +34,12 @@ with st.form("cotizador"):
     submitted = st.form_submit_button("Calcular prima y riesgo")
 
 if submitted:
+    # Scoring y gráficos (pandas/numpy/Altair) sólo al cotizar
+    import pandas as pd
+    from services.batcher import score_one  # coalescido con otras sesiones
+    from services.rating import RateStructure
+    from components.charts import top_features_bar, render_chart, get_altair
+
     payload = {
         "age": age, "sex": sex, "bmi": bmi, "smoker": smoker,
         "hta": hta, "dm": dm, "ckd": ckd, "prev_event": prev_event,
@@ -50,30 +55,69 @@ if submitted:
     with c1:
         st.metric("Risk factor", f"{rf:.3f}")
     with c2:
-        st.metric("Rango temporal", f"{tw[0]}–{tw[1]} meses")
+        st.metric("Rango temporal", f"{tw[0]:.1f}–{tw[1]:.1f} meses")
     with c3:
-        prima_base = 1200 if plan=="Premium" else (900 if plan=="Estándar" else 700)
-        # Ajuste muy simple por riesgo y deducible/coaseguro
-        adj = (1+rf) * (1 - deducible/10000) * (1 - coaseguro/100)
-        prima = max(25, prima_base * adj)
+        # Ajuste muy simple por riesgo y deducible/coaseguro (services/rating.py)
+        prima = RateStructure(plan, deducible, coaseguro).premium(rf)
         st.metric("Prima sugerida (sim.)", f"${prima:,.0f}")
 
-    st.caption("Top factores (explicabilidad simulada)")
+    st.caption("Top factores: contribución al logit vs. paciente de referencia (exacta, modelo lineal)")
     top_features_bar(res["top_features"])
 
     st.subheader("Sensibilidad de prima")
-    import altair as alt
+    alt = get_altair()
     df = pd.DataFrame({
         "deducible": [0, 1000, 2000, 3000, 4000, 5000],
         "coaseguro": [0, 10, 20, 30, 40, 40],
     })
-    df["prima"] = [max(25, prima_base*(1+rf)*(1-d/10000)*(1-c/100)) for d,c in zip(df["deducible"], df["coaseguro"])]
+    df["prima"] = [RateStructure(plan, d, c).premium(rf) for d, c in zip(df["deducible"], df["coaseguro"])]
     chart = alt.Chart(df).mark_line(point=True).encode(
         x=alt.X("deducible:Q", title="Deducible"),
         y=alt.Y("prima:Q", title="Prima (simulada)"),
         color=alt.value("#08d19f"),
         tooltip=["deducible","coaseguro","prima"]
     ).properties(height=240)
-    st.altair_chart(chart, use_container_width=True)
+    render_chart(chart, "sensibilidad")
 else:
     st.info("Completa el formulario y pulsa **Calcular prima y riesgo**.")
+
+# Re-tarificación del libro completo con el plan de arriba (vectorizada)
+st.divider()
+if st.toggle("Re-tarificar el libro con este plan", value=False, key="rerate_book",
+             help="Primas de toda la población puntuada y suficiencia vs. siniestros esperados."):
+    from services.rating import PREMIUM_CURRENCY, SEVERITY_FX, SEVERITY_UNIT, RateStructure, book_for
+    from services.warmup import get_population
+
+    cur = SEVERITY_UNIT
+    fx = st.number_input(f"Tipo de cambio de siniestros ({cur} por 1 {PREMIUM_CURRENCY})", min_value=0.01,
+                         value=SEVERITY_FX, step=50.0, key="claims_fx",
+                         help=f"El costo por evento sintético está en escala {cur} en ambos países; la prima "
+                              f"y el deducible, en {PREMIUM_CURRENCY}. El siniestro esperado se convierte con "
+                              "este valor (referencia editable).")
+    book = book_for(get_population("dashboard", country)["df"])
+    rs = RateStructure(plan, deducible, coaseguro, claims_fx=fx)
+    table = book.rate_table(rs)
+    tot = book.adequacy(rs, table)
+    st.subheader("Libro re-tarificado (sim.)")
+    c1, c2, c3, c4 = st.columns(4)
+    c1.metric("Pólizas", f"{tot['policies']:,}")
+    c2.metric("Prima total", f"${tot['premium']:,.0f}")
+    c3.metric("Siniestro esperado neto", f"${tot['expected_claims']:,.0f}",
+              help="Σ risk_factor × (cost_event / tipo de cambio − deducible)+ × (1 − coaseguro), "
+                   f"convertido a {PREMIUM_CURRENCY} a {fx:,.2f} {cur}/{PREMIUM_CURRENCY}.")
+    c4.metric("Suficiencia (prima / siniestro)", f"{tot['adequacy']:.2f}",
+              delta=f"{tot['cells_short']} celdas < 1", delta_color="inverse")
+    st.caption("Tabla de tasas por edad × sexo × banda de riesgo")
+    st.dataframe(
+        table.rename(columns={"age_band": "Edad", "sex": "Sexo", "risk_band": "Banda", "n": "Pólizas",
+                              "risk_mean": "rf medio", "rate": "Tasa", "premium": "Prima",
+                              "expected_claims": "Siniestro esp.", "adequacy": "Suficiencia"}),
+        use_container_width=True, hide_index=True,
+        column_config={"rf medio": st.column_config.NumberColumn(format="%.3f"),
+                       "Tasa": st.column_config.NumberColumn(format="$%.0f"),
+                       "Prima": st.column_config.NumberColumn(format="$%.0f"),
+                       "Siniestro esp.": st.column_config.NumberColumn(format="$%.0f"),
+                       "Suficiencia": st.column_config.NumberColumn(format="%.2f")},
+    )
+
+render_trace_panel(trace)
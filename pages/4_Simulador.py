@@ -2,27 +2,26 @@
 import streamlit as st
 import pandas as pd
 from utils.auth import role_country_selector
-from services.data_io import generate_dummy_population
-from services.risk_api import score_batch
+from services.warmup import get_population
 from components.cohort_filters import cohort_builder
-from components.charts import scenario_bars
+from components.charts import cashflow_lines, scenario_bars
+from components.profiling_panel import start_page_trace, render_trace_panel
+from utils.profiling import span
 from utils.kpis import quick_roi
+from utils.cohort_view import CohortView
+from services.cashflow import effect_curve, projection_for
 
 st.set_page_config(page_title="Simulador Financiero", page_icon="🧪", layout="wide")
 
 country, role = role_country_selector()
+trace = start_page_trace("Simulador")
 
-@st.cache_data(show_spinner=False)
-def get_scored_population(country):
-    df = generate_dummy_population(n=1800, country=country, seed=111)
-    sdf, _ = score_batch(df, seed=222)
-    return sdf
-
-df = get_scored_population(country)
+with span("population.load", "data"):
+    df = get_population("simulador", country)["df"]
 st.header("Simulador Financiero — Escenarios de Intervención")
 
 mask, desc = cohort_builder(df)
-cohort = df[mask].copy()
+cohort = CohortView(df, mask.to_numpy())  # sin copia de la cohorte
 st.caption(f"Cohorte activa: {len(cohort):,} — {desc}")
 
 c1, c2, c3 = st.columns(3)
@@ -32,12 +31,23 @@ with c2:
     costo_evento = st.number_input("Costo por evento (moneda local)", 500_000, 15_000_000, 5_500_000, step=250_000)
 with c3:
     costo_programa = st.number_input("Costo del programa (mes / cohorte)", 5_000_000, 300_000_000, 60_000_000, step=5_000_000)
+c4, c5, c6 = st.columns(3)
+with c4:
+    inicio = st.slider("Mes de inicio del programa", 1, 12, 1)
+with c5:
+    rampa = st.slider("Meses de ramp-up", 0, 6, 0, help="Meses hasta alcanzar la reducción completa.")
+with c6:
+    por = st.selectbox("Proyección por", ["Total", "cohort_label", "region"])
 
-st.markdown("**Supuesto simple:** eventos esperados ≈ suma(risk_factor) en la cohorte (piloto).")
+st.markdown("**Supuesto:** eventos esperados por mes = incremento de la curva Weibull de cada paciente "
+            "(Σ 12 meses ≈ suma(risk_factor)); el programa reduce el hazard desde el mes de inicio.")
 
-def simular(df, reduccion_pct, cost_event, cost_prog):
-    ev_esp = df["risk_factor"].sum()
-    ev_ev = ev_esp * (reduccion_pct/100.0)
+def simular(cohort, reduccion_pct, cost_event, cost_prog, start=1, ramp=0, by=None):
+    effect = effect_curve(reduccion_pct / 100.0, start=start, ramp=ramp)
+    base = projection_for(cohort, by=by, cost_event=cost_event)
+    esc = projection_for(cohort, by=by, effect=effect, cost_event=cost_event)
+    ev_esp = float(base.events.sum())
+    ev_ev = ev_esp - float(esc.events.sum())
     ahorro, roi = quick_roi(ev_ev, cost_event, cost_prog)
     out = pd.DataFrame([
         {"scenario": "Base", "metric":"Eventos", "value": ev_esp},
@@ -45,9 +55,11 @@ def simular(df, reduccion_pct, cost_event, cost_prog):
         {"scenario": "Escenario", "metric":"Ahorro", "value": ahorro},
         {"scenario": "Escenario", "metric":"ROI", "value": roi},
     ])
-    return ev_esp, ev_ev, ahorro, roi, out
+    return ev_esp, ev_ev, ahorro, roi, out, base, esc
 
-ev_esp, ev_ev, ahorro, roi, summary = simular(cohort, reduccion, costo_evento, costo_programa)
+with span("simulador.escenario", "kpis"):
+    ev_esp, ev_ev, ahorro, roi, summary, base, esc = simular(
+        cohort, reduccion, costo_evento, costo_programa, inicio, rampa, None if por == "Total" else por)
 
 m1, m2, m3, m4 = st.columns(4)
 m1.metric("Eventos esperados (12m)", f"{ev_esp:,.1f}")
@@ -57,7 +69,37 @@ m4.metric("ROI (sim.)", f"{roi:.2f}x")
 
 scenario_bars(summary)
 
+st.subheader("Proyección mensual (cash-flow)")
+with span("simulador.cashflow", "kpis"):
+    tb, te = base.total(), esc.total()
+    mensual = pd.DataFrame({
+        "month": tb.months,
+        "eventos_base": tb.events[0], "eventos_esc": te.events[0],
+        "pmpm_base": tb.pmpm()[0], "pmpm_esc": te.pmpm()[0],
+        "lr_base": tb.loss_ratio()[0], "lr_esc": te.loss_ratio()[0],
+        "ahorro_acum": (tb.claims[0] - te.claims[0]).cumsum(),
+    })
+    lineas = pd.concat([base.frame().assign(scenario=lambda d: d["group"] + " · Base"),
+                        esc.frame().assign(scenario=lambda d: d["group"] + " · Escenario")])
+cashflow_lines(lineas, y="pmpm", title="PMPM proyectado (base vs. escenario)", y_title="PMPM")
+st.dataframe(
+    mensual, use_container_width=True, hide_index=True,
+    column_config={
+        "month": "Mes",
+        "eventos_base": st.column_config.NumberColumn("Eventos base", format="%.1f"),
+        "eventos_esc": st.column_config.NumberColumn("Eventos escenario", format="%.1f"),
+        "pmpm_base": st.column_config.NumberColumn("PMPM base", format="$%.0f"),
+        "pmpm_esc": st.column_config.NumberColumn("PMPM escenario", format="$%.0f"),
+        "lr_base": st.column_config.NumberColumn("Loss ratio base", format="%.2f",
+                                                 help="Siniestros / (afiliados × UPC mensual)."),
+        "lr_esc": st.column_config.NumberColumn("Loss ratio escenario", format="%.2f"),
+        "ahorro_acum": st.column_config.NumberColumn("Siniestros evitados (acum.)", format="$%.0f"),
+    },
+)
+
 with st.expander("Tabla de cohorte (top 100 por riesgo)", expanded=False):
-    st.dataframe(cohort.sort_values("risk_factor", ascending=False).head(100)[
-        ["patient_id","age","sex","region","risk_factor","tw_start","tw_end","cohort_label","cost_event"]
-    ], use_container_width=True)
+    st.dataframe(cohort.top(100, "risk_factor", ascending=False,
+                            columns=["patient_id","age","sex","region","risk_factor","tw_start","tw_end","cohort_label","cost_event"]),
+                 use_container_width=True)
+
+render_trace_panel(trace)
@@ -1,12 +1,16 @@
 # pages/5_Generador_CSV.py
+import copy
 import io
-import numpy as np
 import pandas as pd
 import streamlit as st
 
 from utils.auth import ensure_context, role_country_selector, get_context
-from services.data_io import generate_dummy_population, REGIONS_CO, REGIONS_MX
+from services.data_io import LazyPopulation, generate_dummy_population, REGIONS_CO, REGIONS_MX
 from services.risk_api import score_population, set_mock_config, get_mock_config
+from services.calibration import BOUNDS, calibrate
+from services.whatif import compare_configs, crossers
+from components.profiling_panel import start_page_trace, render_trace_panel
+from utils.profiling import span
 
 st.set_page_config(page_title="Generador CSV Sintético", page_icon="📥", layout="wide")
 
@@ -14,16 +18,29 @@ st.set_page_config(page_title="Generador CSV Sintético", page_icon="📥", layo
 ensure_context(default_country="México")
 role_country_selector(place="sidebar")
 ctx = get_context()
+trace = start_page_trace("Generador")
 
 st.title("📥 Generador de CSV sintético (con sesgos parametrizables)")
 st.caption("Crea una cohorte dummy y aplica un mock de riesgo configurable para explorar efectos en las curvas por decil y KPIs. **Sin PHI**.")
 
+# Config calibrada pendiente -> sliders (antes de dibujarlos)
+calibrated = st.session_state.pop("gen_calibrated", None)
+if calibrated:
+    for k, v in calibrated["weights"].items():
+        st.session_state[f"gen_w_{k}"] = float(v)
+    st.session_state["gen_scale"] = float(calibrated["scale"])
+    for r, v in calibrated["region_uplift"].items():
+        st.session_state[f"gen_uplift_{r}"] = float(v)
+
 with st.form("gen_form"):
     colA, colB, colC = st.columns([1,1,1])
 
     with colA:
         n = st.number_input("Tamaño de la cohorte", min_value=200, max_value=10000, value=2500, step=100)
         seed = st.number_input("Semilla (reproducible)", min_value=0, max_value=999999, value=42, step=1)
+        engine = st.radio("Generador", ["Secuencial", "Por contador (Philox)"], horizontal=True,
+                          help="Por contador: cada afiliado depende sólo de (semilla, índice); "
+                               "mismo afiliado i con cualquier tamaño de cohorte.")
 
         st.markdown("**Prevalencias (0–1)**")
         p_smoker = st.slider("Fumador", 0.0, 1.0, 0.30, 0.01)
@@ -48,10 +65,13 @@ with st.form("gen_form"):
         regions = REGIONS_MX if ctx["country_name"] == "México" else REGIONS_CO
         uplift_inputs = {}
         for r in regions:
-            uplift_inputs[r] = st.slider(f"{r}", -0.50, 0.50, 0.00, 0.01, help="Ajuste aditivo al score lineal")
+            st.session_state.setdefault(f"gen_uplift_{r}", 0.0)
+            uplift_inputs[r] = st.slider(f"{r}", *BOUNDS["uplift"], step=0.01, key=f"gen_uplift_{r}",
+                                         help="Ajuste aditivo al score lineal")
 
         st.markdown("**Pesos del mock (escala global)**")
-        scale = st.slider("Escala de separación (≥1 = más contraste)", 0.2, 3.0, 1.2, 0.1)
+        st.session_state.setdefault("gen_scale", 1.2)
+        scale = st.slider("Escala de separación (≥1 = más contraste)", *BOUNDS["scale"], step=0.01, key="gen_scale")
 
     st.markdown("---")
     st.markdown("**Ajuste fino de pesos (opcional)**")
@@ -62,45 +82,61 @@ with st.form("gen_form"):
     # Repartimos los sliders en columnas
     sliders = {}
     for i, k in enumerate(keys):
+        st.session_state.setdefault(f"gen_w_{k}", float(default_w[k]))
         with wcols[i % 4]:
             # Rango razonable por tipo
             if k in ("intercept",):
-                sliders[k] = st.slider(f"{k}", -5.0, 5.0, float(default_w[k]), 0.05)
+                sliders[k] = st.slider(f"{k}", *BOUNDS["intercept"], step=0.01, key=f"gen_w_{k}")
             elif k in ("egfr","lab_recency_m"):
-                sliders[k] = st.slider(f"{k}", -0.2, 0.2, float(default_w[k]), 0.005)
+                sliders[k] = st.slider(f"{k}", -0.2, 0.2, step=0.005, key=f"gen_w_{k}")
             elif k in ("age","bmi","hba1c"):
-                sliders[k] = st.slider(f"{k}", -0.2, 0.3, float(default_w[k]), 0.005)
+                sliders[k] = st.slider(f"{k}", -0.2, 0.3, step=0.005, key=f"gen_w_{k}")
             elif k in ("utilizations_12m",):
-                sliders[k] = st.slider(f"{k}", 0.0, 0.30, float(default_w[k]), 0.005)
+                sliders[k] = st.slider(f"{k}", 0.0, 0.30, step=0.005, key=f"gen_w_{k}")
             else:
-                sliders[k] = st.slider(f"{k}", 0.0, 1.5, float(default_w[k]), 0.01)
+                sliders[k] = st.slider(f"{k}", 0.0, 1.5, step=0.01, key=f"gen_w_{k}")
 
     submitted = st.form_submit_button("Generar y puntuar CSV")
 
+# Parámetros vigentes del formulario (generación + config del mock)
+gen_params = dict(
+    p_smoker=float(p_smoker),
+    p_dm=float(p_dm),
+    p_hta=float(p_hta),
+    p_ckd=float(p_ckd),
+    p_prev_event=float(p_prev),
+    bmi_mean=float(bmi_mean), bmi_sd=float(bmi_sd),
+    hba1c_mean=float(hba1c_mean), hba1c_sd=float(hba1c_sd),
+    egfr_mean=float(egfr_mean), egfr_sd=float(egfr_sd),
+    region_weights=None  # si quisieras sesgar la cantidad por región, podrías exponer sliders aparte
+)
+gen_country = f"{ctx['country_name']} - {ctx['payer_model']}"
+cfg = {
+    "weights": sliders,
+    "region_uplift": {k: float(v) for k, v in uplift_inputs.items() if abs(v) > 1e-9},
+    "scale": float(scale),
+    "clip": (0.0, 0.92),
+}
+
+def _cohort():
+    """Cohorte de los parámetros vigentes (misma instancia entre reruns: la calibración reusa su predictor)."""
+    key = (engine, int(n), int(seed), gen_country, tuple(sorted(gen_params.items())))
+    hit = st.session_state.get("gen_raw")
+    if hit is not None and hit[0] == key:
+        return hit[1]
+    if engine.startswith("Por contador"):
+        df = LazyPopulation(int(n), gen_country, int(seed), **gen_params).materialize()
+    else:
+        df = generate_dummy_population(n=int(n), country=gen_country, seed=int(seed), **gen_params)
+    st.session_state["gen_raw"] = (key, df)
+    return df
+
 if submitted:
     # 1) Generar población
-    df = generate_dummy_population(
-        n=int(n),
-        country = f"{ctx['country_name']} - {ctx['payer_model']}",
-        seed=int(seed),
-        p_smoker=float(p_smoker),
-        p_dm=float(p_dm),
-        p_hta=float(p_hta),
-        p_ckd=float(p_ckd),
-        p_prev_event=float(p_prev),
-        bmi_mean=float(bmi_mean), bmi_sd=float(bmi_sd),
-        hba1c_mean=float(hba1c_mean), hba1c_sd=float(hba1c_sd),
-        egfr_mean=float(egfr_mean), egfr_sd=float(egfr_sd),
-        region_weights=None  # si quisieras sesgar la cantidad por región, podrías exponer sliders aparte
-    )
+    df = _cohort()
 
-    # 2) Configurar mock de riesgo y puntuar
-    cfg = {
-        "weights": sliders,
-        "region_uplift": {k: float(v) for k, v in uplift_inputs.items() if abs(v) > 1e-9},
-        "scale": float(scale),
-        "clip": (0.0, 0.92),
-    }
+    # 2) Configurar mock de riesgo y puntuar (la anterior queda como referencia del what-if)
+    st.session_state["gen_prev_cfg"] = copy.deepcopy(get_mock_config())
     set_mock_config(cfg)
     scored = score_population(df)
 
@@ -110,13 +146,14 @@ if submitted:
 
     # Pequeño resumen por decil para verificar separación
     try:
-        deciles = pd.qcut(scored["risk_factor"], 10, labels=[f"D{i}" for i in range(1,11)], duplicates="drop")
-        summary = scored.assign(decile=deciles).groupby("decile", observed=False).agg(
-            n=("patient_id","count"),
-            risk_mean=("risk_factor","mean"),
-            risk_p75=("risk_factor", lambda s: s.quantile(0.75)),
-            risk_p25=("risk_factor", lambda s: s.quantile(0.25))
-        ).reset_index()
+        with span("generador.deciles", "kpis"):
+            deciles = pd.qcut(scored["risk_factor"], 10, labels=[f"D{i}" for i in range(1,11)], duplicates="drop")
+            summary = scored.assign(decile=deciles).groupby("decile", observed=False).agg(
+                n=("patient_id","count"),
+                risk_mean=("risk_factor","mean"),
+                risk_p75=("risk_factor", lambda s: s.quantile(0.75)),
+                risk_p25=("risk_factor", lambda s: s.quantile(0.25))
+            ).reset_index()
         st.subheader("Resumen por decil (verifica la separación)")
         st.dataframe(summary, use_container_width=True)
     except Exception as e:
@@ -134,3 +171,115 @@ if submitted:
 
 else:
     st.info("Configura los parámetros y pulsa **Generar y puntuar CSV** para crear tu archivo.")
+
+# Auto-calibración: resuelve intercepto / escala / uplifts sobre la cohorte vigente
+with st.expander("🎯 Auto-calibración del mock (objetivos de resultado)", expanded=False):
+    st.caption("Resuelve el intercepto, la escala o los uplifts por región para alcanzar los objetivos, "
+               "sobre el score lineal de la cohorte calculado una vez (Newton / bisección). "
+               "Parte de los sliders actuales.")
+    with st.form("calib_form"):
+        c1, c2 = st.columns([1, 1])
+        with c1:
+            level = st.radio("Objetivo de nivel (intercepto)", ["Ninguno", "Riesgo medio", "% alto riesgo (≥ 0.30)"],
+                             index=1, key="calib_level")
+            level_value = st.number_input("Valor objetivo (0–1)", 0.0, 1.0, 0.15, 0.01, key="calib_level_value")
+        with c2:
+            use_top = st.checkbox("Participación del decil superior (escala)", key="calib_use_top")
+            top_value = st.number_input("Fracción del riesgo total en el decil superior", 0.1, 1.0, 0.30, 0.01,
+                                        key="calib_top_value")
+        targets_df = st.data_editor(
+            pd.DataFrame({"región": regions, "riesgo_medio": [None] * len(regions)}).astype({"riesgo_medio": float}),
+            hide_index=True, disabled=["región"], use_container_width=True, key="calib_regions",
+            column_config={"riesgo_medio": st.column_config.NumberColumn(
+                "Riesgo medio objetivo (vacío = sin objetivo)", min_value=0.0, max_value=1.0, step=0.01)},
+        )
+        go = st.form_submit_button("Calibrar")
+
+    if go:
+        region_mean = {r: float(v) for r, v in zip(targets_df["región"], targets_df["riesgo_medio"]) if pd.notna(v)}
+        try:
+            with span("generador.calibracion", "scoring"):
+                st.session_state["gen_calibration"] = calibrate(
+                    _cohort(), cfg=cfg,
+                    mean_risk=level_value if level == "Riesgo medio" else None,
+                    high_share=level_value if level.startswith("% alto") else None,
+                    top_decile_share=top_value if use_top else None,
+                    region_mean=region_mean or None,
+                )
+        except ValueError as e:
+            st.warning(str(e))
+
+    res = st.session_state.get("gen_calibration")
+    if res:
+        (st.success if res["converged"] else st.warning)(
+            f"{'Convergió' if res['converged'] else 'No alcanzó todos los objetivos (parámetro en el borde del rango)'}"
+            f" — {res['evaluations']} evaluaciones vectorizadas, {res['rounds']} ronda(s).")
+        out = res["config"]
+        m = st.columns(3)
+        m[0].metric("Intercepto", f"{out['weights']['intercept']:.3f}")
+        m[1].metric("Escala", f"{out['scale']:.3f}")
+        m[2].metric("Uplifts", ", ".join(f"{r} {v:+.2f}" for r, v in out["region_uplift"].items()) or "—")
+        st.dataframe(pd.DataFrame({"antes": res["before"], "después": res["after"],
+                                   "objetivo": {k: v for k, v in res["targets"].items() if k != "region_mean"}}),
+                     use_container_width=True)
+        if "regions" in res:
+            st.dataframe(res["regions"], use_container_width=True, hide_index=True)
+        if st.button("Aplicar al mock y a los sliders", key="calib_apply"):
+            st.session_state["gen_prev_cfg"] = copy.deepcopy(get_mock_config())
+            set_mock_config(out)
+            st.session_state["gen_calibrated"] = out
+            st.session_state.pop("gen_calibration", None)
+            st.rerun()
+
+# What-if: misma cohorte con una config de referencia (A) vs. la de los sliders (B)
+with st.expander("🔀 Comparar configuraciones (what-if)", expanded=False):
+    st.caption("Puntúa la cohorte vigente con la config de referencia (A) y con la de los sliders (B) en una "
+               "sola pasada sobre la matriz de diseño compartida: qué afiliados cambian de banda, quiénes "
+               "cruzan el umbral de alto riesgo y cuánto se mueven los eventos esperados.")
+    refs = {"Config anterior (antes de Generar)": st.session_state.get("gen_prev_cfg"),
+            "Config por defecto": None}
+    if "whatif_ref" in st.session_state:
+        refs = {"Referencia fijada": st.session_state["whatif_ref"], **refs}
+    c1, c2 = st.columns([3, 1])
+    with c1:
+        ref = st.radio("Referencia (A)", list(refs), horizontal=True, key="whatif_ref_choice")
+    with c2:
+        if st.button("📌 Fijar sliders como referencia", key="whatif_pin"):
+            st.session_state["whatif_ref"] = copy.deepcopy(cfg)
+            st.rerun()
+    top_n = st.number_input("Top movers", 5, 200, 20, 5, key="whatif_top")
+    if st.button("Comparar A vs. sliders (B)", key="whatif_go"):
+        with span("generador.whatif", "scoring"):
+            cohort = _cohort()
+            st.session_state["gen_whatif"] = (cohort, compare_configs(cohort, refs[ref], cfg, top=int(top_n)))
+
+    hit = st.session_state.get("gen_whatif")
+    if hit:
+        cohort, res = hit
+        k = res["kpis"]
+        m = st.columns(4)
+        m[0].metric("Entran a alto riesgo", f"{len(res['entered']):,}")
+        m[1].metric("Salen de alto riesgo", f"{len(res['exited']):,}")
+        m[2].metric("Eventos esperados (B)", f"{k.loc['expected_events', 'b']:,.1f}",
+                    f"{k.loc['expected_events', 'delta']:+,.1f}", delta_color="inverse")
+        m[3].metric("Riesgo medio (B)", f"{k.loc['mean_risk', 'b']:.3f}",
+                    f"{k.loc['mean_risk', 'delta']:+.3f}", delta_color="inverse")
+        t1, t2, t3, t4 = st.tabs(["Migración de bandas", "KPIs", "Top movers", "Cruces de hi_cut"])
+        with t1:
+            st.caption(f"Afiliados por banda con A (filas) y con B (columnas); {res['n']:,} en total.")
+            st.dataframe(res["migration"], use_container_width=True)
+        with t2:
+            st.dataframe(k, use_container_width=True, column_config={
+                "a": st.column_config.NumberColumn("A", format="%.4g"),
+                "b": st.column_config.NumberColumn("B", format="%.4g"),
+                "delta": st.column_config.NumberColumn("Δ (B − A)", format="%+.4g"),
+            })
+        with t3:
+            st.dataframe(res["movers"], use_container_width=True, hide_index=True, column_config={
+                "driver": "Variable que más movió el logit",
+                "driver_delta_logit": st.column_config.NumberColumn("Δ logit", format="%+.3f"),
+            })
+        with t4:
+            st.dataframe(crossers(cohort, res), use_container_width=True, hide_index=True)
+
+render_trace_panel(trace)
@@ -0,0 +1,164 @@
+# services/batcher.py
+# ---------------------------------------------------------------------
+# Micro-batching de requests concurrentes de un solo paciente.
+# Varias sesiones de Suscripción llaman score_one a la vez: en vez de
+# puntuar cada fila por separado, un hilo coalescedor junta los
+# payloads que llegan durante `window_ms` (o hasta `max_batch`) y los
+# puntúa con UNA llamada vectorizada (risk_api.score_records); cada
+# llamador recibe su propio resultado vía Future. Si el batch falla (un
+# payload inválido), se puntúa ítem por ítem: cada llamador recibe su
+# resultado o su propia excepción, como con score_one directo.
+# Estadísticas: profundidad de cola al despachar e histograma de
+# tamaños de batch (batcher_stats()).
+# ---------------------------------------------------------------------
+
+import threading
+import time
+from collections import Counter
+from concurrent.futures import Future
+from queue import Empty, Queue
+from typing import Callable, Dict, List, Optional
+
+WINDOW_MS = 5.0
+MAX_BATCH = 64
+
+
+class MicroBatcher:
+    """Coalesce llamadas concurrentes `submit(item)` en `fn(items) -> results`."""
+
+    def __init__(self, fn: Callable[[List], List], window_ms: float = WINDOW_MS,
+                 max_batch: int = MAX_BATCH, name: str = "batcher"):
+        self.fn = fn
+        self.window_ms = float(window_ms)
+        self.max_batch = max(1, int(max_batch))
+        self.name = name
+        self._queue: "Queue[tuple]" = Queue()
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._sizes: Counter = Counter()
+        self._depths: Counter = Counter()
+        self._items = 0
+        self._batches = 0
+        self._max_depth = 0
+        self._fallbacks = 0
+
+    def _ensure_worker(self) -> None:
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._loop, name=self.name, daemon=True)
+                self._thread.start()
+
+    def submit(self, item) -> Future:
+        fut: Future = Future()
+        self._queue.put((item, fut))
+        self._ensure_worker()
+        return fut
+
+    def __call__(self, item, timeout: Optional[float] = None):
+        return self.submit(item).result(timeout=timeout)
+
+    def _collect(self) -> List[tuple]:
+        batch = [self._queue.get()]  # bloquea hasta el primer request
+        deadline = time.perf_counter() + self.window_ms / 1e3
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except Empty:
+                break
+        return batch
+
+    def _loop(self) -> None:
+        while True:
+            batch = self._collect()
+            depth = self._queue.qsize()
+            with self._lock:
+                self._sizes[len(batch)] += 1
+                self._depths[depth] += 1
+                self._items += len(batch)
+                self._batches += 1
+                self._max_depth = max(self._max_depth, depth)
+            items = [it for it, _ in batch]
+            try:
+                results = self.fn(items)
+            except Exception as e:
+                if len(batch) == 1:
+                    batch[0][1].set_exception(e)
+                else:
+                    self._one_by_one(batch)
+                continue
+            for (_, fut), res in zip(batch, results):
+                fut.set_result(res)
+
+    def _one_by_one(self, batch: List[tuple]) -> None:
+        """Batch fallido: cada ítem por separado (el error queda sólo en el suyo)."""
+        with self._lock:
+            self._fallbacks += 1
+        for item, fut in batch:
+            try:
+                fut.set_result(self.fn([item])[0])
+            except Exception as e:
+                fut.set_exception(e)
+
+    def stats(self) -> Dict:
+        """Histogramas de tamaño de batch y de cola pendiente al despachar."""
+        with self._lock:
+            return {
+                "window_ms": self.window_ms,
+                "max_batch": self.max_batch,
+                "requests": self._items,
+                "batches": self._batches,
+                "mean_batch": self._items / self._batches if self._batches else 0.0,
+                "queue_depth": self._queue.qsize(),
+                "max_queue_depth": self._max_depth,
+                "fallback_batches": self._fallbacks,
+                "batch_size_hist": dict(sorted(self._sizes.items())),
+                "queue_depth_hist": dict(sorted(self._depths.items())),
+            }
+
+    def reset_stats(self) -> None:
+        with self._lock:
+            self._sizes.clear()
+            self._depths.clear()
+            self._items = self._batches = self._max_depth = self._fallbacks = 0
+
+
+# ---------------------------
+# score_one con micro-batching
+# ---------------------------
+def _score_payloads(payloads: List[dict]) -> List[dict]:
+    import pandas as pd
+    from services.risk_api import _ensure_columns, score_records
+    # cada fila con sus defaults, como score_row: el resultado de un
+    # llamador no depende de qué claves traen los otros del batch
+    return score_records(pd.DataFrame([_ensure_columns(p) for p in payloads]))
+
+_SCORER: Optional[MicroBatcher] = None
+_SCORER_LOCK = threading.Lock()
+
+def get_scorer() -> MicroBatcher:
+    global _SCORER
+    with _SCORER_LOCK:
+        if _SCORER is None:
+            _SCORER = MicroBatcher(_score_payloads, name="score-one-batcher")
+        return _SCORER
+
+def configure(window_ms: Optional[float] = None, max_batch: Optional[int] = None) -> MicroBatcher:
+    """Ajusta ventana/tamaño del batcher compartido (aplica al próximo batch)."""
+    b = get_scorer()
+    if window_ms is not None:
+        b.window_ms = float(window_ms)
+    if max_batch is not None:
+        b.max_batch = max(1, int(max_batch))
+    return b
+
+def score_one(payload: dict) -> dict:
+    """Misma firma/resultado que risk_api.score_one, coalescido con otros llamadores."""
+    return get_scorer()(payload)
+
+def batcher_stats() -> Dict:
+    return get_scorer().stats()
@@ -0,0 +1,296 @@
+# services/calibration.py
+# ---------------------------------------------------------------------
+# Auto-calibración del mock de scoring a resultados objetivo.
+# El score es s = scale · (intercept + Σ w·x + uplift(región)), riesgo =
+# clip(sigmoide(s)). La parte Σ w·x (LinearPredictor) se calcula UNA vez
+# por cohorte y pesos (cacheada); cada evaluación es sólo una sigmoide
+# vectorizada, así que resolver cuesta un puñado de pasadas NumPy en vez
+# de re-puntuar la cohorte por intento.
+# Objetivos (todos crecientes en su parámetro):
+#   mean_risk        -> intercept   (Newton: derivada = scale·E[σ(1−σ)])
+#   high_share       -> intercept   (% con riesgo ≥ hi_cut; bisección)
+#   top_decile_share -> scale       (fracción del riesgo total en el
+#                                    decil superior; regula falsi)
+#   region_mean      -> uplift por región (Newton vectorizado, una raíz
+#                                    por región en la misma pasada)
+# Con objetivos sobre más de un parámetro se alterna por coordenadas.
+# Los parámetros quedan dentro de los rangos de los sliders del
+# Generador (BOUNDS); un objetivo inalcanzable deja el parámetro en el
+# borde y converged = False.
+# ---------------------------------------------------------------------
+
+import threading
+import weakref
+from typing import Dict, Optional
+
+import numpy as np
+import pandas as pd
+
+from services.risk_api import _linear_score_df, get_mock_config
+from utils.memory import register_cache
+from utils.profiling import count, span, traced
+
+BOUNDS = {"intercept": (-10.0, 5.0), "scale": (0.2, 3.0), "uplift": (-1.0, 1.0)}
+TOL = 1e-4          # tolerancia sobre la métrica objetivo
+XTOL = 1e-7         # ancho mínimo del intervalo del parámetro
+MAX_ITER = 60
+MAX_ROUNDS = 8      # rondas de coordenadas (intercept / scale / uplifts)
+TOP_DECILE = 0.10
+
+
+def _sigmoid(x):
+    return 1.0 / (1.0 + np.exp(-x))
+
+
+class LinearPredictor:
+    """Σ w·x por afiliado (sin intercepto, uplift ni escala) + códigos de región."""
+
+    __slots__ = ("z", "codes", "regions", "__weakref__")
+
+    def __init__(self, df: pd.DataFrame, weights: Dict[str, float]):
+        with span("calibration.predictor", "scoring", rows=len(df)):
+            self.z = _linear_score_df(df, {"weights": {**weights, "intercept": 0.0},
+                                           "region_uplift": {}, "scale": 1.0})
+            if "region" in df.columns:
+                codes, uniq = pd.factorize(df["region"])
+                self.codes, self.regions = codes.astype(np.int64), [str(r) for r in uniq]
+            else:
+                self.codes, self.regions = np.full(len(df), -1, dtype=np.int64), []
+
+    def __len__(self) -> int:
+        return len(self.z)
+
+    def uplift(self, region_uplift: Optional[Dict[str, float]]) -> np.ndarray:
+        """Uplift por fila (0 para regiones sin uplift o sin región)."""
+        u = np.array([float((region_uplift or {}).get(r, 0.0)) for r in self.regions] + [0.0])
+        return u[self.codes]
+
+    def risk(self, cfg: Dict) -> np.ndarray:
+        """Mismo riesgo que score_population con `cfg`."""
+        s = float(cfg.get("scale", 1.0)) * (self.z + cfg["weights"].get("intercept", 0.0)
+                                            + self.uplift(cfg.get("region_uplift")))
+        lo, hi = cfg.get("clip", (0.0, 0.92))
+        return np.clip(_sigmoid(s), lo, hi)
+
+
+def metrics(risk: np.ndarray, hi_cut: float = 0.30) -> Dict[str, float]:
+    """mean_risk, high_share (riesgo ≥ hi_cut) y top_decile_share."""
+    risk = np.asarray(risk, dtype=float)
+    n = len(risk)
+    if n == 0:
+        return {"mean_risk": float("nan"), "high_share": float("nan"), "top_decile_share": float("nan")}
+    k = max(1, int(round(n * TOP_DECILE)))
+    top = np.partition(risk, n - k)[n - k:]
+    total = float(risk.sum())
+    return {"mean_risk": total / n, "high_share": float((risk >= hi_cut).mean()),
+            "top_decile_share": float(top.sum()) / total if total > 0 else float("nan")}
+
+
+# ---------------------------
+# Solver (Newton con salvaguarda de bisección, vectorizado)
+# ---------------------------
+def _solve(g, lo: np.ndarray, hi: np.ndarray, x0: np.ndarray, tol: float = TOL):
+    """
+    Raíz por componente de g creciente en [lo, hi]. g(x) -> (valor,
+    derivada o None). Paso de Newton si hay derivada y cae dentro del
+    intervalo; sin derivada, regula falsi (Illinois); si no, bisección.
+    -> (x, valor, evaluaciones, convergió por componente).
+    """
+    lo, hi = np.array(lo, dtype=float), np.array(hi, dtype=float)
+    g_lo, _ = g(lo)
+    g_hi, _ = g(hi)
+    below, above = g_lo > tol, g_hi < -tol          # objetivo fuera de alcance
+    x = np.where(below, lo, np.where(above, hi, np.clip(x0, lo, hi)))
+    side = np.zeros(len(x))                         # último extremo movido (Illinois)
+    evals = 2
+    for _ in range(MAX_ITER):
+        val, der = g(x)
+        evals += 1
+        done = (np.abs(val) <= tol) | below | above | (hi - lo <= XTOL)
+        if done.all():
+            break
+        move_lo, move_hi = ~done & (val < 0), ~done & (val > 0)
+        g_hi = np.where(move_lo & (side < 0), 0.5 * g_hi, g_hi)
+        g_lo = np.where(move_hi & (side > 0), 0.5 * g_lo, g_lo)
+        lo, g_lo = np.where(move_lo, x, lo), np.where(move_lo, val, g_lo)
+        hi, g_hi = np.where(move_hi, x, hi), np.where(move_hi, val, g_hi)
+        side = np.where(move_lo, -1.0, np.where(move_hi, 1.0, side))
+        with np.errstate(divide="ignore", invalid="ignore"):
+            if der is not None:
+                step = x - val / der
+            else:
+                step = lo - g_lo * (hi - lo) / (g_hi - g_lo)
+        ok = np.isfinite(step) & (step > lo) & (step < hi)
+        x = np.where(done, x, np.where(ok, step, 0.5 * (lo + hi)))
+    else:
+        val, _ = g(x)
+        evals += 1
+    return x, val, evals, (np.abs(val) <= tol) | ((hi - lo <= XTOL) & ~below & ~above)
+
+
+# ---------------------------
+# Caché de predictores por cohorte
+# ---------------------------
+_PREDICTORS: Dict[tuple, tuple] = {}   # (id(df), pesos sin intercepto) -> (weakref(df), LinearPredictor)
+_LOCK = threading.Lock()
+register_cache("calibration.predictors", lambda: [p for _, p in list(_PREDICTORS.values())])
+
+def predictor_for(df: pd.DataFrame, weights: Dict[str, float]) -> LinearPredictor:
+    """LinearPredictor cacheado por frame vivo y pesos (el intercepto no cuenta)."""
+    key = (id(df), tuple(sorted((k, float(v)) for k, v in weights.items() if k != "intercept")))
+    with _LOCK:
+        hit = _PREDICTORS.get(key)
+        if hit is not None and hit[0]() is df:
+            return hit[1]
+        for k in [k for k, (ref, _) in _PREDICTORS.items() if ref() is None]:
+            del _PREDICTORS[k]
+    p = LinearPredictor(df, weights)
+    with _LOCK:
+        _PREDICTORS[key] = (weakref.ref(df), p)
+    return p
+
+
+# ---------------------------
+# Calibración
+# ---------------------------
+@traced("calibration.solve", "scoring")
+def calibrate(
+    df: pd.DataFrame,
+    *,
+    mean_risk: Optional[float] = None,
+    high_share: Optional[float] = None,
+    top_decile_share: Optional[float] = None,
+    region_mean: Optional[Dict[str, float]] = None,
+    cfg: Optional[Dict] = None,
+    tol: float = TOL,
+) -> Dict:
+    """
+    Ajusta intercept / scale / uplifts de `cfg` (por defecto la config
+    vigente del mock) para que la cohorte `df` alcance los objetivos.
+    -> dict con config (lista para set_mock_config), targets, before,
+       after (metrics), regions (media por región antes/después, si
+       hubo region_mean), evaluations, rounds y converged.
+    """
+    if mean_risk is not None and high_share is not None:
+        raise ValueError("mean_risk y high_share se resuelven con el intercepto: elige uno.")
+    if mean_risk is None and high_share is None and top_decile_share is None and not region_mean:
+        raise ValueError("Sin objetivos: indica mean_risk, high_share, top_decile_share o region_mean.")
+    cfg = cfg or get_mock_config()
+    weights = dict(cfg["weights"])
+    lo_clip, hi_clip = cfg.get("clip", (0.0, 0.92))
+    hi_cut = float(cfg.get("hi_cut", 0.30))
+    pred = predictor_for(df, weights)
+    b = float(weights.get("intercept", 0.0))
+    c = float(cfg.get("scale", 1.0))
+    uplift = {r: float(v) for r, v in (cfg.get("region_uplift") or {}).items()}
+    region_mean = {r: float(t) for r, t in (region_mean or {}).items() if r in pred.regions}
+    targets = {k: v for k, v in (("mean_risk", mean_risk), ("high_share", high_share),
+                                 ("top_decile_share", top_decile_share)) if v is not None}
+    current = lambda: {"weights": {**weights, "intercept": b}, "scale": c, "region_uplift": uplift,
+                       "clip": (lo_clip, hi_clip), "hi_cut": hi_cut}
+    before_risk = pred.risk(current())
+    evaluations, rounds, ok = 0, 0, {}
+    z, codes = pred.z, pred.codes
+    step = max(tol, 1.0 / max(len(pred), 1))   # high_share es escalonado: resolución 1/n
+
+    def risk_of(s):
+        return np.clip(_sigmoid(s), lo_clip, hi_clip)
+
+    def solve_level(scale: float, base: np.ndarray, b0: float):
+        """Intercepto que da el objetivo de nivel a esta escala -> (b, ok, evaluaciones)."""
+        if high_share is not None:
+            # escalonado y creciente en b: forma cerrada con el k-ésimo mayor de base
+            if not lo_clip < hi_cut <= hi_clip:
+                return b0, high_share == float(hi_cut <= lo_clip), 0
+            n = len(base)
+            k = int(round(high_share * n))        # afiliados que deben quedar en alto riesgo
+            desc = -np.partition(-base, [j for j in (k - 1, k) if 0 <= j < n])
+            upper = desc[k - 1] if k > 0 else desc.max() + 1.0
+            lower = desc[k] if k < n else desc.min() - 1.0
+            b = np.log(hi_cut / (1 - hi_cut)) / scale - 0.5 * (upper + lower)
+            lo_b, hi_b = BOUNDS["intercept"]
+            return float(np.clip(b, lo_b, hi_b)), lo_b <= b <= hi_b, 1
+
+        def g(x):
+            r = _sigmoid(scale * (base + x[0]))
+            inside = (r > lo_clip) & (r < hi_clip)
+            return (np.array([np.clip(r, lo_clip, hi_clip).mean() - mean_risk]),
+                    np.array([scale * np.mean(r * (1 - r) * inside)]))
+        x, _, e, conv = _solve(g, [BOUNDS["intercept"][0]], [BOUNDS["intercept"][1]], np.array([b0]), tol)
+        return float(x[0]), bool(conv[0]), e
+
+    level_key = "mean_risk" if mean_risk is not None else "high_share" if high_share is not None else None
+    for rounds in range(1, MAX_ROUNDS + 1):
+        start = (b, c, dict(uplift))
+        base = z + pred.uplift(uplift)
+        if top_decile_share is not None:
+            # scale por regula falsi; con objetivo de nivel, cada evaluación
+            # re-resuelve el intercepto (el nivel se mantiene en la curva)
+            k = max(1, int(round(len(base) * TOP_DECILE)))
+            top = np.argpartition(base, len(base) - k)[len(base) - k:]  # orden fijo para scale > 0
+            state = {"b": b, "evals": 0, "ok": True}
+
+            def g_scale(x):
+                if level_key:
+                    state["b"], state["ok"], e = solve_level(x[0], base, state["b"])
+                    state["evals"] += e
+                r = risk_of(x[0] * (base + state["b"]))
+                return np.array([r[top].sum() / max(r.sum(), 1e-300) - top_decile_share]), None
+            x, _, e, conv = _solve(g_scale, [BOUNDS["scale"][0]], [BOUNDS["scale"][1]], np.array([c]), tol)
+            c, evaluations, ok["top_decile_share"] = float(x[0]), evaluations + e + state["evals"], bool(conv[0])
+
+        if level_key:
+            b, ok[level_key], e = solve_level(c, base, b)
+            evaluations += e
+
+        if region_mean:
+            names = list(region_mean)
+            idx = np.array([pred.regions.index(r) for r in names])
+            t = np.array([region_mean[r] for r in names])
+            m = len(pred.regions)
+            n_r = np.bincount(codes[codes >= 0], minlength=m)[idx]
+            fixed = {r: v for r, v in uplift.items() if r not in region_mean}
+            rbase = z + b + pred.uplift(fixed)
+            sel = np.isin(codes, idx)
+            pos = np.full(m + 1, -1)
+            pos[idx] = np.arange(len(idx))
+            rc, rb = pos[codes[sel]], rbase[sel]
+
+            def g_uplift(u):
+                r = _sigmoid(c * (rb + u[rc]))
+                inside = (r > lo_clip) & (r < hi_clip)
+                mean = np.bincount(rc, weights=np.clip(r, lo_clip, hi_clip), minlength=len(idx)) / n_r
+                der = c * np.bincount(rc, weights=r * (1 - r) * inside, minlength=len(idx)) / n_r
+                return mean - t, der
+            u0 = np.array([uplift.get(r, 0.0) for r in names])
+            x, _, e, conv = _solve(g_uplift, np.full(len(idx), BOUNDS["uplift"][0]),
+                                   np.full(len(idx), BOUNDS["uplift"][1]), u0, tol)
+            uplift = {**fixed, **{r: float(v) for r, v in zip(names, x)}}
+            evaluations += e
+            ok["region_mean"] = bool(conv.all())
+
+        after = metrics(pred.risk(current()), hi_cut)
+        met = all(abs(after[k] - v) <= step for k, v in targets.items()) and ok.get("region_mean", True)
+        moved = max([abs(b - start[0]), abs(c - start[1])] +
+                    [abs(v - start[2].get(r, 0.0)) for r, v in uplift.items()])
+        if met or not region_mean or moved <= XTOL:
+            break
+
+    out_cfg = current()
+    after_risk = pred.risk(out_cfg)
+    count("calibration.evaluations", evaluations)
+    res = {"config": out_cfg, "targets": {**targets, **({"region_mean": region_mean} if region_mean else {})},
+           "before": metrics(before_risk, hi_cut), "after": after, "evaluations": evaluations,
+           "rounds": rounds, "converged": met and all(ok.values())}
+    if region_mean:
+        m = len(pred.regions)
+        valid = codes >= 0
+        n_r = np.maximum(np.bincount(codes[valid], minlength=m), 1)
+        res["regions"] = pd.DataFrame({
+            "region": pred.regions,
+            "uplift": [uplift.get(r, 0.0) for r in pred.regions],
+            "target": [region_mean.get(r, np.nan) for r in pred.regions],
+            "mean_before": np.bincount(codes[valid], weights=before_risk[valid], minlength=m) / n_r,
+            "mean_after": np.bincount(codes[valid], weights=after_risk[valid], minlength=m) / n_r,
+        })
+    return res
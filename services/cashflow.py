@@ -0,0 +1,204 @@
+# services/cashflow.py
+# ---------------------------------------------------------------------
+# Proyección mensual de siniestros (cash-flow) para Finanzas.
+# - Por paciente: curva acumulada F(m) = min(0.95, 1 − exp(−H(m))),
+#   H(m) = (λ m)^k (misma curva que el scoring), y probabilidad de evento
+#   incremental por mes p_m = F(m) − F(m−1); Σ_m p_m = riesgo a 12 meses.
+# - Intervención: reducción de hazard por mes r_m (inicio + ramp-up);
+#   se aplica sobre los incrementos de hazard acumulado,
+#   H'(m) = Σ_{j≤m} (1 − r_j) ΔH(j), así el efecto de un mes reduce
+#   también la curva de los meses siguientes.
+# - Agregación cohorte × mes en una pasada por bloque de filas (un
+#   bincount sobre el código plano grupo × mes): eventos, siniestros por
+#   evento (p_m × cost_event), gasto base (cost_12m / 12), afiliados,
+#   PMPM y loss ratio contra la UPC mensual.
+# - projection_for(): cacheada por cohorte (CohortView.signature()) y
+#   parámetros, para el Simulador y el Dashboard.
+# ---------------------------------------------------------------------
+
+import threading
+from collections import OrderedDict
+from typing import Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+from utils.cohort_view import CohortView
+from utils.kpis import UPC_MENSUAL
+from utils.memory import register_cache
+from utils.profiling import span, traced
+from utils.weibull import HORIZON
+
+CUM_CAP = 0.95               # mismo tope que la curva del scoring (utils/kernels)
+BLOCK_ROWS = 262_144         # filas por bloque: acota los temporales (bloque × meses)
+CACHE_MAX = 64
+TOTAL = "Total"
+NA_GROUP = "(sin dato)"
+METRICS = ["members", "events", "event_claims", "base_claims", "claims", "pmpm", "loss_ratio"]
+
+
+def effect_curve(reduction: float, start: int = 1, ramp: int = 0, horizon: int = int(HORIZON)) -> np.ndarray:
+    """
+    Reducción de hazard por mes (horizon,): 0 antes de `start`, sube
+    linealmente durante `ramp` meses y queda en `reduction` (fracción 0–1).
+    """
+    m = np.arange(1, int(horizon) + 1, dtype=float)
+    frac = np.clip((m - start + 1) / max(int(ramp), 1), 0.0, 1.0)
+    return float(reduction) * np.where(m >= start, frac, 0.0)
+
+
+class CashFlow:
+    """Matrices grupo × mes de una proyección (afiliados, eventos y siniestros)."""
+
+    __slots__ = ("groups", "months", "members", "events", "event_claims", "base_claims", "premium")
+
+    def __init__(self, groups, months, members, events, event_claims, base_claims, premium: float):
+        self.groups = list(groups)
+        self.months = np.asarray(months, dtype=int)
+        self.members = np.asarray(members, dtype=float)          # (G,): cohorte cerrada, sin bajas
+        self.events = events                                     # (G, M)
+        self.event_claims = event_claims
+        self.base_claims = base_claims
+        self.premium = float(premium)
+
+    def __repr__(self) -> str:
+        return f"CashFlow(groups={len(self.groups)}, months={len(self.months)}, members={self.members.sum():,.0f})"
+
+    @property
+    def claims(self) -> np.ndarray:
+        return self.event_claims + self.base_claims
+
+    def pmpm(self) -> np.ndarray:
+        """Siniestros por afiliado-mes (G, M)."""
+        n = self.members[:, None]
+        return np.divide(self.claims, n, out=np.full(self.claims.shape, np.nan), where=n > 0)
+
+    def loss_ratio(self) -> np.ndarray:
+        """Siniestros / (afiliados × UPC mensual) por grupo y mes."""
+        return self.pmpm() / self.premium if self.premium else np.full(self.claims.shape, np.nan)
+
+    def total(self) -> "CashFlow":
+        """Colapsa los grupos en una fila 'Total'."""
+        return CashFlow([TOTAL], self.months, [self.members.sum()], self.events.sum(0, keepdims=True),
+                        self.event_claims.sum(0, keepdims=True), self.base_claims.sum(0, keepdims=True),
+                        self.premium)
+
+    def matrix(self, metric: str = "claims") -> pd.DataFrame:
+        """Matriz grupo × mes de una métrica de METRICS."""
+        if metric not in METRICS:
+            raise ValueError(f"Métrica desconocida: {metric!r} (opciones: {', '.join(METRICS)})")
+        if metric == "members":
+            values = np.repeat(self.members[:, None], len(self.months), axis=1)
+        else:
+            v = getattr(self, metric)
+            values = v() if callable(v) else v
+        return pd.DataFrame(values, index=pd.Index(self.groups, name="group"),
+                            columns=pd.Index(self.months, name="month"))
+
+    def frame(self) -> pd.DataFrame:
+        """Formato largo: una fila por grupo y mes con todas las métricas."""
+        G, M = len(self.groups), len(self.months)
+        out = pd.DataFrame({"group": np.repeat(self.groups, M), "month": np.tile(self.months, G)})
+        out["members"] = np.repeat(self.members, M)
+        for name, v in (("events", self.events), ("event_claims", self.event_claims),
+                        ("base_claims", self.base_claims), ("claims", self.claims),
+                        ("pmpm", self.pmpm()), ("loss_ratio", self.loss_ratio())):
+            out[name] = v.ravel()
+        return out
+
+
+def _groups(src, by: Optional[str]):
+    n = len(src)
+    if by is None:
+        return np.zeros(n, dtype=np.int64), [TOTAL]
+    codes, uniques = pd.factorize(src[by], sort=True)            # categóricas: orden de categorías
+    codes = np.asarray(codes, dtype=np.int64)
+    labels = [str(u) for u in uniques]
+    if (codes < 0).any():
+        codes = np.where(codes < 0, len(labels), codes)
+        labels.append(NA_GROUP)
+    return codes, labels
+
+@traced("cashflow.project", "cashflow")
+def project(src, by: Optional[str] = None, effect: Optional[Sequence[float]] = None,
+            horizon: int = int(HORIZON), cost_event: Optional[float] = None,
+            premium: float = UPC_MENSUAL, include_base: bool = True,
+            block_rows: int = BLOCK_ROWS) -> CashFlow:
+    """
+    Proyección mensual de la cohorte `src` (DataFrame o CohortView con
+    weibull_lam, weibull_k, cost_event y cost_12m), agrupada por la
+    columna `by` (None = total).
+    - effect: reducción de hazard por mes (horizon,), p. ej. effect_curve().
+    - cost_event: severidad única en lugar de la columna cost_event.
+    - include_base: suma el gasto base (cost_12m / 12) a los siniestros.
+    """
+    horizon = int(horizon)
+    codes, labels = _groups(src, by)
+    G, M = len(labels), horizon
+    lam = np.asarray(src["weibull_lam"], dtype=float)
+    k = np.asarray(src["weibull_k"], dtype=float)
+    sev = None if cost_event is not None else np.asarray(src["cost_event"], dtype=float)
+    keep = None if effect is None else 1.0 - np.asarray(effect, dtype=float)
+    if keep is not None and keep.shape != (M,):
+        raise ValueError(f"effect debe tener {M} meses (recibido {keep.shape})")
+    t = np.arange(M + 1, dtype=float)
+    cell = np.arange(M, dtype=np.int64)[None, :]
+
+    events = np.zeros(G * M)
+    claims = np.zeros(G * M)
+    for a in range(0, len(lam), max(int(block_rows), 1)):
+        b = slice(a, a + block_rows)
+        with span("cashflow.block", "cashflow", rows=len(lam[b])):
+            H = (lam[b, None] * t[None, :]) ** k[b, None]             # hazard acumulado (bloque, M + 1)
+            if keep is not None:
+                H = np.concatenate([H[:, :1], np.cumsum(np.diff(H, axis=1) * keep, axis=1)], axis=1)
+            F = np.fmin(CUM_CAP, -np.expm1(-H))
+            p = np.nan_to_num(np.diff(F, axis=1))                     # P(evento en el mes m)
+            flat = (codes[b, None] * M + cell).ravel()
+            events += np.bincount(flat, weights=p.ravel(), minlength=G * M)
+            if sev is None:
+                claims += np.bincount(flat, weights=(p * float(cost_event)).ravel(), minlength=G * M)
+            else:
+                claims += np.bincount(flat, weights=(p * np.nan_to_num(sev[b])[:, None]).ravel(),
+                                      minlength=G * M)
+
+    members = np.bincount(codes, minlength=G).astype(float)
+    base = np.zeros((G, M))
+    if include_base:
+        monthly = np.nan_to_num(np.asarray(src["cost_12m"], dtype=float)) / 12.0
+        base += np.bincount(codes, weights=monthly, minlength=G)[:, None]
+    return CashFlow(labels, np.arange(1, M + 1), members, events.reshape(G, M), claims.reshape(G, M),
+                    base, premium)
+
+
+# ---------------------------
+# Cache por cohorte (Simulador / Dashboard)
+# ---------------------------
+_PROJECTIONS: "OrderedDict[tuple, CashFlow]" = OrderedDict()
+_LOCK = threading.Lock()
+register_cache("cashflow.projections", lambda: list(_PROJECTIONS.values()))
+
+def projection_for(cohort, by: Optional[str] = None, effect: Optional[Sequence[float]] = None,
+                   horizon: int = int(HORIZON), cost_event: Optional[float] = None,
+                   premium: float = UPC_MENSUAL, include_base: bool = True) -> CashFlow:
+    """project() cacheado por cohorte (huella de la CohortView) y parámetros."""
+    view = cohort if isinstance(cohort, CohortView) else CohortView(cohort)
+    eff = None if effect is None else tuple(np.round(np.asarray(effect, dtype=float), 12))
+    key = (view.signature(), by, eff, int(horizon),
+           None if cost_event is None else float(cost_event), float(premium), bool(include_base))
+    with _LOCK:
+        hit = _PROJECTIONS.get(key)
+        if hit is not None:
+            _PROJECTIONS.move_to_end(key)
+            return hit
+    cf = project(view, by=by, effect=effect, horizon=horizon, cost_event=cost_event,
+                 premium=premium, include_base=include_base)
+    with _LOCK:
+        _PROJECTIONS[key] = cf
+        while len(_PROJECTIONS) > CACHE_MAX:
+            _PROJECTIONS.popitem(last=False)
+    return cf
+
+def clear_cashflow_cache() -> None:
+    with _LOCK:
+        _PROJECTIONS.clear()
@@ -1,7 +1,11 @@
 # services/data_io.py
 import numpy as np
 import pandas as pd
-from typing import Dict, Optional
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterator, Optional
+
+from utils.philox import uniforms
+from utils.profiling import traced
 
 REGIONS_CO = ["Bogotá", "Antioquia", "Valle", "Atlántico", "Santander"]
 REGIONS_MX = ["CDMX", "Edomex", "Jalisco", "Nuevo León", "Puebla"]
@@ -9,6 +13,7 @@ REGIONS_MX = ["CDMX", "Edomex", "Jalisco", "Nuevo León", "Puebla"]
 CIE10 = ["I10", "E11", "N18", "I21", "E78"]  # HTA, DM2, ERC, IAM, Dislipidemia
 ATC = ["C09", "A10", "B01", "C10", "N05"]    # ARA-II/IECA, antidiabéticos, antiagregantes, estatinas, psi
 
+@traced("population.generate", "data")
 def generate_dummy_population(
     n: int = 2000,
     country: str = "Colombia - EPS",
@@ -74,3 +79,196 @@ def generate_dummy_population(
         lambda r: ",".join(sorted(set(np.random.choice(ATC, size=np.random.randint(1,3))))), axis=1
     )
     return df
+
+
+def evolve_population(
+    df: pd.DataFrame,
+    country: str = "Colombia - EPS",
+    seed: int = 0,
+    *,
+    p_change: float = 0.05,
+    p_enter: float = 0.01,
+    p_leave: float = 0.01,
+) -> pd.DataFrame:
+    """
+    Snapshot del mes siguiente a partir de `df` (columnas crudas):
+    - p_leave: bajas; p_enter: altas nuevas (ids correlativos);
+    - p_change: afiliados con labs/utilizaciones nuevas (hba1c, egfr,
+      lab_recency_m, utilizations_12m, cost_12m).
+    El resto de filas queda idéntico (la recencia de labs no envejece en el mock).
+    """
+    rng = np.random.default_rng(seed)
+    out = df[rng.random(len(df)) >= p_leave].reset_index(drop=True)
+
+    ch = rng.random(len(out)) < p_change
+    k = int(ch.sum())
+    out.loc[ch, "hba1c"] = (out.loc[ch, "hba1c"] + rng.normal(0, 0.5, size=k)).clip(4.8, 12.5)
+    out.loc[ch, "egfr"] = (out.loc[ch, "egfr"] + rng.normal(0, 5, size=k)).clip(10, 120)
+    out.loc[ch, "lab_recency_m"] = 1
+    out.loc[ch, "utilizations_12m"] = out.loc[ch, "utilizations_12m"] + rng.integers(0, 3, size=k)
+    out.loc[ch, "cost_12m"] = (out.loc[ch, "cost_12m"] * rng.uniform(0.9, 1.3, size=k)).round(0)
+
+    n_enter = int(rng.binomial(len(df), p_enter)) if p_enter > 0 else 0
+    if n_enter:
+        new = generate_dummy_population(n=n_enter, country=country, seed=int(rng.integers(1 << 31)))
+        last = int(df["patient_id"].str[1:].astype(int).max()) if len(df) else 99999
+        new["patient_id"] = [f"P{last + 1 + i}" for i in range(n_enter)]
+        out = pd.concat([out, new[out.columns]], ignore_index=True)
+    return out
+
+
+# ---------------------------------------------------------------------
+# Generador por contador (Philox): afiliado i = f(semilla, i)
+# ---------------------------------------------------------------------
+PATIENT_ID_BASE = 100000
+_N_WORDS = 28  # uniformes por afiliado (u[0]…u[27], ver generate_patients)
+
+def _pick(u, options, p=None):
+    """Elección categórica con uniformes `u` (probabilidades `p` o uniforme)."""
+    cum = np.cumsum(p if p is not None else np.full(len(options), 1.0 / len(options)))
+    return np.asarray(options)[np.minimum(np.searchsorted(cum / cum[-1], u, side="right"), len(options) - 1)]
+
+def _normal(u1, u2, mean, sd):
+    return mean + sd * np.sqrt(-2.0 * np.log(u1)) * np.cos(2.0 * np.pi * u2)
+
+def _code_sets(u_count, u_codes, codes, max_k):
+    """1..max_k códigos con reemplazo -> set ordenado unido por comas (vía bitmask)."""
+    k = 1 + np.minimum((u_count * max_k).astype(int), max_k - 1)
+    bits = np.zeros(len(k), dtype=np.int64)
+    for j in range(max_k):
+        pos = np.minimum((u_codes[j] * len(codes)).astype(int), len(codes) - 1)
+        bits |= np.where(j < k, 1 << pos, 0)
+    order = np.argsort(codes)
+    table = np.array([",".join(codes[i] for i in order if m >> i & 1) for m in range(1 << len(codes))],
+                     dtype=object)
+    return table[bits]
+
+def generate_patients(
+    idx,
+    country: str = "Colombia - EPS",
+    seed: int = 42,
+    *,
+    p_smoker: Optional[float] = None,
+    p_dm: Optional[float] = None,
+    p_hta: Optional[float] = None,
+    p_ckd: Optional[float] = None,
+    p_prev_event: Optional[float] = None,
+    bmi_mean: Optional[float] = None, bmi_sd: Optional[float] = None,
+    hba1c_mean: Optional[float] = None, hba1c_sd: Optional[float] = None,
+    egfr_mean: Optional[float] = None, egfr_sd: Optional[float] = None,
+    region_weights: Optional[Dict[str, float]] = None,
+) -> pd.DataFrame:
+    """
+    Afiliados en las posiciones `idx` del libro virtual (country, seed).
+    Cada fila depende sólo de (seed, posición): O(1) por afiliado, en
+    cualquier orden/subconjunto y paralelizable. Mismas columnas y
+    distribuciones que generate_dummy_population (no los mismos valores:
+    es otro generador). El índice del frame = posiciones pedidas.
+    """
+    idx = np.asarray(idx, dtype=np.int64).ravel()
+    u = uniforms(seed, idx, _N_WORDS)
+    regions = REGIONS_CO if "Colombia" in country else REGIONS_MX
+    weights = None
+    if region_weights:
+        weights = np.clip([float(region_weights.get(r, 1.0)) for r in regions], 1e-6, None)
+
+    def flag(j, p, default):
+        return (u[j] < (p if p is not None else default)).astype(np.int64)
+
+    df = pd.DataFrame({
+        "patient_id": ("P" + pd.Series(idx + PATIENT_ID_BASE).astype(str)).to_numpy(dtype=object),
+        "age": 18 + (u[0] * 72).astype(np.int64),
+        "sex": _pick(u[1], ["F", "M"], [0.55, 0.45]).astype(object),
+        "region": _pick(u[2], regions, weights).astype(object),
+        "bmi": _normal(u[3], u[4], bmi_mean if bmi_mean is not None else 28,
+                       bmi_sd if bmi_sd is not None else 4.5).clip(16, 48),
+        "smoker": flag(5, p_smoker, 0.30),
+        "hba1c": _normal(u[6], u[7], hba1c_mean if hba1c_mean is not None else 6.8,
+                         hba1c_sd if hba1c_sd is not None else 1.6).clip(4.8, 12.5),
+        "egfr": _normal(u[8], u[9], egfr_mean if egfr_mean is not None else 78,
+                        egfr_sd if egfr_sd is not None else 25).clip(10, 120),
+        "hta": flag(10, p_hta, 0.5),
+        "dm": flag(11, p_dm, 0.30),
+        "ckd": flag(12, p_ckd, 0.15),
+        "prev_event": flag(13, p_prev_event, 0.10),
+        "lab_recency_m": 1 + (u[14] * 23).astype(np.int64),
+        "utilizations_12m": (u[15] * 15).astype(np.int64),
+        # Gamma(2, θ) = suma de dos exponenciales
+        "cost_12m": (-450_000 * (np.log(u[16]) + np.log(u[17]))).clip(0, 15_000_000).round(0),
+        "hta_control": flag(18, None, 0.55),
+        "cost_event": _normal(u[19], u[20], 5_500_000, 1_500_000).clip(1_500_000, 15_000_000).round(0),
+        "dx_cie10": _code_sets(u[21], u[22:25], CIE10, 3),
+        "meds_atc": _code_sets(u[25], u[26:28], ATC, 2),
+    }, index=pd.Index(idx))
+    return df
+
+
+class LazyPopulation:
+    """
+    Libro virtual de `n` afiliados que no se genera completo: se
+    materializan sólo las posiciones pedidas (generate_patients).
+      pop[i]          -> dict del afiliado i (drill-down instantáneo)
+      pop[a:b]        -> DataFrame del rango
+      pop.take(idx)   -> DataFrame de posiciones arbitrarias
+      pop.sample(k)   -> muestra aleatoria sin reemplazo, O(k)
+      pop.chunks(r)   -> iterador de bloques de r filas
+      pop.materialize(workers=4) -> frame completo, bloques en paralelo
+    """
+
+    def __init__(self, n: int, country: str = "Colombia - EPS", seed: int = 42, **params):
+        self.n = int(n)
+        self.country = country
+        self.seed = int(seed)
+        self.params = params
+
+    def __len__(self) -> int:
+        return self.n
+
+    def __repr__(self) -> str:
+        return f"LazyPopulation(n={self.n:,}, country={self.country!r}, seed={self.seed})"
+
+    def _check(self, idx: np.ndarray) -> np.ndarray:
+        idx = np.where(idx < 0, idx + self.n, idx)
+        if idx.size and (idx.min() < 0 or idx.max() >= self.n):
+            raise IndexError(f"Índice fuera de rango para una población de {self.n:,}")
+        return idx
+
+    def take(self, idx) -> pd.DataFrame:
+        return generate_patients(self._check(np.asarray(idx, dtype=np.int64)),
+                                 self.country, self.seed, **self.params)
+
+    def patient(self, i: int) -> Dict:
+        return self.take([i]).iloc[0].to_dict()
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            return self.take(np.arange(*key.indices(self.n)))
+        if np.ndim(key) == 0:
+            return self.patient(int(key))
+        return self.take(key)
+
+    def index_of(self, patient_id: str) -> int:
+        """Posición del afiliado a partir de su patient_id."""
+        return self._check(np.array([int(patient_id[1:]) - PATIENT_ID_BASE]))[0].item()
+
+    def sample(self, k: int, seed: Optional[int] = None) -> pd.DataFrame:
+        rng = np.random.default_rng(seed)
+        return self.take(np.sort(rng.choice(self.n, size=min(int(k), self.n), replace=False)))
+
+    def chunks(self, rows: int = 100_000) -> Iterator[pd.DataFrame]:
+        for a in range(0, self.n, rows):
+            yield self.take(np.arange(a, min(a + rows, self.n)))
+
+    @traced("population.materialize", "data")
+    def materialize(self, workers: int = 1, rows: int = 100_000) -> pd.DataFrame:
+        """Frame completo (RangeIndex); con workers > 1 genera bloques en paralelo."""
+        starts = range(0, self.n, rows)
+        block = lambda a: self.take(np.arange(a, min(a + rows, self.n)))
+        if workers > 1 and len(starts) > 1:
+            with ThreadPoolExecutor(max_workers=workers) as ex:
+                parts = list(ex.map(block, starts))
+        else:
+            parts = [block(a) for a in starts]
+        if not parts:
+            return generate_patients([], self.country, self.seed, **self.params).reset_index(drop=True)
+        return pd.concat(parts, ignore_index=True)
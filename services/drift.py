@@ -0,0 +1,288 @@
+# services/drift.py
+# ---------------------------------------------------------------------
+# Monitor de drift entre dos poblaciones (p.ej. el snapshot del mes
+# anterior vs. la corrida nueva) antes de confiar en un scoring.
+# - DriftProfile: UNA pasada en streaming por chunks (DataFrame, lotes
+#   de un parquet o LazyPopulation) acumulando histogramas de bins fijos
+#   (utils.sketches.FixedHistogram) de las variables de _linear_score_df
+#   + risk_factor, la mezcla por región y la prevalencia de cada código
+#   CIE-10 / ATC. Los perfiles se combinan (merge) por particiones.
+# - compare(): PSI y KS por variable sobre los histogramas. Los bins
+#   de las variables enteras son de ancho 1 (KS exacto); en las
+#   continuas el KS es el de los bordes de bin (cota inferior).
+#   Región y códigos: PSI sobre las proporciones y, en la columna ks,
+#   la máxima |Δ proporción|.
+# - drift_report(): perfiles cacheados por dataset (frame vivo o parquet
+#   por ruta + mtime) y reporte cacheado por par de datasets.
+# ---------------------------------------------------------------------
+
+import os
+import threading
+import weakref
+from collections import OrderedDict
+from typing import Dict, Iterator, Optional
+
+import numpy as np
+import pandas as pd
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+from services.risk_api import FEATURE_LABELS
+from utils.memory import register_cache
+from utils.profiling import span, traced
+from utils.sketches import FixedHistogram
+
+CHUNK_ROWS = 1_000_000
+PSI_EPS = 1e-4           # piso de proporción (bins vacíos en un lado)
+PSI_MODERATE = 0.10      # < 0.10 estable; 0.10–0.25 moderado; > 0.25 significativo
+PSI_MAJOR = 0.25
+REPORT_CACHE_MAX = 32
+
+# variables de _linear_score_df (risk_api.FEATURES) + risk_factor -> (lo, hi, bins).
+# Enteras/binarias: bins de ancho 1 centrados en cada valor.
+NUMERIC_BINS = {
+    "age": (17.5, 90.5, 73),
+    "bmi": (16.0, 48.0, 32),
+    "hba1c": (4.8, 12.5, 44),
+    "egfr": (10.0, 120.0, 44),
+    "utilizations_12m": (-0.5, 39.5, 40),
+    "lab_recency_m": (0.5, 24.5, 24),
+    "smoker": (-0.5, 1.5, 2),
+    "hta": (-0.5, 1.5, 2),
+    "dm": (-0.5, 1.5, 2),
+    "ckd": (-0.5, 1.5, 2),
+    "prev_event": (-0.5, 1.5, 2),
+    "risk_factor": (0.0, 1.0, 50),
+}
+CATEGORY_COLUMNS = ["region"]
+CODE_COLUMNS = {"dx_cie10": "dx", "meds_atc": "atc"}
+_LABELS = {**FEATURE_LABELS, "risk_factor": "Riesgo 12m"}
+
+
+# ---------------------------
+# Lectura por chunks (DataFrame o lotes Arrow)
+# ---------------------------
+def _column(chunk, name: str):
+    if isinstance(chunk, pd.DataFrame):
+        return chunk[name] if name in chunk.columns else None
+    i = chunk.schema.get_field_index(name)
+    return chunk.column(i) if i >= 0 else None
+
+def _numbers(col) -> np.ndarray:
+    if isinstance(col, pd.Series):
+        return col.to_numpy(dtype=float, na_value=np.nan)
+    return np.asarray(col.to_numpy(zero_copy_only=False), dtype=float)
+
+def _value_counts(col) -> Dict[str, int]:
+    if isinstance(col, pd.Series):
+        vc = col.value_counts(dropna=True)
+        return dict(zip(vc.index.astype(str), vc.to_numpy(dtype=np.int64).tolist()))
+    vc = pc.value_counts(col.drop_null())
+    return dict(zip(map(str, vc.field("values").to_pylist()), vc.field("counts").to_pylist()))
+
+def iter_chunks(source, rows: int = CHUNK_ROWS) -> Iterator:
+    """Chunks de `source`: DataFrame, ruta a parquet, objeto con .chunks(rows) o iterable de chunks."""
+    if isinstance(source, pd.DataFrame):
+        for a in range(0, len(source), rows):
+            yield source.iloc[a:a + rows]
+    elif isinstance(source, (str, os.PathLike)):
+        # texto como diccionario: se decodifica una vez por valor distinto y
+        # value_counts trabaja sobre los índices
+        f = pq.ParquetFile(source, read_dictionary=[*CATEGORY_COLUMNS, *CODE_COLUMNS])
+        have = set(f.schema_arrow.names)
+        cols = [c for c in [*NUMERIC_BINS, *CATEGORY_COLUMNS, *CODE_COLUMNS] if c in have]
+        yield from f.iter_batches(batch_size=rows, columns=cols)
+    elif hasattr(source, "chunks"):
+        yield from source.chunks(rows)
+    else:
+        yield from source
+
+
+# ---------------------------
+# Perfil (acumulable en streaming)
+# ---------------------------
+class DriftProfile:
+    """Histogramas fijos + sumas por variable, conteos por región y por código."""
+
+    __slots__ = ("n", "hists", "sums", "categories", "codes")
+
+    def __init__(self):
+        self.n = 0
+        self.hists = {k: FixedHistogram(*v) for k, v in NUMERIC_BINS.items()}
+        self.sums = {k: 0.0 for k in NUMERIC_BINS}
+        self.categories: Dict[str, Dict[str, int]] = {c: {} for c in CATEGORY_COLUMNS}
+        self.codes: Dict[str, Dict[str, int]] = {c: {} for c in CODE_COLUMNS}
+
+    def update(self, chunk) -> "DriftProfile":
+        self.n += len(chunk) if isinstance(chunk, pd.DataFrame) else chunk.num_rows
+        for k, h in self.hists.items():
+            col = _column(chunk, k)
+            if col is None:
+                continue
+            x = _numbers(col)
+            h.update(x)
+            total = float(x.sum())
+            self.sums[k] += total if total == total else float(np.nansum(x))
+        for c, acc in self.categories.items():
+            col = _column(chunk, c)
+            if col is not None:
+                for v, m in _value_counts(col).items():
+                    acc[v] = acc.get(v, 0) + m
+        for c, acc in self.codes.items():
+            col = _column(chunk, c)
+            if col is None:
+                continue
+            for combo, m in _value_counts(col).items():   # pocos combos distintos: se parten una vez
+                for code in {s.strip() for s in combo.split(",") if s.strip()}:
+                    acc[code] = acc.get(code, 0) + m
+        return self
+
+    def merge(self, other: "DriftProfile") -> "DriftProfile":
+        self.n += other.n
+        for k in self.hists:
+            self.hists[k].merge(other.hists[k])
+            self.sums[k] += other.sums[k]
+        for mine, theirs in ((self.categories, other.categories), (self.codes, other.codes)):
+            for c, acc in theirs.items():
+                for v, m in acc.items():
+                    mine[c][v] = mine[c].get(v, 0) + m
+        return self
+
+    def has(self, feature: str) -> bool:
+        return self.hists[feature].n > 0
+
+    def mean(self, feature: str) -> float:
+        h = self.hists[feature]
+        return self.sums[feature] / h.n if h.n else float("nan")
+
+
+@traced("drift.profile", "drift")
+def profile(source, rows: int = CHUNK_ROWS) -> DriftProfile:
+    """Perfil de `source` en una pasada por chunks (ver iter_chunks)."""
+    p = DriftProfile()
+    for chunk in iter_chunks(source, rows):
+        p.update(chunk)
+    return p
+
+
+# ---------------------------
+# Estadísticos
+# ---------------------------
+def psi(expected: np.ndarray, actual: np.ndarray, eps: float = PSI_EPS) -> float:
+    """Population Stability Index entre dos vectores de conteos/proporciones."""
+    p = np.asarray(expected, dtype=float)
+    q = np.asarray(actual, dtype=float)
+    if p.sum() <= 0 or q.sum() <= 0:
+        return float("nan")
+    p = np.maximum(p / p.sum(), eps)
+    q = np.maximum(q / q.sum(), eps)
+    return float(np.sum((q - p) * np.log(q / p)))
+
+def ks(expected: np.ndarray, actual: np.ndarray) -> float:
+    """KS = max |F_a − F_b| sobre los bordes de bin (conteos ordenados)."""
+    p = np.asarray(expected, dtype=float)
+    q = np.asarray(actual, dtype=float)
+    if p.sum() <= 0 or q.sum() <= 0:
+        return float("nan")
+    return float(np.max(np.abs(np.cumsum(p) / p.sum() - np.cumsum(q) / q.sum())))
+
+def _binned(h: FixedHistogram) -> np.ndarray:
+    return np.concatenate([[h.underflow], h.counts, [h.overflow]])
+
+def _level(value: float) -> str:
+    if not np.isfinite(value):
+        return "—"
+    return "estable" if value < PSI_MODERATE else "moderado" if value < PSI_MAJOR else "significativo"
+
+def compare(ref: DriftProfile, cur: DriftProfile) -> pd.DataFrame:
+    """
+    Una fila por variable: feature, label, kind (numérica / región / dx /
+    atc), psi, ks, ref y cur (media o proporción), level (por PSI).
+    """
+    rows = []
+    for k in NUMERIC_BINS:
+        if not (ref.has(k) and cur.has(k)):
+            continue
+        a, b = _binned(ref.hists[k]), _binned(cur.hists[k])
+        rows.append({"feature": k, "label": _LABELS.get(k, k), "kind": "numérica",
+                     "psi": psi(a, b), "ks": ks(a, b), "ref": ref.mean(k), "cur": cur.mean(k)})
+    for c in CATEGORY_COLUMNS:
+        keys = sorted(set(ref.categories[c]) | set(cur.categories[c]))
+        if not keys:
+            continue
+        a = np.array([ref.categories[c].get(v, 0) for v in keys], dtype=float)
+        b = np.array([cur.categories[c].get(v, 0) for v in keys], dtype=float)
+        pa_, pb = a / max(a.sum(), 1), b / max(b.sum(), 1)
+        j = int(np.argmax(np.abs(pa_ - pb)))
+        rows.append({"feature": c, "label": f"{_LABELS.get(c, c)} (mezcla)", "kind": "región",
+                     "psi": psi(a, b), "ks": float(abs(pa_[j] - pb[j])), "ref": float(pa_[j]), "cur": float(pb[j])})
+        for v, x, y in zip(keys, pa_, pb):
+            rows.append({"feature": f"{c}={v}", "label": v, "kind": "región",
+                         "psi": psi([x, 1 - x], [y, 1 - y]), "ks": float(abs(x - y)), "ref": float(x), "cur": float(y)})
+    for c, kind in CODE_COLUMNS.items():
+        for code in sorted(set(ref.codes[c]) | set(cur.codes[c])):
+            x = ref.codes[c].get(code, 0) / max(ref.n, 1)
+            y = cur.codes[c].get(code, 0) / max(cur.n, 1)
+            rows.append({"feature": f"{c}={code}", "label": code, "kind": kind,
+                         "psi": psi([x, 1 - x], [y, 1 - y]), "ks": float(abs(x - y)), "ref": x, "cur": y})
+    out = pd.DataFrame(rows, columns=["feature", "label", "kind", "psi", "ks", "ref", "cur"])
+    out["level"] = [_level(v) for v in out["psi"]]
+    return out
+
+
+# ---------------------------
+# Cache por dataset / par de datasets
+# ---------------------------
+_PROFILES: Dict[tuple, tuple] = {}                 # clave -> (weakref(frame) | None, DriftProfile)
+_REPORTS: "OrderedDict[tuple, tuple]" = OrderedDict()  # (id perfil ref, id perfil cur) -> (ref, cur, tabla)
+_LOCK = threading.Lock()
+register_cache("drift.profiles", lambda: [p for _, p in list(_PROFILES.values())])
+register_cache("drift.reports", lambda: [t for *_, t in list(_REPORTS.values())])
+
+def _source_key(source) -> Optional[tuple]:
+    if isinstance(source, pd.DataFrame):
+        return ("frame", id(source))
+    if isinstance(source, (str, os.PathLike)):
+        st = os.stat(source)
+        return ("file", os.path.abspath(source), st.st_mtime_ns, st.st_size)
+    if hasattr(source, "chunks") and hasattr(source, "seed"):   # LazyPopulation: determinista
+        return ("lazy", len(source), source.country, source.seed, repr(sorted(source.params.items())))
+    return None
+
+def profile_for(source, rows: int = CHUNK_ROWS) -> DriftProfile:
+    """Perfil cacheado por dataset (frame vivo, parquet por ruta + mtime, LazyPopulation)."""
+    key = _source_key(source)
+    if key is None:
+        return profile(source, rows)
+    with _LOCK:
+        hit = _PROFILES.get(key)
+        if hit is not None and (hit[0] is None or hit[0]() is source):
+            return hit[1]
+        for k in [k for k, (ref, _) in _PROFILES.items() if ref is not None and ref() is None]:
+            del _PROFILES[k]
+    p = profile(source, rows)
+    with _LOCK:
+        _PROFILES[key] = (weakref.ref(source) if isinstance(source, pd.DataFrame) else None, p)
+    return p
+
+def drift_report(ref, cur, rows: int = CHUNK_ROWS) -> pd.DataFrame:
+    """compare(profile_for(ref), profile_for(cur)), cacheado por par de datasets."""
+    a, b = profile_for(ref, rows), profile_for(cur, rows)
+    key = (id(a), id(b))
+    with _LOCK:
+        hit = _REPORTS.get(key)
+        if hit is not None and hit[0] is a and hit[1] is b:
+            _REPORTS.move_to_end(key)
+            return hit[2]
+    with span("drift.compare", "drift"):
+        table = compare(a, b)
+    with _LOCK:
+        _REPORTS[key] = (a, b, table)
+        while len(_REPORTS) > REPORT_CACHE_MAX:
+            _REPORTS.popitem(last=False)
+    return table
+
+def clear_drift_cache() -> None:
+    with _LOCK:
+        _PROFILES.clear()
+        _REPORTS.clear()
@@ -0,0 +1,59 @@
+# services/populations.py
+# ---------------------------------------------------------------------
+# Poblaciones puntuadas por página (misma n/semillas que tenía cada
+# página) + agregados derivados que se precalculan una sola vez.
+# ---------------------------------------------------------------------
+
+from typing import Dict
+
+from services.data_io import generate_dummy_population
+from services.risk_api import linear_attributions, score_batch
+from utils import weibull
+from utils.care_gaps import gap_counts
+from utils.kpis import KPIAccumulator
+from utils.sketches import RiskDistribution
+
+def _score_batch(df, seed, dist):
+    """Backend remoto (Arrow IPC) si CORPUS_RISK_API_URL está definida; si no, el mock local."""
+    from services import risk_client
+    if risk_client.remote_enabled():
+        return risk_client.score_batch(df, seed=seed, dist=dist)
+    return score_batch(df, seed=seed, dist=dist)
+
+# página -> parámetros de generación/scoring
+PAGE_PRESETS: Dict[str, Dict] = {
+    "dashboard": {"n": 2500, "seed": 42, "score_seed": 123},
+    "worklist": {"n": 1500, "seed": 7, "score_seed": 55},
+    "simulador": {"n": 1800, "seed": 111, "score_seed": 222},
+}
+
+URGENCY_MONTHS = 3.0
+
+def _add_worklist_columns(df):
+    # Urgencia = P(evento en los próximos URGENCY_MONTHS meses), cerrada
+    # sobre la curva Weibull de cada paciente (sin re-puntuar)
+    df["urgency"] = weibull.expected_events(0.0, URGENCY_MONTHS, df["weibull_lam"].to_numpy(),
+                                            df["weibull_k"].to_numpy())
+    return df
+
+_POST = {"worklist": _add_worklist_columns}
+
+def build_scored_population(page: str, country: str) -> Dict:
+    """
+    Genera y puntúa la población de `page` para `country`.
+    -> dict con:
+       - df: DataFrame puntuado (compartido: no mutar, filtrar/copiar)
+       - kpis: KPIAccumulator de la población completa
+       - dist: RiskDistribution (sketch + histograma de risk_factor)
+       - attr: atribuciones exactas al logit (n × features, mismo índice que df)
+       - gap_counts: pacientes por brecha (desde el bitmask gap_mask)
+    """
+    p = PAGE_PRESETS[page]
+    dist = RiskDistribution()
+    df = generate_dummy_population(n=p["n"], country=country, seed=p["seed"])
+    df, _ = _score_batch(df, seed=p["score_seed"], dist=dist)
+    post = _POST.get(page)
+    if post:
+        df = post(df)
+    return {"df": df, "kpis": KPIAccumulator().update(df), "dist": dist,
+            "attr": linear_attributions(df), "gap_counts": gap_counts(df["gap_mask"])}
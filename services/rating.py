@@ -0,0 +1,183 @@
+# services/rating.py
+# ---------------------------------------------------------------------
+# Tarificación vectorizada (Suscripción) y re-tarificación del libro.
+# - premium(): la fórmula del cotizador (base del plan × (1 + rf) ×
+#   factor de deducible × factor de coaseguro, con prima mínima), sobre
+#   escalares o arrays: un afiliado o el libro completo en una pasada.
+# - RatedBook: columnas del libro extraídas una vez (rf, severidad, celda
+#   edad × sexo × banda de riesgo) + sumas por celda precalculadas; al
+#   cambiar el plan se re-tarifica en O(n) NumPy y la tabla de tasas por
+#   celda + la suficiencia de prima vs. siniestros esperados
+#   (risk_factor × cost_event, netos de deducible/coaseguro) salen en
+#   O(celdas).
+# - Monedas: la prima y el deducible del cotizador están en USD. cost_event
+#   es sintético y generate_dummy_population lo sortea en la misma escala
+#   (~5,5 M, magnitud de COP) para ambos países: no es MXN en México. El
+#   siniestro se convierte con claims_fx = unidades de cost_event por USD
+#   (SEVERITY_FX, el COP/USD de referencia), que la página muestra como
+#   input explícito.
+# - risk_factor NaN: la póliza no tiene prima (como premium(NaN)) ni
+#   siniestro esperado; ambos caminos de rate_table la excluyen igual.
+# ---------------------------------------------------------------------
+
+import threading
+import weakref
+from typing import Dict, Optional
+
+import numpy as np
+import pandas as pd
+
+from utils.chart_data import AGE_BAND_BINS, AGE_BAND_LABELS, RISK_BAND_BINS, RISK_BAND_LABELS
+from utils.memory import register_cache
+from utils.profiling import span, traced
+
+PLAN_BASE = {"Básico": 700.0, "Estándar": 900.0, "Premium": 1200.0}
+MIN_PREMIUM = 25.0
+DEDUCTIBLE_SCALE = 10_000.0   # descuento de prima = deducible / 10.000
+PREMIUM_CURRENCY = "USD"
+SEVERITY_UNIT = "COP"         # escala de cost_event sintético (la misma en ambos países)
+SEVERITY_FX = 4_000.0         # unidades de cost_event por USD (COP/USD de referencia)
+CELL_KEYS = ["age_band", "sex", "risk_band"]
+
+
+class RateStructure:
+    """
+    Parámetros del plan: base, deducible (moneda de la prima), coaseguro
+    (%) y claims_fx (moneda de cost_event por unidad de prima; 1 = misma).
+    """
+
+    __slots__ = ("plan", "deductible", "coinsurance", "base", "min_premium", "claims_fx")
+
+    def __init__(self, plan: str = "Estándar", deductible: float = 500, coinsurance: float = 20,
+                 base: Optional[float] = None, min_premium: float = MIN_PREMIUM, claims_fx: float = 1.0):
+        if base is None and plan not in PLAN_BASE:
+            raise ValueError(f"Plan desconocido: {plan!r} (opciones: {', '.join(PLAN_BASE)})")
+        self.plan = plan
+        self.deductible = float(deductible)
+        self.coinsurance = float(coinsurance)
+        self.base = float(PLAN_BASE[plan] if base is None else base)
+        self.min_premium = float(min_premium)
+        if not claims_fx > 0:
+            raise ValueError(f"claims_fx debe ser > 0 (recibido {claims_fx!r})")
+        self.claims_fx = float(claims_fx)
+
+    def __repr__(self) -> str:
+        return (f"RateStructure({self.plan!r}, deductible={self.deductible:g}, "
+                f"coinsurance={self.coinsurance:g}, base={self.base:g})")
+
+    @property
+    def adjustment(self) -> float:
+        """Factor de deducible × coaseguro sobre la prima."""
+        return (1 - self.deductible / DEDUCTIBLE_SCALE) * (1 - self.coinsurance / 100)
+
+    def premium(self, risk):
+        """Prima por afiliado (escalar o array de risk_factor)."""
+        out = np.maximum(self.min_premium, self.base * (1 + np.asarray(risk, dtype=float)) * self.adjustment)
+        return float(out) if np.ndim(out) == 0 else out
+
+    def net_claims(self, risk, cost_event):
+        """Siniestro esperado a cargo del asegurador: rf × (severidad − deducible)+ × (1 − coaseguro)."""
+        sev = np.asarray(cost_event, dtype=float) / self.claims_fx
+        out = np.asarray(risk, dtype=float) * np.maximum(sev - self.deductible, 0.0) * (1 - self.coinsurance / 100)
+        return float(out) if np.ndim(out) == 0 else out
+
+
+def premium(risk, plan: str = "Estándar", deductible: float = 500, coinsurance: float = 20):
+    """Atajo: RateStructure(plan, deductible, coinsurance).premium(risk)."""
+    return RateStructure(plan, deductible, coinsurance).premium(risk)
+
+
+class RatedBook:
+    """Libro puntuado listo para re-tarificar (columnas + celdas edad × sexo × banda)."""
+
+    __slots__ = ("risk", "severity", "cell", "cells", "_load_sum", "_risk_sum", "_risk_n", "__weakref__")
+
+    def __init__(self, df: pd.DataFrame):
+        with span("rating.book", "rating", rows=len(df)):
+            self.risk = df["risk_factor"].to_numpy(dtype=float)
+            self.severity = df["cost_event"].to_numpy(dtype=float)
+            keys = {
+                "age_band": pd.cut(df["age"], bins=AGE_BAND_BINS, labels=AGE_BAND_LABELS, include_lowest=True),
+                "sex": df["sex"],
+                "risk_band": pd.cut(df["risk_factor"], bins=RISK_BAND_BINS, labels=RISK_BAND_LABELS,
+                                    include_lowest=True),
+            }
+            cats = {k: pd.Categorical(v) for k, v in keys.items()}
+            codes = np.zeros(len(df), dtype=np.int64)
+            for k in CELL_KEYS:                                  # NaN -> posición extra (None)
+                m = len(cats[k].categories)
+                c = np.asarray(cats[k].codes, dtype=np.int64)
+                codes = codes * (m + 1) + np.where(c < 0, m, c)
+            uniq, self.cell = np.unique(codes, return_inverse=True)
+            labels, rest = {}, uniq
+            for k in reversed(CELL_KEYS):
+                values = list(cats[k].categories) + [None]
+                labels[k] = [values[i] for i in rest % len(values)]
+                rest = rest // len(values)
+            self.cells = pd.DataFrame({k: labels[k] for k in CELL_KEYS})
+            self.cells["n"] = np.bincount(self.cell, minlength=len(uniq))
+            valid = ~np.isnan(self.risk)                          # rf NaN: sin prima ni siniestro
+            self._risk_n = np.bincount(self.cell[valid], minlength=len(uniq))
+            self._risk_sum = np.bincount(self.cell[valid], weights=self.risk[valid], minlength=len(uniq))
+            self._load_sum = self._risk_n + self._risk_sum   # Σ (1 + rf) sobre rf válidos
+
+    def __len__(self) -> int:
+        return len(self.risk)
+
+    def premiums(self, rs: RateStructure) -> np.ndarray:
+        """Prima por póliza (misma fórmula que el cotizador)."""
+        return rs.premium(self.risk)
+
+    @traced("rating.rerate", "rating")
+    def rate_table(self, rs: RateStructure) -> pd.DataFrame:
+        """
+        Tabla de tasas por edad × sexo × banda de riesgo: tasa de la celda
+        (base × ajuste × (1 + rf medio)), prima y siniestro esperado neto
+        sumados, y suficiencia = prima / siniestro.
+        """
+        n = self.cells["n"].to_numpy()
+        out = self.cells.copy()
+        out["risk_mean"] = np.divide(self._risk_sum, self._risk_n, out=np.full(len(n), np.nan),
+                                     where=self._risk_n > 0)
+        out["rate"] = rs.premium(out["risk_mean"].to_numpy())
+        floor = rs.min_premium / max(rs.base * rs.adjustment, 1e-12) - 1   # rf bajo el cual rige el mínimo
+        if np.nanmin(self.risk, initial=np.inf) >= floor:
+            prem = rs.base * rs.adjustment * self._load_sum    # sin mínimo activo: lineal en Σ (1 + rf)
+        else:
+            prem = np.bincount(self.cell, weights=np.nan_to_num(self.premiums(rs)), minlength=len(n))  # NaN -> 0
+        claims = np.nan_to_num(rs.net_claims(self.risk, self.severity))
+        out["premium"] = prem
+        out["expected_claims"] = np.bincount(self.cell, weights=claims, minlength=len(n))
+        out["adequacy"] = np.divide(out["premium"], out["expected_claims"],
+                                    out=np.full(len(n), np.nan), where=out["expected_claims"].to_numpy() > 0)
+        return out
+
+    def adequacy(self, rs: RateStructure, table: Optional[pd.DataFrame] = None) -> Dict[str, float]:
+        """Totales del libro: prima, siniestro esperado neto, suficiencia y loss ratio esperado."""
+        t = self.rate_table(rs) if table is None else table
+        prem, claims = float(t["premium"].sum()), float(t["expected_claims"].sum())
+        return {"policies": len(self), "premium": prem, "expected_claims": claims,
+                "adequacy": prem / claims if claims else float("nan"),
+                "loss_ratio": claims / prem if prem else float("nan"),
+                "cells_short": int((t["adequacy"] < 1).sum())}
+
+
+# ---------------------------
+# Libro por población (cache del proceso)
+# ---------------------------
+_BOOKS: Dict[int, tuple] = {}    # id(df) -> (weakref(df), RatedBook)
+_BOOKS_LOCK = threading.Lock()
+register_cache("rating.books", lambda: [b for _, b in list(_BOOKS.values())])
+
+def book_for(df: pd.DataFrame) -> RatedBook:
+    """RatedBook del frame (poblaciones compartidas: se arma una vez por frame vivo)."""
+    with _BOOKS_LOCK:
+        hit = _BOOKS.get(id(df))
+        if hit is not None and hit[0]() is df:
+            return hit[1]
+        for k in [k for k, (ref, _) in _BOOKS.items() if ref() is None]:
+            del _BOOKS[k]
+    book = RatedBook(df)
+    with _BOOKS_LOCK:
+        _BOOKS[id(df)] = (weakref.ref(df), book)
+    return book
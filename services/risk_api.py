@@ -11,6 +11,10 @@ import numpy as np
 import pandas as pd
 from typing import Dict, Optional, Tuple, List, Any
 
+from utils import kernels
+from utils.care_gaps import DEFAULT_RULES as GAP_RULES
+from utils.profiling import count, traced
+
 # =========================
 # Configuración por defecto
 # =========================
@@ -43,9 +47,8 @@ _CFG = DEFAULT_CONFIG.copy()
 # ==========
 # Utilidades
 # ==========
-def set_mock_config(cfg: Dict) -> None:
-    """Actualiza la configuración global del mock de modo seguro."""
-    global _CFG
+def merge_config(cfg: Optional[Dict]) -> Dict:
+    """DEFAULT_CONFIG completado con `cfg` (los dicts anidados se combinan)."""
     merged = DEFAULT_CONFIG.copy()
     for k, v in (cfg or {}).items():
         if isinstance(v, dict) and k in merged:
@@ -54,7 +57,12 @@ def set_mock_config(cfg: Dict) -> None:
             merged[k] = tmp
         else:
             merged[k] = v
-    _CFG = merged
+    return merged
+
+def set_mock_config(cfg: Dict) -> None:
+    """Actualiza la configuración global del mock de modo seguro."""
+    global _CFG
+    _CFG = merge_config(cfg)
 
 def get_mock_config() -> Dict:
     return _CFG
@@ -62,17 +70,6 @@ def get_mock_config() -> Dict:
 def _sigmoid(x):  # mantiene tu firma original
     return 1.0 / (1.0 + np.exp(-x))
 
-def _weibull_curve(c12: float, k: float, months: np.ndarray) -> np.ndarray:
-    """
-    Genera riesgo acumulado mensual F(t)=1-exp(-(λ t)^k)
-    con λ tal que F(12)=c12.
-    """
-    c12 = float(np.clip(c12, 1e-6, 0.999))
-    k = float(np.clip(k, 0.6, 1.7))
-    lam = (-np.log(1.0 - c12)) ** (1.0 / k) / 12.0
-    t = months.astype(float)
-    return 1.0 - np.exp(-(lam * t) ** k)
-
 def _ensure_columns(row: dict) -> dict:
     """Completa valores por defecto si faltan en el row."""
     defaults = {
@@ -114,6 +111,91 @@ def _linear_score_df(df: pd.DataFrame, cfg: Dict) -> np.ndarray:
     s = s * float(cfg.get("scale", 1.0))
     return s
 
+# =====================================
+# Atribuciones lineales exactas (logit)
+# =====================================
+# El score es lineal en el logit: s = scale·(intercept + Σ w_i·x_i + uplift).
+# Contra un paciente de referencia b:
+#   s = baseline_logit(b) + Σ scale·w_i·(x_i − b_i) + scale·uplift(region)
+# => contribuciones exactas que suman s − baseline_logit.
+FEATURES = ["age", "bmi", "hba1c", "egfr", "utilizations_12m", "lab_recency_m",
+            "smoker", "hta", "dm", "ckd", "prev_event"]
+FEATURE_LABELS = {
+    "age": "Edad", "bmi": "IMC", "hba1c": "HbA1c", "egfr": "eGFR",
+    "utilizations_12m": "Utilizaciones 12m", "lab_recency_m": "Meses desde lab",
+    "smoker": "Tabaquismo", "hta": "HTA", "dm": "DM", "ckd": "ERC",
+    "prev_event": "Evento previo", "region": "Región",
+}
+# Paciente de referencia = defaults de _ensure_columns (binarias en 0)
+ATTR_BASELINE: Dict[str, float] = {
+    "age": 50.0, "bmi": 27.0, "hba1c": 6.5, "egfr": 80.0, "utilizations_12m": 0.0,
+    "lab_recency_m": 12.0, "smoker": 0.0, "hta": 0.0, "dm": 0.0, "ckd": 0.0, "prev_event": 0.0,
+}
+
+def baseline_logit(cfg: Optional[Dict] = None, baseline: Optional[Dict] = None) -> float:
+    """Logit del paciente de referencia (sin uplift regional)."""
+    cfg = cfg or get_mock_config()
+    w = cfg["weights"]
+    b = {**ATTR_BASELINE, **(baseline or {})}
+    s = w.get("intercept", 0.0) + sum(w[f] * b[f] for f in FEATURES)
+    return float(s * float(cfg.get("scale", 1.0)))
+
+def linear_attributions(df: pd.DataFrame, cfg: Optional[Dict] = None,
+                        baseline: Optional[Dict] = None) -> pd.DataFrame:
+    """
+    Matriz (n × features) de contribuciones al logit: scale·w_i·(x_i − b_i)
+    más la columna 'region' (scale·uplift). Mismo índice que df.
+    Las filas suman _linear_score_df(df) − baseline_logit().
+    """
+    cfg = cfg or get_mock_config()
+    w = cfg["weights"]
+    scale = float(cfg.get("scale", 1.0))
+    b = {**ATTR_BASELINE, **(baseline or {})}
+
+    n = len(df)
+    A = np.empty((n, len(FEATURES) + 1), dtype=float)
+    for j, f in enumerate(FEATURES):
+        # columna faltante = 0 (misma convención que _linear_score_df)
+        x = df[f].to_numpy(dtype=float) if f in df.columns else np.zeros(n)
+        A[:, j] = scale * w[f] * (x - b[f])
+    if "region" in df.columns and cfg.get("region_uplift"):
+        A[:, -1] = scale * df["region"].map(cfg["region_uplift"]).fillna(0.0).to_numpy(dtype=float)
+    else:
+        A[:, -1] = 0.0
+    return pd.DataFrame(A, columns=FEATURES + ["region"], index=df.index)
+
+def top_features_from_attributions(A: pd.DataFrame, k: int = 5) -> List[List[Dict]]:
+    """Top-k por |contribución| de cada fila -> [{name, contrib}, ...] por fila."""
+    vals = A.to_numpy()
+    k = min(k, vals.shape[1])
+    idx = np.argsort(-np.abs(vals), axis=1, kind="stable")[:, :k]
+    top = np.take_along_axis(vals, idx, axis=1)
+    labels = np.array([FEATURE_LABELS[c] for c in A.columns])
+    names = labels[idx].tolist()
+    top = top.tolist()
+    return [
+        [{"name": nm, "contrib": v} for nm, v in zip(names[i], top[i])]
+        for i in range(len(vals))
+    ]
+
+def attribution_summary(A: pd.DataFrame, by=None, how: str = "mean") -> pd.DataFrame:
+    """
+    Agregado por cohorte de la matriz de atribuciones.
+    - how: "mean" (contribución media, con signo) o "mean_abs" (|contribución| media).
+    - by: None -> columnas [feature, contribution] (lista para top_features_bar);
+          Series/array alineado (región, banda de riesgo...) ->
+          [group, feature, contribution] en formato largo.
+    """
+    vals = A.abs() if how == "mean_abs" else A
+    if by is None:
+        out = vals.mean().rename("contribution").rename_axis("feature").reset_index()
+    else:
+        g = vals.groupby(np.asarray(by), observed=True, sort=True).mean()
+        out = (g.rename_axis("group").reset_index()
+                .melt(id_vars="group", var_name="feature", value_name="contribution"))
+    out["feature"] = out["feature"].map(FEATURE_LABELS)
+    return out
+
 # ===================================
 # API principal (con la MISMA firma)
 # ===================================
@@ -121,97 +203,132 @@ def score_row(row, rng=None):
     """
     -> Devuelve un dict con:
        - risk_factor: float
-       - time_window_months: [ini, fin]
+       - time_window_months: [ini, fin] continuos (meses en que se acumula
+         el 25 % y el 75 % del riesgo a 12m; ver utils/weibull)
        - risk_curve: [{month, cum_risk}, ...] con Weibull (no lineal)
-       - top_features: [{name, contrib}], suma ~1
+       - weibull_k / weibull_lam: parámetros de la curva (consultas cerradas)
+       - top_features: [{name, contrib}], top-5 por |contribución al logit|
+         (exacta, vs. ATTR_BASELINE; ver linear_attributions)
        - care_gaps: list[str]
        - cohort_label: str
     """
+    r = _ensure_columns(row)
+    return score_records(pd.DataFrame([r]), rng or np.random.default_rng())[0]
+
+# Orden de suma del score lineal (mismo que _linear_score_df)
+_SCORE_ORDER = ["age", "bmi", "smoker", "hba1c", "egfr", "hta", "dm", "ckd", "prev_event",
+                "utilizations_12m", "lab_recency_m"]
+# Bandas de forma Weibull: riesgo < corte -> k
+_K_CUTS = (0.15, 0.35, 0.55, 0.75)
+_K_VALUES = (1.35, 1.10, 1.00, 0.90, 0.80)
+_MONTHS = np.arange(1, 13, dtype=int)
+
+def _ensure_frame(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Versión por columnas de _ensure_columns (faltantes/None/NaN -> default,
+    en cualquier dtype: un frame armado con payloads de distintas claves
+    deja NaN en columnas numéricas).
+    """
+    defaults = _ensure_columns({})
+    out = df.copy(deep=False)
+    for c, d in defaults.items():
+        if c not in out.columns:
+            out[c] = d
+        elif d is not None and out[c].isna().any():
+            out[c] = out[c].fillna(d)
+    return out
+
+def score_records(df: pd.DataFrame, rng=None) -> List[Dict]:
+    return _score_frame(df, rng)[0]
+
+def _score_frame(df: pd.DataFrame, rng=None, jitter=None) -> Tuple[List[Dict], Dict[str, np.ndarray]]:
+    """
+    Scoring vectorizado de un frame: un solo score lineal, una sola tanda
+    de jitter (rng.normal(size=n) da los mismos valores que n llamadas
+    escalares) y curvas Weibull en bloque. `jitter` (n normales estándar,
+    p.ej. por afiliado) reemplaza la tanda del rng.
+    -> (records, cols) con cols = gap_mask, tw_start, tw_end, weibull_k, weibull_lam.
+    """
+    n = len(df)
+    if n == 0:
+        empty = np.zeros(0)
+        return [], {"gap_mask": np.zeros(0, dtype=np.uint32), "tw_start": empty, "tw_end": empty,
+                    "weibull_k": empty, "weibull_lam": empty}
     cfg = get_mock_config()
     rng = rng or np.random.default_rng()
+    f = _ensure_frame(df)
 
-    r = _ensure_columns(row)
+    # Score + sigmoide + forma k + curva/ventana Weibull (kernel fusionado
+    # si hay Numba; si no, la misma cuenta vectorizada en NumPy)
+    w = cfg["weights"]
+    if "region" in f.columns and cfg.get("region_uplift"):
+        uplift = f["region"].map(cfg["region_uplift"]).fillna(0.0).to_numpy(dtype=float)
+    else:
+        uplift = np.zeros(n)
+    sc = kernels.score_curves(
+        np.column_stack([f[c].to_numpy(dtype=float) for c in _SCORE_ORDER]),
+        [w[c] for c in _SCORE_ORDER], w.get("intercept", 0.0), uplift, cfg.get("scale", 1.0),
+        cfg.get("clip", (0.0, 0.92)),
+        rng.normal(0, 0.03, size=n) if jitter is None else 0.03 * np.asarray(jitter, dtype=float),
+        _K_CUTS, _K_VALUES, _MONTHS,
+    )
+    risk, k, lam, cum = sc["risk"], sc["k"], sc["lam"], sc["cum"]
+    tw_start, tw_end = sc["tw_start"], sc["tw_end"]
 
-    # Score lineal para una fila
-    df1 = pd.DataFrame([r])
-    s = _linear_score_df(df1, cfg)[0]
-    risk = float(np.clip(_sigmoid(s), *cfg.get("clip", (0.0, 0.92))))
-
-    # Ventana temporal (mantiene tu umbral por defecto 0.30)
-    tw = [1, 6] if risk >= float(cfg.get("hi_cut", 0.30)) else [6, 12]
-
-    # Curva mensual con Weibull: forma según magnitud de riesgo
-    # - Bajo: k más alto (riesgo tardío)
-    # - Alto: k más bajo (front-loaded)
-    if   risk < 0.15: k = 1.35
-    elif risk < 0.35: k = 1.10
-    elif risk < 0.55: k = 1.00
-    elif risk < 0.75: k = 0.90
-    else:             k = 0.80
-    # pequeño jitter estable
-    k = float(np.clip(k + rng.normal(0, 0.03), 0.6, 1.7))
-
-    months = np.arange(1, 13, dtype=int)
-    c12 = float(np.clip(risk, 0.02, 0.95))
-    cum = _weibull_curve(c12, k, months)
-    risk_curve = [{"month": int(m), "cum_risk": float(min(0.95, c))} for m, c in zip(months, cum)]
-
-    # Explicabilidad (mantiene nombres y estructura original)
-    # Magnitudes relativas simples a partir de señales clínicas
-    feats = [
-        ("eGFR bajo", max(0.0, 80.0 - float(r["egfr"])) / 80.0),
-        ("HbA1c alto", max(0.0, float(r["hba1c"]) - 6.5) / 6.5),
-        ("HTA", float(r["hta"])),
-        ("DM", float(r["dm"])),
-        ("IMC alto", max(0.0, float(r["bmi"]) - 27.0) / 27.0),
-    ]
-    contribs = np.array([v for _, v in feats], dtype=float)
-    total = contribs.sum()
-    if total > 0:
-        contribs = contribs / total
-    features = [{"name": n, "contrib": float(v)} for (n, _), v in zip(feats, contribs)]
-
-    # Care gaps (conserva tu lógica)
-    care_gaps: List[str] = []
-    if r.get("lab_recency_m", 99) > 12:
-        care_gaps.append("Laboratorio desactualizado")
-    if r.get("hta", 0) and ("C09" not in str(r.get("meds_atc", ""))):
-        care_gaps.append("Sin IECA/ARA-II")
-    if r.get("dm", 0) and float(r.get("hba1c", 7.5)) > 8.0:
-        care_gaps.append("HbA1c fuera de meta")
-
-    cohort_label = "DM+ERC" if (int(r.get("dm", 0)) and int(r.get("ckd", 0))) else "General"
-
-    return {
-        "risk_factor": risk,
-        "time_window_months": tw,
-        "risk_curve": risk_curve,
-        "top_features": features,
-        "care_gaps": care_gaps,
-        "cohort_label": cohort_label,
-    }
+    num = lambda c: f[c].astype(float).to_numpy()
+    features = top_features_from_attributions(linear_attributions(f, cfg))
 
-def score_batch(df, seed=123):
+    gap_mask = GAP_RULES.evaluate(f)
+    gaps = GAP_RULES.labels_for(gap_mask)
+    dm_ckd = (num("dm").astype(int) != 0) & (num("ckd").astype(int) != 0)
+
+    months = _MONTHS.tolist()
+    records = []
+    for i in range(n):
+        records.append({
+            "risk_factor": float(risk[i]),
+            "time_window_months": [float(tw_start[i]), float(tw_end[i])],
+            "risk_curve": [{"month": m, "cum_risk": float(c)} for m, c in zip(months, cum[i])],
+            "top_features": features[i],
+            "care_gaps": gaps[i],
+            "cohort_label": "DM+ERC" if dm_ckd[i] else "General",
+            "weibull_k": float(k[i]),
+            "weibull_lam": float(lam[i]),
+        })
+    return records, {"gap_mask": gap_mask, "tw_start": tw_start, "tw_end": tw_end,
+                     "weibull_k": k, "weibull_lam": lam}
+
+@traced("scoring.score_batch", "scoring")
+def score_batch(df, seed=123, dist=None, jitter=None):
     """
     -> Devuelve (out_df, records):
        - out_df incluye columnas agregadas: risk_factor, tw_start, tw_end,
-         care_gaps, cohort_label (igual que tu versión).
+         care_gaps (texto), gap_mask (bitmask de utils/care_gaps), cohort_label,
+         weibull_k / weibull_lam (parámetros de la curva; ver utils/weibull).
+         tw_start/tw_end son continuos (meses, cuantiles 25 %/75 % de la curva).
        - records: lista de dicts completos (incluye risk_curve, top_features).
+    Si se pasa `dist` (utils.sketches.RiskDistribution), se actualiza con
+    los risk_factor del batch (sketch + histograma combinables).
+    `jitter`: normales estándar por fila para la forma k (en vez de la
+    secuencia de `seed` en orden de filas; ver services/snapshots).
     """
-    rng = np.random.default_rng(seed)
-    records = []
-    for _, row in df.iterrows():
-        r = score_row(row, rng)
-        records.append(r)
+    count("scoring.rows", len(df))
+    records, cols = _score_frame(df, np.random.default_rng(seed), jitter)
 
-    out = df.copy()
+    out = df.copy(deep=False)  # columnas nuevas sólo en la copia; las de entrada se comparten
     out["risk_factor"] = [r["risk_factor"] for r in records]
-    out["tw_start"] = [r["time_window_months"][0] for r in records]
-    out["tw_end"]   = [r["time_window_months"][1] for r in records]
-    out["care_gaps"] = [", ".join(r["care_gaps"]) for r in records]
+    out["tw_start"] = cols["tw_start"]
+    out["tw_end"]   = cols["tw_end"]
+    out["weibull_k"] = cols["weibull_k"]
+    out["weibull_lam"] = cols["weibull_lam"]
+    out["gap_mask"] = cols["gap_mask"]
+    out["care_gaps"] = GAP_RULES.joined(cols["gap_mask"])
     out["cohort_label"] = [r["cohort_label"] for r in records]
+    if dist is not None:
+        dist.update(out["risk_factor"].to_numpy())
     return out, records
 
+@traced("scoring.score_one", "scoring")
 def score_one(payload: dict):
     """Mantiene tu firma: recibe un dict y retorna el dict de score_row."""
     return score_row(payload)
@@ -219,20 +336,33 @@ def score_one(payload: dict):
 # ==============================================
 # Extra opcional para páginas nuevas (no rompe)
 # ==============================================
-def score_population(df: pd.DataFrame, cfg: Optional[Dict] = None) -> pd.DataFrame:
+@traced("scoring.score_population", "scoring")
+def score_population(df: pd.DataFrame, cfg: Optional[Dict] = None, dist=None) -> pd.DataFrame:
     """
     Conveniencia para puntuar un DataFrame de manera vectorizada.
     Añade:
       - risk_factor
       - time_window_months (string "1–6 meses"/"6–12 meses")
     No interfiere con score_batch; puedes usarla en páginas nuevas.
+    Con `dist` (RiskDistribution) mantiene sketch/histograma por chunk.
     """
     if df is None or df.empty:
         return df
-
     if cfg:
         set_mock_config(cfg)
-    cfg_eff = get_mock_config()
+    return score_population_with(df, get_mock_config(), dist=dist)
+
+def score_population_with(df: pd.DataFrame, cfg: Optional[Dict] = None, dist=None) -> pd.DataFrame:
+    """
+    Como score_population, pero con la config explícita (`cfg` completada
+    con merge_config) y sin tocar la config global del mock: para
+    servidores y comparaciones donde cada llamada trae su propia config.
+    """
+    if df is None or df.empty:
+        return df
+
+    count("scoring.rows", len(df))
+    cfg_eff = merge_config(cfg)
 
     s = _linear_score_df(df, cfg_eff)
     risk = _sigmoid(s)
@@ -242,7 +372,9 @@ def score_population(df: pd.DataFrame, cfg: Optional[Dict] = None) -> pd.DataFra
     hi_cut = float(cfg_eff.get("hi_cut", 0.30))
     tw = np.where(risk >= hi_cut, "1–6 meses", "6–12 meses")
 
-    out = df.copy()
+    out = df.copy(deep=False)
     out["risk_factor"] = risk
     out["time_window_months"] = tw
+    if dist is not None:
+        dist.update(risk)
     return out
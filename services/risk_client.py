@@ -0,0 +1,286 @@
+# services/risk_client.py
+# ---------------------------------------------------------------------
+# Cliente del backend de riesgo con la MISMA firma que risk_api:
+#   score_batch(df, seed=123, dist=None) -> (out_df, records)
+#   score_population(df, cfg=None, dist=None) -> DataFrame
+#   score_one(payload) -> dict
+# - Transporte columnar Arrow IPC (no JSON por fila).
+# - Pool de conexiones HTTP/1.1 keep-alive (http.client, sin deps nuevas).
+# - Chunks enviados concurrentemente con asyncio, con tope de requests
+#   en vuelo (semaforo) y reintentos con backoff exponencial + jitter.
+# URL por defecto: variable de entorno CORPUS_RISK_API_URL.
+# ---------------------------------------------------------------------
+
+import asyncio
+import http.client
+import json
+import os
+import queue
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urlparse
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+from services.risk_server import ARROW_MIME, ipc_to_table, table_to_ipc
+from utils.profiling import count, traced
+
+ENV_URL = "CORPUS_RISK_API_URL"
+RETRY_STATUS = {429, 500, 502, 503, 504}
+
+
+class RiskAPIError(RuntimeError):
+    """Error no recuperable (o reintentos agotados) del backend de riesgo."""
+
+
+class _ConnectionPool:
+    """Pool acotado de conexiones keep-alive a un host."""
+
+    def __init__(self, base_url: str, size: int, timeout: float):
+        u = urlparse(base_url)
+        self.scheme, self.host, self.port = u.scheme, u.hostname, u.port
+        self.prefix = u.path.rstrip("/")
+        self.timeout = timeout
+        self._idle: "queue.LifoQueue[http.client.HTTPConnection]" = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(size)
+        self.created = 0
+
+    def _new(self) -> http.client.HTTPConnection:
+        cls = http.client.HTTPSConnection if self.scheme == "https" else http.client.HTTPConnection
+        self.created += 1
+        return cls(self.host, self.port, timeout=self.timeout)
+
+    def request(self, method: str, path: str, body: bytes, headers: Dict) -> Tuple[int, bytes]:
+        self._slots.acquire()
+        try:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                conn = self._new()
+            try:
+                conn.request(method, self.prefix + path, body=body, headers=headers)
+                resp = conn.getresponse()
+                data = resp.read()
+            except Exception:
+                conn.close()
+                raise
+            if resp.will_close:
+                conn.close()
+            else:
+                self._idle.put(conn)
+            return resp.status, data
+        finally:
+            self._slots.release()
+
+    def close(self) -> None:
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                return
+
+
+class RiskClient:
+    """Cliente pooled/async del servicio de scoring (Arrow IPC)."""
+
+    def __init__(
+        self,
+        base_url: Optional[str] = None,
+        *,
+        max_connections: int = 8,
+        max_in_flight: int = 4,
+        chunk_rows: int = 20_000,
+        timeout: float = 30.0,
+        retries: int = 3,
+        backoff: float = 0.2,
+    ):
+        base_url = base_url or os.environ.get(ENV_URL)
+        if not base_url:
+            raise RiskAPIError(f"Falta la URL del backend (parámetro o {ENV_URL}).")
+        self.base_url = base_url
+        self.max_in_flight = max(1, int(max_in_flight))
+        self.chunk_rows = max(1, int(chunk_rows))
+        self.retries = int(retries)
+        self.backoff = float(backoff)
+        self._pool = _ConnectionPool(base_url, max(max_connections, self.max_in_flight), timeout)
+        self._executor = ThreadPoolExecutor(max_workers=self.max_in_flight, thread_name_prefix="risk-client")
+        self.latencies: List[float] = []  # segundos por request (últimas 10k)
+
+    def close(self) -> None:
+        self._executor.shutdown(wait=False)
+        self._pool.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    # --- transporte con reintentos ---
+    def _post(self, path: str, body: bytes, headers: Dict) -> bytes:
+        last = None
+        for attempt in range(self.retries + 1):
+            t0 = time.perf_counter()
+            try:
+                status, data = self._pool.request("POST", path, body, headers)
+            except (OSError, http.client.HTTPException) as e:
+                status, data, last = None, b"", e
+            else:
+                self.latencies.append(time.perf_counter() - t0)
+                del self.latencies[:-10_000]
+                if status == 200:
+                    return data
+                last = RiskAPIError(f"HTTP {status} en {path}: {data[:200]!r}")
+                if status not in RETRY_STATUS:
+                    raise last
+            if attempt < self.retries:
+                count("risk_client.retries")
+                time.sleep(self.backoff * (2 ** attempt) * (0.5 + random.random()))
+        raise RiskAPIError(f"Reintentos agotados en {path}: {last!r}")
+
+    async def _apost(self, sem: asyncio.Semaphore, path: str, body: bytes, headers: Dict) -> bytes:
+        async with sem:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._executor, self._post, path, body, headers)
+
+    def _chunks(self, df: pd.DataFrame) -> List[pd.DataFrame]:
+        return [df.iloc[i:i + self.chunk_rows] for i in range(0, len(df), self.chunk_rows)] or [df]
+
+    async def _score_chunks(self, df: pd.DataFrame, path: str, headers: Dict, seed: Optional[int] = None) -> List[pa.Table]:
+        """
+        Envía los chunks de `df` en paralelo (máx. max_in_flight) y devuelve
+        las tablas de respuesta en el orden de los chunks.
+        Con `seed`, el chunk i usa seed + i: el resultado es determinista
+        para un mismo chunk_rows (no idéntico a una sola llamada local).
+        """
+        sem = asyncio.Semaphore(self.max_in_flight)
+        hdrs = {"Content-Type": ARROW_MIME, "Accept": ARROW_MIME, **headers}
+        tasks = []
+        for i, chunk in enumerate(self._chunks(df)):
+            url = path if seed is None else f"{path}?seed={int(seed) + i}"
+            body = table_to_ipc(pa.Table.from_pandas(chunk, preserve_index=False))
+            tasks.append(self._apost(sem, url, body, hdrs))
+        count("risk_client.chunks", len(tasks))
+        return [ipc_to_table(b) for b in await asyncio.gather(*tasks)]
+
+    def _run(self, coro):
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            return asyncio.run(coro)
+        # ya hay un loop en este hilo: ejecuta en un hilo aparte
+        with ThreadPoolExecutor(max_workers=1) as ex:
+            return ex.submit(asyncio.run, coro).result()
+
+    # --- API async ---
+    async def ascore_population(self, df: pd.DataFrame, cfg: Optional[Dict] = None) -> List[pa.Table]:
+        headers = {"X-Score-Config": json.dumps(cfg)} if cfg else {}
+        return await self._score_chunks(df, "/v1/score_population", headers)
+
+    async def ascore_batch(self, df: pd.DataFrame, seed: int = 123) -> List[pa.Table]:
+        return await self._score_chunks(df, "/v1/score_batch", {}, seed=seed)
+
+    async def ascore_one(self, payload: dict) -> Dict:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, self.score_one, payload)
+
+    # --- API síncrona (misma firma que risk_api) ---
+    @traced("scoring.remote.score_population", "scoring")
+    def score_population(self, df: pd.DataFrame, cfg: Optional[Dict] = None, dist=None) -> pd.DataFrame:
+        if df is None or df.empty:
+            return df
+        count("scoring.rows", len(df))
+        res = pa.concat_tables(self._run(self.ascore_population(df, cfg)))
+        out = df.copy(deep=False)
+        out["risk_factor"] = res.column("risk_factor").to_numpy()
+        out["time_window_months"] = res.column("time_window_months").to_pylist()
+        if dist is not None:
+            dist.update(out["risk_factor"].to_numpy())
+        return out
+
+    @traced("scoring.remote.score_batch", "scoring")
+    def score_batch(self, df, seed=123, dist=None):
+        count("scoring.rows", len(df))
+        res = pa.concat_tables(self._run(self.ascore_batch(df, seed)))
+        out = df.copy(deep=False)
+        for c in ["risk_factor", "tw_start", "tw_end", "care_gaps", "gap_mask", "cohort_label",
+                  "weibull_k", "weibull_lam"]:
+            out[c] = res.column(c).to_pandas().to_numpy()
+        records = _records_from_table(res)
+        if dist is not None:
+            dist.update(out["risk_factor"].to_numpy())
+        return out, records
+
+    @traced("scoring.remote.score_one", "scoring")
+    def score_one(self, payload: dict):
+        body = json.dumps(payload, default=_json_default).encode("utf-8")
+        data = self._post("/v1/score_one", body, {"Content-Type": "application/json"})
+        return json.loads(data)
+
+    def latency_summary(self) -> Dict[str, float]:
+        if not self.latencies:
+            return {}
+        lat = np.asarray(self.latencies) * 1e3
+        return {"requests": len(lat), "p50_ms": float(np.percentile(lat, 50)),
+                "p95_ms": float(np.percentile(lat, 95)), "p99_ms": float(np.percentile(lat, 99))}
+
+
+def _json_default(o):
+    if isinstance(o, np.generic):
+        return o.item()
+    raise TypeError(f"{type(o).__name__} no serializable")
+
+def _records_from_table(table: pa.Table) -> List[Dict]:
+    """Reconstruye los records de score_batch desde columnas Arrow."""
+    cols = table.select(["risk_factor", "tw_start", "tw_end", "risk_curve",
+                         "top_features", "care_gaps_list", "cohort_label",
+                         "weibull_k", "weibull_lam"]).to_pydict()
+    months = range(1, 13)
+    return [
+        {
+            "risk_factor": rf,
+            "time_window_months": [ts, te],
+            "risk_curve": [{"month": m, "cum_risk": c} for m, c in zip(months, curve)],
+            "top_features": feats,
+            "care_gaps": gaps,
+            "cohort_label": label,
+            "weibull_k": wk,
+            "weibull_lam": wl,
+        }
+        for rf, ts, te, curve, feats, gaps, label, wk, wl in zip(
+            cols["risk_factor"], cols["tw_start"], cols["tw_end"], cols["risk_curve"],
+            cols["top_features"], cols["care_gaps_list"], cols["cohort_label"],
+            cols["weibull_k"], cols["weibull_lam"],
+        )
+    ]
+
+
+# ---------------------------
+# Cliente por defecto (lazy)
+# ---------------------------
+_DEFAULT: Optional[RiskClient] = None
+_DEFAULT_LOCK = threading.Lock()
+
+def remote_enabled() -> bool:
+    return bool(os.environ.get(ENV_URL))
+
+def get_client() -> RiskClient:
+    global _DEFAULT
+    with _DEFAULT_LOCK:
+        if _DEFAULT is None:
+            _DEFAULT = RiskClient()
+        return _DEFAULT
+
+def score_batch(df, seed=123, dist=None):
+    return get_client().score_batch(df, seed=seed, dist=dist)
+
+def score_population(df: pd.DataFrame, cfg: Optional[Dict] = None, dist=None) -> pd.DataFrame:
+    return get_client().score_population(df, cfg=cfg, dist=dist)
+
+def score_one(payload: dict):
+    return get_client().score_one(payload)
@@ -0,0 +1,167 @@
+# services/risk_server.py
+# ---------------------------------------------------------------------
+# Servidor HTTP local que envuelve el mock de services/risk_api.py con
+# el mismo contrato que tendrá el backend real (Arrow IPC columnar):
+#   GET  /health
+#   POST /v1/score_batch?seed=123        body/resp: Arrow IPC stream
+#   POST /v1/score_population            body/resp: Arrow IPC stream
+#        (config opcional en header X-Score-Config, JSON; se aplica
+#        sólo a ese request, la config global del mock no cambia)
+#   POST /v1/score_one                   body/resp: JSON
+# Errores: cuerpo/header que no se decodifican (Arrow, JSON, seed,
+# config que no es objeto) -> 400; datos decodificados que el scoring
+# rechaza (KeyError / ValueError / TypeError) -> 422; cualquier otra
+# falla -> 500. El cliente sólo reintenta 429/5xx: un 4xx es
+# determinista y se propaga de inmediato.
+# HTTP/1.1 con keep-alive para probar pooling, concurrencia y latencia
+# offline:  python -m services.risk_server --port 8765
+# ---------------------------------------------------------------------
+
+import argparse
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional, Tuple
+from urllib.parse import parse_qs, urlparse
+
+import pyarrow as pa
+
+from services import risk_api
+
+ARROW_MIME = "application/vnd.apache.arrow.stream"
+
+# Esquema de las columnas anidadas de score_batch (records)
+_CURVE = pa.list_(pa.float64())
+_FEATS = pa.list_(pa.struct([("name", pa.string()), ("contrib", pa.float64())]))
+_GAPS = pa.list_(pa.string())
+
+
+def table_to_ipc(table: pa.Table) -> bytes:
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+def ipc_to_table(data: bytes) -> pa.Table:
+    return pa.ipc.open_stream(pa.py_buffer(data)).read_all()
+
+def batch_result_table(out_df, records) -> pa.Table:
+    """Columnas planas de score_batch + records anidados como listas Arrow."""
+    cols = ["risk_factor", "tw_start", "tw_end", "care_gaps", "gap_mask", "cohort_label",
+            "weibull_k", "weibull_lam"]
+    table = pa.Table.from_pandas(out_df[cols], preserve_index=False)
+    table = table.append_column("risk_curve", pa.array(
+        [[p["cum_risk"] for p in r["risk_curve"]] for r in records], type=_CURVE))
+    table = table.append_column("top_features", pa.array(
+        [r["top_features"] for r in records], type=_FEATS))
+    table = table.append_column("care_gaps_list", pa.array(
+        [r["care_gaps"] for r in records], type=_GAPS))
+    return table
+
+
+class _ClientError(Exception):
+    """Request inválido (4xx): no se reintenta."""
+
+    def __init__(self, code: int, error: Exception):
+        super().__init__(repr(error))
+        self.code = code
+
+def _decode(fn, *args):
+    """Decodifica el request; un error aquí es del cliente (400)."""
+    try:
+        return fn(*args)
+    except (pa.ArrowInvalid, ValueError, UnicodeDecodeError) as e:   # incluye JSONDecodeError
+        raise _ClientError(400, e) from e
+
+def _score(fn, *args, **kwargs):
+    """Puntúa; datos que el mock rechaza son del cliente (422), lo demás 500."""
+    try:
+        return fn(*args, **kwargs)
+    except (KeyError, ValueError, TypeError) as e:
+        raise _ClientError(422, e) from e
+
+def _score_config(raw: Optional[str]) -> Optional[dict]:
+    cfg = json.loads(raw or "null")
+    if cfg is not None and not isinstance(cfg, dict):
+        raise ValueError(f"X-Score-Config debe ser un objeto JSON (recibido {type(cfg).__name__})")
+    return cfg
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive
+
+    def log_message(self, fmt, *args):  # silencioso
+        pass
+
+    def _send(self, code: int, body: bytes, ctype: str) -> None:
+        self.send_response(code)
+        self.send_header("Content-Type", ctype)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _json(self, code: int, obj) -> None:
+        self._send(code, json.dumps(obj).encode("utf-8"), "application/json")
+
+    def do_GET(self):
+        if urlparse(self.path).path == "/health":
+            self._json(200, {"status": "ok"})
+        else:
+            self._json(404, {"error": "not found"})
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        try:
+            if url.path == "/v1/score_batch":
+                seed = _decode(int, parse_qs(url.query).get("seed", ["123"])[0])
+                df = _decode(lambda: ipc_to_table(body).to_pandas())
+                out, records = _score(risk_api.score_batch, df, seed=seed)
+                self._send(200, table_to_ipc(batch_result_table(out, records)), ARROW_MIME)
+            elif url.path == "/v1/score_population":
+                # config por request: nunca la global del proceso (la comparten warm-up y batcher)
+                cfg = _decode(_score_config, self.headers.get("X-Score-Config"))
+                df = _decode(lambda: ipc_to_table(body).to_pandas())
+                out = _score(risk_api.score_population_with, df, cfg)
+                table = pa.Table.from_pandas(out[["risk_factor", "time_window_months"]], preserve_index=False)
+                self._send(200, table_to_ipc(table), ARROW_MIME)
+            elif url.path == "/v1/score_one":
+                payload = _decode(json.loads, body or b"{}")
+                self._json(200, _score(risk_api.score_one, payload))
+            else:
+                self._json(404, {"error": "not found"})
+        except _ClientError as e:   # determinista: el cliente no reintenta 4xx
+            self._json(e.code, {"error": str(e)})
+        except Exception as e:  # el cliente reintenta 5xx
+            self._json(500, {"error": repr(e)})
+
+
+def make_server(host: str = "127.0.0.1", port: int = 8765) -> ThreadingHTTPServer:
+    server = ThreadingHTTPServer((host, port), _Handler)
+    server.daemon_threads = True
+    return server
+
+def start_background_server(host: str = "127.0.0.1", port: int = 0) -> Tuple[ThreadingHTTPServer, str]:
+    """Arranca el servidor en un hilo daemon; port=0 elige uno libre. -> (server, base_url)"""
+    server = make_server(host, port)
+    threading.Thread(target=server.serve_forever, name="risk-server", daemon=True).start()
+    h, p = server.server_address[:2]
+    return server, f"http://{h}:{p}"
+
+def main(argv: Optional[list] = None) -> None:
+    ap = argparse.ArgumentParser(description="Servidor local del mock de riesgo (Arrow IPC).")
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8765)
+    args = ap.parse_args(argv)
+    server = make_server(args.host, args.port)
+    print(f"risk_server escuchando en http://{args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
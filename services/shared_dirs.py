@@ -0,0 +1,124 @@
+# services/shared_dirs.py
+# ---------------------------------------------------------------------
+# Directorio compartido de poblaciones (ver services/shared_store):
+# raíz, verificación de permisos, versión vigente, leases y estado.
+# Sólo biblioteca estándar: Home muestra status() en cada repintado y
+# no debe arrastrar pandas / pyarrow (el store sí los necesita).
+# ---------------------------------------------------------------------
+
+import os
+import stat
+import tempfile
+from typing import Dict, List, Optional
+
+ROOT_ENV = "CORPUS_SHARED_DIR"
+
+
+def root() -> Optional[str]:
+    """Directorio compartido (None si está desactivado)."""
+    value = os.environ.get(ROOT_ENV)
+    if value is not None:
+        return None if value.strip().lower() in ("", "0", "off", "false") else value
+    base = "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir()
+    return os.path.join(base, "corpus-populations")
+
+def private_dir(path: str, create: bool = True) -> bool:
+    """
+    True si `path` es un directorio propio (mismo uid, no symlink) sin
+    permisos para grupo/otros; lo crea 0700 si falta. Uno ajeno o
+    plantado por otro usuario se rechaza.
+    """
+    if create:
+        try:
+            os.mkdir(path, 0o700)
+        except FileExistsError:
+            pass
+        except OSError:
+            return False
+    try:
+        st = os.lstat(path)
+    except OSError:
+        return False
+    if not stat.S_ISDIR(st.st_mode) or st.st_uid != os.getuid():
+        return False
+    if st.st_mode & 0o077:          # propio pero abierto (creado antes sin 0700): se cierra
+        try:
+            os.chmod(path, 0o700)
+        except OSError:
+            return False
+    return True
+
+def checked_root(base: Optional[str] = None, create: bool = True) -> Optional[str]:
+    """`base` (o root()) si es un directorio privado utilizable; si no, None."""
+    base = base or root()
+    return base if base is not None and private_dir(base, create) else None
+
+def current_version(key_dir: str) -> Optional[str]:
+    try:
+        with open(os.path.join(key_dir, "CURRENT")) as fh:
+            return fh.read().strip() or None
+    except OSError:
+        return None
+
+
+# ---------------------------
+# Leases
+# ---------------------------
+def release(lease: str) -> None:
+    try:
+        os.unlink(lease)
+    except OSError:
+        pass
+
+def _alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:    # existe pero es de otro usuario
+        return True
+    return True
+
+def live_leases(version_dir: str) -> List[int]:
+    """PIDs con lease vivo sobre la versión (borra los de procesos muertos)."""
+    pids = []
+    try:
+        names = os.listdir(os.path.join(version_dir, "leases"))
+    except OSError:
+        return pids
+    for name in names:
+        try:
+            pid = int(name.split("-", 1)[0])
+        except ValueError:
+            continue
+        if _alive(pid):
+            pids.append(pid)
+        else:
+            release(os.path.join(version_dir, "leases", name))
+    return pids
+
+
+# ---------------------------
+# Estado (Home / memoria)
+# ---------------------------
+def status(base: Optional[str] = None) -> List[Dict]:
+    """Una fila por versión publicada: vigente, MB en disco/shm y procesos adjuntos."""
+    base = checked_root(base, create=False)
+    rows: List[Dict] = []
+    if base is None:
+        return rows
+    for k in sorted(os.listdir(base)):
+        key_dir = os.path.join(base, k)
+        if not os.path.isdir(key_dir):
+            continue
+        current = current_version(key_dir)
+        for v in sorted(os.listdir(key_dir)):
+            vdir = os.path.join(key_dir, v)
+            if v.startswith(".") or not os.path.isdir(vdir):
+                continue
+            size = sum(os.path.getsize(os.path.join(vdir, f)) for f in os.listdir(vdir)
+                       if os.path.isfile(os.path.join(vdir, f)))
+            pids = live_leases(vdir)
+            rows.append({"dataset": k, "versión": v, "vigente": v == current,
+                         "MB": round(size / 1e6, 2), "procesos": len(set(pids)), "leases": len(pids)})
+    return rows
@@ -0,0 +1,258 @@
+# services/shared_store.py
+# ---------------------------------------------------------------------
+# Poblaciones puntuadas compartidas entre procesos del servidor.
+# Con varios procesos de Streamlit detrás de un balanceador, cada uno
+# generaba y retenía su propia copia de cada población. Aquí la primera
+# vez se publica en archivos Arrow IPC sin compresión (por defecto en
+# /dev/shm), y cada proceso los abre con memory_map: las columnas
+# numéricas de pandas apuntan directo al mapeo (cero copia, sólo
+# lectura) y el texto queda como string[pyarrow] sobre los mismos
+# buffers. La RAM no crece con los procesos y un proceso nuevo arranca
+# "caliente" sin regenerar nada.
+#
+# Estructura: <raíz>/<página>__<país>/
+#   CURRENT                 versión vigente (se reemplaza atómicamente)
+#   .lock                   flock: un solo proceso construye a la vez
+#   <versión>/df.arrow      población puntuada
+#   <versión>/attr.arrow    atribuciones al logit (mismo índice)
+#   <versión>/gap_counts.arrow  y cualquier otro DataFrame de la población
+#   <versión>/meta.json     agregados chicos (kpis, dist) vía to_dict()
+#   <versión>/leases/<pid>-<n>  un lease por adjunto vivo
+# Seguridad: la raíz se crea 0700 y sólo se usa si es un directorio (no
+# symlink) del mismo usuario sin permisos para grupo/otros; si no, cada
+# proceso trabaja con su copia privada. Nada se deserializa con pickle:
+# los agregados se reconstruyen con from_dict() de una lista cerrada.
+# La versión es la huella del preset de la página, la config del mock y
+# el código que genera/puntúa. Cada attach crea un lease que se borra
+# cuando el DataFrame deja de usarse (weakref.finalize, también al salir
+# del proceso). sweep() borra las versiones reemplazadas sin leases
+# vivos (los de procesos muertos no cuentan).
+# CORPUS_SHARED_DIR=off desactiva la publicación (copia por proceso).
+# Raíz, permisos, leases y status() viven en services/shared_dirs (sólo
+# biblioteca estándar, para que Home no cargue pandas / pyarrow).
+# ---------------------------------------------------------------------
+
+import hashlib
+import itertools
+import json
+import os
+import re
+import shutil
+import tempfile
+import unicodedata
+import weakref
+from contextlib import contextmanager
+from typing import Callable, Dict, Optional
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.ipc as ipc
+
+from services.shared_dirs import (ROOT_ENV, checked_root, current_version, live_leases, private_dir,  # noqa: F401
+                                  release, status)   # status: re-export (benchmarks/shared.py)
+from utils.kpis import KPIAccumulator
+from utils.profiling import count, span
+from utils.sketches import RiskDistribution
+
+try:  # POSIX; sin fcntl cada proceso puede construir (la publicación sigue siendo atómica)
+    import fcntl
+except ImportError:  # pragma: no cover
+    fcntl = None
+
+SCHEMA_VERSION = 2
+META = "meta.json"
+AGGREGATES = {"KPIAccumulator": KPIAccumulator, "RiskDistribution": RiskDistribution}   # type -> clase
+CODE_FILES = ("services/data_io.py", "services/risk_api.py", "services/populations.py", "utils/care_gaps.py")
+_STRINGS = {pa.string(): pd.StringDtype("pyarrow"), pa.large_string(): pd.StringDtype("pyarrow")}
+_NAME = re.compile(r"[a-z_][a-z0-9_]*")      # nombres de frame válidos como archivo
+_LEASE_SEQ = itertools.count()
+_CODE_HASH: Dict[str, str] = {}
+
+
+def dataset_key(page: str, country: str) -> str:
+    ascii_ = unicodedata.normalize("NFKD", country).encode("ascii", "ignore").decode().lower()
+    slug = re.sub(r"[^a-z0-9]+", "-", ascii_).strip("-")
+    return f"{page}__{slug}"
+
+def _code_hash() -> str:
+    if "v" not in _CODE_HASH:
+        h = hashlib.blake2b(digest_size=8)
+        here = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        for rel in CODE_FILES:
+            try:
+                with open(os.path.join(here, rel), "rb") as fh:
+                    h.update(fh.read())
+            except OSError:
+                h.update(rel.encode())
+        _CODE_HASH["v"] = h.hexdigest()
+    return _CODE_HASH["v"]
+
+def fingerprint(page: str) -> str:
+    """Versión del dataset: preset de la página + config del mock + código."""
+    from services.populations import PAGE_PRESETS
+    from services.risk_api import get_mock_config
+    payload = {"schema": SCHEMA_VERSION, "page": page, "preset": PAGE_PRESETS[page],
+               "cfg": get_mock_config(), "code": _code_hash()}
+    raw = json.dumps(payload, sort_keys=True, default=str).encode()
+    return hashlib.blake2b(raw, digest_size=8).hexdigest()
+
+
+# ---------------------------
+# Publicación
+# ---------------------------
+@contextmanager
+def _flock(path: str):
+    if fcntl is None:
+        yield
+        return
+    with open(path, "a+") as fh:
+        fcntl.flock(fh, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(fh, fcntl.LOCK_UN)
+
+def _write_frame(df: pd.DataFrame, path: str) -> None:
+    table = pa.Table.from_pandas(df, preserve_index=None)   # RangeIndex -> sólo metadata
+    # string[pyarrow] de pandas usa large_string: guardarlo así evita el cast (copia) al adjuntar
+    fields = [f.with_type(pa.large_string()) if pa.types.is_string(f.type) else f for f in table.schema]
+    table = table.cast(pa.schema(fields, metadata=table.schema.metadata))
+    with ipc.new_file(path, table.schema) as writer:
+        writer.write_table(table)
+
+def _json_default(x):
+    if hasattr(x, "item"):          # escalares numpy
+        return x.item()
+    if hasattr(x, "tolist"):
+        return x.tolist()
+    raise TypeError(f"No serializable: {type(x).__name__}")
+
+def publish(key: str, version: str, pop: Dict, base: Optional[str] = None) -> str:
+    """
+    Escribe la población (df, attr + agregados) en <raíz>/<key>/<version>
+    y la marca como vigente. Se arma en un directorio temporal y se
+    renombra: los lectores nunca ven una versión a medias.
+    """
+    base = checked_root(base)
+    if base is None:
+        raise PermissionError(f"Directorio compartido inseguro o no disponible ({ROOT_ENV})")
+    key_dir = os.path.join(base, key)
+    if not private_dir(key_dir):
+        raise PermissionError(f"Directorio compartido inseguro: {key_dir}")
+    final = os.path.join(key_dir, version)
+    with span("shared.publish", "data", rows=len(pop["df"])):
+        if not os.path.isdir(final):
+            tmp = tempfile.mkdtemp(prefix=".tmp-", dir=key_dir)     # 0700
+            try:
+                frames, aggregates = [], {}
+                for name, value in pop.items():
+                    if isinstance(value, pd.DataFrame):
+                        _write_frame(value, os.path.join(tmp, f"{name}.arrow"))
+                        frames.append(name)
+                    else:
+                        aggregates[name] = {"type": type(value).__name__, "state": value.to_dict()}
+                with open(os.path.join(tmp, META), "w") as fh:
+                    json.dump({"schema": SCHEMA_VERSION, "frames": frames, "aggregates": aggregates},
+                              fh, default=_json_default)
+                os.mkdir(os.path.join(tmp, "leases"), 0o700)
+                os.rename(tmp, final)
+            except OSError:
+                shutil.rmtree(tmp, ignore_errors=True)
+                if not os.path.isdir(final):   # otro proceso ganó el rename: vale igual
+                    raise
+        pointer = os.path.join(key_dir, f".CURRENT-{os.getpid()}")
+        with open(pointer, "w") as fh:
+            fh.write(version)
+        os.replace(pointer, os.path.join(key_dir, "CURRENT"))
+    count("shared.publish")
+    return final
+
+
+# ---------------------------
+# Attach (cero copia) y leases
+# ---------------------------
+def _read_frame(path: str) -> pd.DataFrame:
+    table = ipc.open_file(pa.memory_map(path, "r")).read_all()
+    return table.to_pandas(split_blocks=True, types_mapper=_STRINGS.get)
+
+def attach(key: str, version: str, base: Optional[str] = None) -> Optional[Dict]:
+    """
+    Población publicada como dict (df, attr, kpis, dist, gap_counts) con
+    los frames mapeados (sólo lectura); None si la versión no existe.
+    El lease vive mientras viva el DataFrame `df`.
+    """
+    base = checked_root(base, create=False)
+    if base is None:
+        return None
+    path = os.path.join(base, key, version)
+    if not os.path.isfile(os.path.join(path, META)):
+        return None
+    lease = os.path.join(path, "leases", f"{os.getpid()}-{next(_LEASE_SEQ)}")
+    try:
+        with open(lease, "x"):
+            pass
+        with span("shared.attach", "data"):
+            with open(os.path.join(path, META)) as fh:
+                meta = json.load(fh)
+            if meta.get("schema") != SCHEMA_VERSION:
+                raise ValueError(f"schema {meta.get('schema')!r}")
+            pop = {name: _read_frame(os.path.join(path, f"{_NAME.fullmatch(name)[0]}.arrow"))
+                   for name in meta["frames"]}
+            for name, agg in meta["aggregates"].items():
+                pop[name] = AGGREGATES[agg["type"]].from_dict(agg["state"])
+    except (OSError, pa.ArrowInvalid, ValueError, KeyError, TypeError):
+        release(lease)   # versión barrida en el medio, escritura incompleta o formato ajeno
+        return None
+    weakref.finalize(pop["df"], release, lease)
+    count("shared.attach")
+    return pop
+
+def sweep(key: Optional[str] = None, base: Optional[str] = None) -> int:
+    """Borra versiones reemplazadas (≠ CURRENT) sin leases vivos; -> cuántas."""
+    base = checked_root(base, create=False)
+    if base is None:
+        return 0
+    removed = 0
+    for k in [key] if key else os.listdir(base):
+        key_dir = os.path.join(base, k)
+        if not os.path.isdir(key_dir):
+            continue
+        current = current_version(key_dir)
+        for v in os.listdir(key_dir):
+            vdir = os.path.join(key_dir, v)
+            if v == current or v.startswith(".") or not os.path.isdir(vdir):
+                continue
+            if not live_leases(vdir):
+                shutil.rmtree(vdir, ignore_errors=True)
+                removed += 1
+    return removed
+
+def load_or_build(page: str, country: str, build: Callable[[], Dict]) -> Dict:
+    """
+    Población de (página, país) desde el directorio compartido; si no
+    está publicada, un solo proceso la construye (flock) y la publica, y
+    todos (incluido él) la adjuntan. Sin directorio compartido, o si la
+    publicación falla (espacio, permisos), devuelve la copia privada.
+    """
+    base = checked_root(None)
+    if base is None:                            # desactivado, o raíz ajena / insegura
+        return build()
+    key, version = dataset_key(page, country), fingerprint(page)
+    pop = attach(key, version, base)
+    if pop is not None:
+        return pop
+    key_dir = os.path.join(base, key)
+    if not private_dir(key_dir):
+        return build()
+    built = None
+    with _flock(os.path.join(key_dir, ".lock")):
+        pop = attach(key, version, base)       # publicada mientras esperábamos el lock
+        if pop is None:
+            built = build()
+            try:
+                publish(key, version, built, base)
+            except OSError:
+                return built
+            pop = attach(key, version, base)
+    sweep(key, base)
+    return pop if pop is not None else built
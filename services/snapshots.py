@@ -0,0 +1,235 @@
+# services/snapshots.py
+# ---------------------------------------------------------------------
+# Snapshots mensuales de la población puntuada + scoring incremental.
+# - Cada mes se guarda un parquet por país (data/snapshots/<país>/<YYYY-MM>.parquet)
+#   con las columnas crudas, las de scoring, un hash por fila del
+#   contenido de entrada (`row_hash`) y, en metadata, la huella de la
+#   config del mock y el estado del KPIAccumulator.
+# - refresh_snapshot() compara hashes contra el snapshot anterior y
+#   sólo re-puntúa altas y filas cambiadas; las demás heredan su score.
+#   Si cambió la config del mock, se re-puntúa todo.
+# - El jitter de la forma Weibull (weibull_k, tw_start, tw_end) sale de
+#   Philox por (seed, patient_id), no de la secuencia del rng en
+#   orden de filas: una fila re-puntuada da lo mismo sin importar qué
+#   otras cambiaron, y el refresh incremental coincide con re-puntuar todo.
+# - Los KPIs se actualizan restando/sumando sólo las filas que cambian
+#   (KPIAccumulator), y se emite un reporte delta (entradas/salidas de
+#   alto riesgo, altas/bajas, ΔKPIs).
+# Directorio configurable con CORPUS_SNAPSHOT_DIR.
+# ---------------------------------------------------------------------
+
+import hashlib
+import json
+import os
+import re
+import unicodedata
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from services.risk_api import get_mock_config, score_batch
+from utils.kpis import HIGH_RISK_CUT, KPIAccumulator
+from utils.philox import uniforms
+from utils.profiling import count, span, traced
+
+SNAPSHOT_DIR = os.environ.get(
+    "CORPUS_SNAPSHOT_DIR",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "snapshots"),
+)
+SCORE_COLUMNS = ["risk_factor", "tw_start", "tw_end", "gap_mask", "care_gaps", "cohort_label",
+                 "weibull_k", "weibull_lam"]
+KPI_COLUMNS = ["risk_factor", "cost_12m", "hta_control", "cost_event"]
+_META_KEY = b"corpus_snapshot"
+JITTER_STREAM = 1   # stream Philox del jitter (el 0 lo usa data_io.generate_patients)
+_MONTH = re.compile(r"^\d{4}-\d{2}$")
+
+
+def input_columns(df: pd.DataFrame) -> List[str]:
+    """Columnas crudas (las que alimentan el scoring)."""
+    return [c for c in df.columns if c not in SCORE_COLUMNS and c != "row_hash"]
+
+def row_hash(df: pd.DataFrame, cols: Optional[List[str]] = None) -> np.ndarray:
+    """Hash uint64 por fila del contenido (vectorizado, independiente del índice)."""
+    cols = cols or input_columns(df)
+    return pd.util.hash_pandas_object(df[sorted(cols)], index=False).to_numpy()
+
+def member_jitter(patient_id: pd.Series, seed: int) -> np.ndarray:
+    """Normal estándar por afiliado: función de (seed, patient_id), no de la posición."""
+    key = pd.util.hash_pandas_object(pd.Series(patient_id), index=False).to_numpy()
+    u1, u2 = uniforms(seed, key, 2, stream=JITTER_STREAM)
+    return np.sqrt(-2.0 * np.log(u1)) * np.cos(2.0 * np.pi * u2)
+
+def config_fingerprint(cfg: Optional[Dict] = None) -> str:
+    """Huella de la config del modelo + columnas de score (un cambio de esquema invalida la reutilización)."""
+    cfg = cfg or get_mock_config()
+    payload = {"cfg": cfg, "score_columns": SCORE_COLUMNS, "jitter": f"philox-{JITTER_STREAM}"}   # esquema del jitter
+    return hashlib.sha1(json.dumps(payload, sort_keys=True, default=str).encode()).hexdigest()[:16]
+
+
+# ---------------------------
+# Almacenamiento
+# ---------------------------
+class SnapshotStore:
+    """Parquets mensuales por país bajo `root`."""
+
+    def __init__(self, root: str = SNAPSHOT_DIR):
+        self.root = root
+
+    def _dir(self, country: str) -> str:
+        ascii_ = unicodedata.normalize("NFKD", country).encode("ascii", "ignore").decode()
+        slug = re.sub(r"[^A-Za-z0-9]+", "_", ascii_).strip("_").lower()
+        return os.path.join(self.root, slug)
+
+    def path(self, country: str, month: str) -> str:
+        return os.path.join(self._dir(country), f"{month}.parquet")
+
+    def months(self, country: str) -> List[str]:
+        d = self._dir(country)
+        if not os.path.isdir(d):
+            return []
+        return sorted(f[:-8] for f in os.listdir(d) if f.endswith(".parquet") and _MONTH.match(f[:-8]))
+
+    def previous(self, country: str, month: str) -> Optional[str]:
+        prev = [m for m in self.months(country) if m < month]
+        return prev[-1] if prev else None
+
+    def save(self, df: pd.DataFrame, country: str, month: str, meta: Dict) -> str:
+        if not _MONTH.match(month):
+            raise ValueError(f"Mes inválido (YYYY-MM): {month!r}")
+        path = self.path(country, month)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        table = table.replace_schema_metadata({**(table.schema.metadata or {}), _META_KEY: json.dumps(meta)})
+        tmp = path + ".tmp"
+        pq.write_table(table, tmp)
+        os.replace(tmp, path)
+        return path
+
+    def meta(self, country: str, month: str) -> Dict:
+        md = pq.read_schema(self.path(country, month)).metadata or {}
+        return json.loads(md.get(_META_KEY, b"{}"))
+
+    def load(self, country: str, month: str, columns: Optional[List[str]] = None) -> pd.DataFrame:
+        return pq.read_table(self.path(country, month), columns=columns).to_pandas()
+
+
+# ---------------------------
+# Refresh incremental
+# ---------------------------
+@traced("snapshot.refresh", "data")
+def refresh_snapshot(
+    raw: pd.DataFrame,
+    month: str,
+    country: str,
+    store: Optional[SnapshotStore] = None,
+    seed: int = 123,
+    save: bool = True,
+) -> Tuple[pd.DataFrame, Dict]:
+    """
+    Puntúa el snapshot `month` reutilizando el score del mes anterior
+    para las filas cuyo contenido no cambió.
+    -> (scored_df, report) con report = {summary, to_high, from_high, kpis}.
+    """
+    store = store or SnapshotStore()
+    raw = raw.reset_index(drop=True)
+    n = len(raw)
+    cols = input_columns(raw)
+    with span("snapshot.hash", "data"):
+        h = row_hash(raw, cols)
+    cfg_fp = config_fingerprint()
+
+    prev_month = store.previous(country, month)
+    prev_meta = store.meta(country, prev_month) if prev_month else {}
+    reuse = bool(prev_month) and prev_meta.get("cfg") == cfg_fp
+    prev = None
+    if prev_month:
+        have = set(pq.read_schema(store.path(country, prev_month)).names)
+        want = ["patient_id", "row_hash"] + SCORE_COLUMNS + [c for c in KPI_COLUMNS if c not in SCORE_COLUMNS]
+        prev = store.load(country, prev_month, [c for c in want if c in have])
+
+    # Posición de cada afiliado en el snapshot anterior (-1 = alta nueva)
+    if prev is not None:
+        pos = pd.Index(prev["patient_id"]).get_indexer(raw["patient_id"])
+        known = pos >= 0
+        same = known & (prev["row_hash"].to_numpy()[np.where(known, pos, 0)] == h) if reuse else np.zeros(n, bool)
+    else:
+        pos = np.full(n, -1)
+        known = np.zeros(n, bool)
+        same = np.zeros(n, bool)
+    changed = ~same
+    count("snapshot.rescored_rows", int(changed.sum()))
+
+    # Scoring sólo de filas nuevas/cambiadas
+    scored = raw.copy()
+    rescored = None
+    if changed.any():
+        part = raw.loc[changed]
+        rescored, _ = score_batch(part, seed=seed, jitter=member_jitter(part["patient_id"], seed))
+    for c in SCORE_COLUMNS:
+        if rescored is not None and not same.any():
+            scored[c] = rescored[c].to_numpy()
+            continue
+        src = prev[c].to_numpy()
+        arr = np.empty(n, dtype=src.dtype)
+        arr[same] = src[pos[same]]
+        if rescored is not None:
+            arr[changed] = rescored[c].to_numpy()
+        scored[c] = arr
+    scored["row_hash"] = h
+
+    # KPIs: estado anterior − filas que salen/cambian + filas nuevas/cambiadas
+    with span("snapshot.kpis", "kpis"):
+        if reuse and "kpis" in prev_meta:
+            prev_acc = KPIAccumulator.from_dict(prev_meta["kpis"])
+            gone = np.ones(len(prev), bool)
+            gone[pos[same]] = False
+            acc = (prev_acc - KPIAccumulator().update(prev.loc[gone])).merge(
+                KPIAccumulator().update(scored.loc[changed]))
+        else:
+            prev_acc = KPIAccumulator().update(prev) if prev is not None else KPIAccumulator()
+            acc = KPIAccumulator().update(scored)
+
+    report = _delta_report(scored, prev, pos, known, same, prev_acc, acc, month, prev_month)
+    if save:
+        store.save(scored, country, month, {"cfg": cfg_fp, "kpis": acc.to_dict(),
+                                            "month": month, "country": country})
+    return scored, report
+
+def _delta_report(scored, prev, pos, known, same, prev_acc, acc, month, prev_month) -> Dict:
+    risk_now = scored["risk_factor"].to_numpy()
+    risk_prev = np.full(len(scored), np.nan)
+    if prev is not None:
+        risk_prev[known] = prev["risk_factor"].to_numpy()[pos[known]]
+    hi_now = risk_now >= HIGH_RISK_CUT
+    hi_prev = risk_prev >= HIGH_RISK_CUT
+
+    def movers(sel):
+        return pd.DataFrame({
+            "patient_id": scored["patient_id"].to_numpy()[sel],
+            "risk_prev": risk_prev[sel], "risk_now": risk_now[sel],
+        }).sort_values("risk_now", ascending=False, ignore_index=True)
+
+    n_left = 0
+    if prev is not None:
+        n_left = len(prev) - int(known.sum())
+    summary = {
+        "month": month, "prev_month": prev_month,
+        "n_prev": 0 if prev is None else len(prev), "n_now": len(scored),
+        "entered": int((~known).sum()), "left": n_left,
+        "changed": int((known & ~same).sum()), "rescored": int((~same).sum()),
+        "to_high": int((known & ~hi_prev & hi_now).sum()),
+        "from_high": int((known & hi_prev & ~hi_now).sum()),
+        "entered_high": int((~known & hi_now).sum()),
+    }
+    v0, v1 = prev_acc.values(), acc.values()
+    kpis = pd.DataFrame({"kpi": list(v1), "prev": [v0[k] for k in v1], "now": list(v1.values())})
+    kpis["delta"] = kpis["now"] - kpis["prev"]
+    return {
+        "summary": summary,
+        "to_high": movers(known & ~hi_prev & hi_now),
+        "from_high": movers(known & hi_prev & ~hi_now),
+        "kpis": kpis,
+    }
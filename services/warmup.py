@@ -0,0 +1,130 @@
+# services/warmup.py
+# ---------------------------------------------------------------------
+# Warm-up en segundo plano de las poblaciones puntuadas.
+# - Un registro por proceso (clave = (página, país)) con futures de un
+#   ThreadPoolExecutor: las páginas se "enganchan" a la construcción en
+#   curso en vez de duplicarla, y luego reutilizan el resultado.
+# - start_warmup() es idempotente; las páginas lo llaman en su primer
+#   rerun, de modo que el primer script que corre tras el arranque del
+#   servidor dispara la construcción de todas las combinaciones
+#   (Streamlit no expone un hook de "server start").
+# Los módulos de datos (pandas/numpy) se importan dentro del hilo de
+# build, no al importar este módulo (Home sigue siendo liviano).
+# Entre procesos la población se comparte vía services.shared_store
+# (Arrow mapeado en memoria): el primero la construye, el resto la adjunta.
+# ---------------------------------------------------------------------
+
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Tuple
+
+from utils.memory import register_cache
+
+Key = Tuple[str, str]
+
+MAX_WORKERS = 2
+
+
+class BuildRegistry:
+    """Futures compartidos por clave; un build por clave a la vez."""
+
+    def __init__(self, max_workers: int = MAX_WORKERS):
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="warmup")
+        self._lock = threading.Lock()
+        self._futures: Dict[Key, Future] = {}
+        self._meta: Dict[Key, Dict] = {}
+
+    def submit(self, key: Key, fn: Callable, *args) -> Future:
+        """Devuelve el future existente (en curso o listo) o lanza uno nuevo."""
+        with self._lock:
+            fut = self._futures.get(key)
+            if fut is not None and not (fut.done() and fut.exception() is not None):
+                return fut
+            meta = {"submitted": time.time(), "started": None, "finished": None}
+
+            def run():
+                meta["started"] = time.time()
+                try:
+                    return fn(*args)
+                finally:
+                    meta["finished"] = time.time()
+
+            fut = self._pool.submit(run)
+            self._futures[key] = fut
+            self._meta[key] = meta
+            return fut
+
+    def get(self, key: Key, fn: Callable, *args, timeout: Optional[float] = None):
+        """Espera (o reutiliza) el resultado de `key`."""
+        return self.submit(key, fn, *args).result(timeout=timeout)
+
+    def status(self) -> List[Dict]:
+        rows = []
+        with self._lock:
+            items = list(self._futures.items())
+        for key, fut in items:
+            meta = self._meta.get(key, {})
+            if not fut.done():
+                state = "en curso" if meta.get("started") else "en cola"
+            else:
+                state = "error" if fut.exception() is not None else "listo"
+            start, end = meta.get("started"), meta.get("finished")
+            rows.append({
+                "página": key[0], "país": key[1], "estado": state,
+                "segundos": round((end or time.time()) - start, 2) if start else 0.0,
+            })
+        return rows
+
+    def progress(self) -> float:
+        rows = self.status()
+        return sum(r["estado"] == "listo" for r in rows) / len(rows) if rows else 0.0
+
+    def results(self) -> Dict[Key, object]:
+        """Resultados ya construidos (para contabilidad de memoria)."""
+        with self._lock:
+            items = list(self._futures.items())
+        return {k: f.result() for k, f in items if f.done() and f.exception() is None}
+
+    def discard(self, key: Key) -> None:
+        with self._lock:
+            self._futures.pop(key, None)
+            self._meta.pop(key, None)
+
+
+REGISTRY = BuildRegistry()
+register_cache("warmup.populations", REGISTRY.results)
+_started = threading.Event()
+
+# Copia liviana de services.populations.PAGE_PRESETS (sin importar pandas)
+WARMUP_PAGES = ["dashboard", "worklist", "simulador"]
+
+def _build(page: str, country: str) -> Dict:
+    from services.populations import build_scored_population
+    from services.shared_store import load_or_build
+    return load_or_build(page, country, lambda: build_scored_population(page, country))
+
+
+def start_warmup(countries: Optional[List[str]] = None, pages: Optional[List[str]] = None) -> None:
+    """Encola todas las combinaciones página × país (una sola vez por proceso)."""
+    if _started.is_set():
+        return
+    _started.set()
+    if countries is None:
+        from utils.auth import COUNTRIES
+        countries = COUNTRIES
+    for country in countries:
+        for page in pages or WARMUP_PAGES:
+            REGISTRY.submit((page, country), _build, page, country)
+
+def get_population(page: str, country: str) -> Dict:
+    """Población puntuada + agregados; se engancha al warm-up si está en curso."""
+    fut = REGISTRY.submit((page, country), _build, page, country)  # prioridad a la pedida
+    start_warmup()
+    return fut.result()
+
+def warmup_status() -> List[Dict]:
+    return REGISTRY.status()
+
+def warmup_progress() -> float:
+    return REGISTRY.progress()
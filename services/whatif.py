@@ -0,0 +1,209 @@
+# services/whatif.py
+# ---------------------------------------------------------------------
+# Comparación what-if de dos configs del mock sobre la misma población.
+# La matriz de diseño X (n × features del score lineal) y los códigos de
+# región se arman UNA vez por frame (cacheada); los logits de ambas
+# configs salen de un solo producto X @ W (W = pesos, p × 2) más
+# intercepto, uplift por región y escala, y el riesgo de una sigmoide
+# vectorizada: el mismo resultado que score_population con cada config.
+# Reporte:
+#   - matriz de migración banda de riesgo A × banda B (conteos),
+#   - afiliados que cruzan hi_cut (entran / salen de alto riesgo),
+#   - KPIs de riesgo A vs. B (riesgo medio, % alto, decil superior,
+#     eventos esperados Σ riesgo, siniestros esperados Σ riesgo × costo),
+#   - top movers por |Δ riesgo| con la variable que más empujó el logit.
+# ---------------------------------------------------------------------
+
+import threading
+import weakref
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+from services.calibration import metrics
+from services.risk_api import FEATURE_LABELS, FEATURES, merge_config
+from utils.chart_data import RISK_BAND_BINS, RISK_BAND_LABELS
+from utils.memory import register_cache
+from utils.profiling import count, span, traced
+
+TOP_MOVERS = 20
+NA_BAND = "Sin dato"
+MOVER_COLUMNS = ["patient_id", "region", "age", "sex"]
+
+
+def _sigmoid(x):
+    return 1.0 / (1.0 + np.exp(-x))
+
+
+class DesignMatrix:
+    """X (n × FEATURES, float64) + códigos de región: compartida por todas las configs."""
+
+    __slots__ = ("X", "codes", "regions", "__weakref__")
+
+    def __init__(self, df: pd.DataFrame):
+        with span("whatif.design", "scoring", rows=len(df)):
+            self.X = np.empty((len(df), len(FEATURES)), order="F")   # columnas contiguas
+            for j, f in enumerate(FEATURES):        # faltantes -> 0 (como _linear_score_df)
+                self.X[:, j] = np.asarray(df[f], dtype=float) if f in df.columns else 0.0
+            if "region" in df.columns:
+                codes, uniq = pd.factorize(df["region"])
+                self.codes, self.regions = codes.astype(np.int64), [str(r) for r in uniq]
+            else:
+                self.codes, self.regions = np.full(len(df), -1, dtype=np.int64), []
+
+    def __len__(self) -> int:
+        return self.X.shape[0]
+
+    def logits(self, cfgs: Sequence[Dict]) -> np.ndarray:
+        """Logit (m, n) de m configs completas en una pasada (Wᵀ Xᵀ; fila por config)."""
+        W = np.array([[float(c["weights"].get(f, 0.0)) for f in FEATURES] for c in cfgs])
+        b = np.array([float(c["weights"].get("intercept", 0.0)) for c in cfgs])
+        scale = np.array([float(c.get("scale", 1.0)) for c in cfgs])
+        U = np.array([[float((c.get("region_uplift") or {}).get(r, 0.0)) for r in self.regions] + [0.0]
+                      for c in cfgs])                                  # código -1 -> última columna (0)
+        with span("whatif.matmul", "scoring", rows=len(self), configs=len(cfgs)):
+            s = W @ self.X.T                                           # X en orden F: Xᵀ contigua
+            s += b[:, None]
+            if self.regions and U.any():
+                s += U[:, self.codes]
+            s *= scale[:, None]
+        return s
+
+    def risk(self, cfgs: Sequence[Dict]) -> np.ndarray:
+        """Riesgo (m, n): clip(sigmoide(logit)) con el clip de cada config."""
+        r = _sigmoid(self.logits(cfgs))
+        lo = np.array([c.get("clip", (0.0, 0.92))[0] for c in cfgs])
+        hi = np.array([c.get("clip", (0.0, 0.92))[1] for c in cfgs])
+        return np.clip(r, lo[:, None], hi[:, None], out=r)
+
+    def contributions(self, rows: np.ndarray, cfg: Dict) -> np.ndarray:
+        """Aporte al logit por variable (len(rows) × FEATURES + [intercepto, región])."""
+        w = np.array([float(cfg["weights"].get(f, 0.0)) for f in FEATURES])
+        up = np.array([float((cfg.get("region_uplift") or {}).get(r, 0.0)) for r in self.regions] + [0.0])
+        c = float(cfg.get("scale", 1.0))
+        cols = [self.X[rows] * w, np.full((len(rows), 1), float(cfg["weights"].get("intercept", 0.0))),
+                up[self.codes[rows]][:, None]]
+        return c * np.hstack(cols)
+
+
+def bands(risk: np.ndarray) -> np.ndarray:
+    """Código de banda (RISK_BAND_BINS, cerradas a derecha como pd.cut); NaN -> len(bandas)."""
+    code = np.searchsorted(np.asarray(RISK_BAND_BINS[1:-1], dtype=float), risk, side="left")
+    return np.where(np.isnan(risk), len(RISK_BAND_LABELS), code)
+
+
+# ---------------------------
+# Matriz de diseño por población (cache del proceso)
+# ---------------------------
+_DESIGNS: Dict[int, tuple] = {}    # id(df) -> (weakref(df), DesignMatrix)
+_LOCK = threading.Lock()
+register_cache("whatif.designs", lambda: [d for _, d in list(_DESIGNS.values())])
+
+def design_for(df: pd.DataFrame) -> DesignMatrix:
+    """DesignMatrix del frame (se arma una vez por frame vivo)."""
+    with _LOCK:
+        hit = _DESIGNS.get(id(df))
+        if hit is not None and hit[0]() is df:
+            return hit[1]
+        for k in [k for k, (ref, _) in _DESIGNS.items() if ref() is None]:
+            del _DESIGNS[k]
+    d = DesignMatrix(df)
+    with _LOCK:
+        _DESIGNS[id(df)] = (weakref.ref(df), d)
+    return d
+
+def clear_whatif_cache() -> None:
+    with _LOCK:
+        _DESIGNS.clear()
+
+
+# ---------------------------
+# Comparación
+# ---------------------------
+def _kpis(risk: np.ndarray, hi_cut: float, severity: Optional[np.ndarray]) -> Dict[str, float]:
+    m = metrics(risk, hi_cut)
+    out = {"mean_risk": m["mean_risk"], "high_share": m["high_share"],
+           "n_high": float(np.sum(risk >= hi_cut)), "top_decile_share": m["top_decile_share"],
+           "expected_events": float(np.nansum(risk))}
+    if severity is not None:
+        out["expected_claims"] = float(np.nansum(risk * severity))
+    return out
+
+def _movers(df: pd.DataFrame, design: DesignMatrix, cfg_a: Dict, cfg_b: Dict,
+            ra: np.ndarray, rb: np.ndarray, top: int) -> pd.DataFrame:
+    delta = rb - ra
+    mag = np.nan_to_num(np.abs(delta), nan=-1.0)
+    k = min(int(top), len(mag))
+    if k <= 0:
+        return pd.DataFrame()
+    rows = np.argpartition(-mag, k - 1)[:k]
+    rows = rows[np.lexsort((rows, -mag[rows]))]             # |Δ| desc, posición asc (estable)
+    d = design.contributions(rows, cfg_b) - design.contributions(rows, cfg_a)
+    names = [FEATURE_LABELS.get(f, f) for f in FEATURES] + ["Intercepto / escala", FEATURE_LABELS["region"]]
+    out = df.iloc[rows][[c for c in MOVER_COLUMNS if c in df.columns]].reset_index(drop=True)
+    out.insert(0, "row", rows)
+    labels = RISK_BAND_LABELS + [NA_BAND]
+    out["risk_a"], out["risk_b"], out["delta"] = ra[rows], rb[rows], delta[rows]
+    out["band_a"] = [labels[i] for i in bands(ra[rows])]
+    out["band_b"] = [labels[i] for i in bands(rb[rows])]
+    out["driver"] = [names[i] for i in np.argmax(np.abs(d), axis=1)]
+    out["driver_delta_logit"] = d[np.arange(k), np.argmax(np.abs(d), axis=1)]
+    return out
+
+@traced("whatif.compare", "scoring")
+def compare_configs(df: pd.DataFrame, cfg_a: Optional[Dict], cfg_b: Optional[Dict],
+                    top: int = TOP_MOVERS) -> Dict:
+    """
+    Puntúa `df` con dos configs (se completan con DEFAULT_CONFIG) en una
+    pasada sobre la matriz de diseño compartida.
+    -> dict con:
+       - n, configs (a, b completas)
+       - migration: DataFrame banda A (filas) × banda B (columnas), conteos
+       - entered / exited: posiciones que cruzan hi_cut hacia arriba / abajo
+       - kpis: DataFrame métrica × (a, b, delta)
+       - movers: top `top` por |Δ riesgo| (+ variable que más movió el logit)
+       - risk_a / risk_b: riesgo por fila (mismo orden que df)
+    """
+    a, b = merge_config(cfg_a), merge_config(cfg_b)
+    design = design_for(df)
+    risk = design.risk([a, b])
+    ra, rb = risk
+    count("whatif.rows", len(df))
+
+    with span("whatif.report", "scoring"):
+        labels = list(RISK_BAND_LABELS)
+        ba, bb = bands(ra), bands(rb)
+        nb = len(labels) + 1
+        mig = np.bincount(ba * nb + bb, minlength=nb * nb).reshape(nb, nb)
+        if not mig[-1].any() and not mig[:, -1].any():       # sin NaN: se omite "Sin dato"
+            mig = mig[:-1, :-1]
+        else:
+            labels.append(NA_BAND)
+        migration = pd.DataFrame(mig, index=pd.Index(labels, name="A"), columns=pd.Index(labels, name="B"))
+
+        cut_a, cut_b = float(a.get("hi_cut", 0.30)), float(b.get("hi_cut", 0.30))
+        high_a, high_b = ra >= cut_a, rb >= cut_b
+        entered = np.flatnonzero(~high_a & high_b)
+        exited = np.flatnonzero(high_a & ~high_b)
+
+        sev = np.asarray(df["cost_event"], dtype=float) if "cost_event" in df.columns else None
+        ka, kb = _kpis(ra, cut_a, sev), _kpis(rb, cut_b, sev)
+        kpis = pd.DataFrame({"a": ka, "b": kb})
+        kpis["delta"] = kpis["b"] - kpis["a"]
+        kpis.index.name = "kpi"
+
+        movers = _movers(df, design, a, b, ra, rb, top)
+    return {"n": len(df), "configs": (a, b), "migration": migration, "entered": entered, "exited": exited,
+            "kpis": kpis, "movers": movers, "risk_a": ra, "risk_b": rb}
+
+def crossers(df: pd.DataFrame, result: Dict, columns: Optional[List[str]] = None) -> pd.DataFrame:
+    """Afiliados que cruzan hi_cut (dirección, riesgo A → B), ordenados por |Δ|."""
+    rows = np.concatenate([result["entered"], result["exited"]])
+    direction = np.array(["entra"] * len(result["entered"]) + ["sale"] * len(result["exited"]))
+    cols = [c for c in (columns or MOVER_COLUMNS) if c in df.columns]
+    out = df.iloc[rows][cols].reset_index(drop=True)
+    out["direction"] = direction
+    out["risk_a"], out["risk_b"] = result["risk_a"][rows], result["risk_b"][rows]
+    out["delta"] = out["risk_b"] - out["risk_a"]
+    return out.sort_values("delta", key=np.abs, ascending=False, kind="stable").reset_index(drop=True)
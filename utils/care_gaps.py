@@ -0,0 +1,122 @@
+# utils/care_gaps.py
+# ---------------------------------------------------------------------
+# Motor declarativo de brechas de cuidado.
+# Cada regla es un dict {code, label, all: [(columna, op, valor), ...]}
+# (todas las condiciones deben cumplirse). Se compila una vez y se
+# evalúa sobre columnas completas: una pasada vectorizada por regla.
+# Resultado: bitmask (bit i = regla i) en la columna `gap_mask`; filtrar
+# o agregar por brecha son operaciones de bits, sin strings.
+#
+# Operadores: > >= < <= == != (numéricos) y has / lacks (código en la
+# columna de medicamentos/diagnósticos, p.ej. ("meds_atc", "lacks", "C09")).
+# Columna faltante: la condición es falsa (lacks -> verdadera).
+# ---------------------------------------------------------------------
+
+import operator
+from typing import Callable, Dict, List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+GAP_DTYPE = np.uint32  # hasta 32 reglas
+
+CARE_GAP_RULES: List[Dict] = [
+    {"code": "lab_stale", "label": "Laboratorio desactualizado",
+     "all": [("lab_recency_m", ">", 12)]},
+    {"code": "no_acei_ara", "label": "Sin IECA/ARA-II",
+     "all": [("hta", "!=", 0), ("meds_atc", "lacks", "C09")]},
+    {"code": "hba1c_off", "label": "HbA1c fuera de meta",
+     "all": [("dm", "!=", 0), ("hba1c", ">", 8.0)]},
+]
+
+_CMP = {">": operator.gt, ">=": operator.ge, "<": operator.lt, "<=": operator.le,
+        "==": operator.eq, "!=": operator.ne}
+
+
+def _condition(col: str, op: str, value) -> Callable[[pd.DataFrame], np.ndarray]:
+    if op in _CMP:
+        fn = _CMP[op]
+        def cond(df):
+            if col not in df.columns:
+                return np.zeros(len(df), dtype=bool)
+            return fn(df[col].to_numpy(dtype=float), float(value))
+    elif op in ("has", "lacks"):
+        code = str(value)
+        def cond(df):
+            if col not in df.columns:
+                return np.full(len(df), op == "lacks")
+            hit = df[col].fillna("").astype(str).str.contains(code, regex=False).to_numpy()
+            return hit if op == "has" else ~hit
+    else:
+        raise ValueError(f"Operador no soportado: {op!r}")
+    return cond
+
+class GapRuleSet:
+    """Reglas compiladas: evaluate(df) -> bitmask (una pasada por regla)."""
+
+    def __init__(self, rules: Sequence[Dict] = CARE_GAP_RULES):
+        if len(rules) > np.iinfo(GAP_DTYPE).bits:
+            raise ValueError("Demasiadas reglas para el bitmask.")
+        self.rules = list(rules)
+        self.codes = [r["code"] for r in self.rules]
+        self.labels = [r["label"] for r in self.rules]
+        self._compiled = [[_condition(*c) for c in r["all"]] for r in self.rules]
+        self._labels_arr = np.array(self.labels, dtype=object)
+
+    def bit(self, code: str) -> int:
+        return 1 << self.codes.index(code)
+
+    def mask_for(self, codes: Sequence[str]) -> int:
+        m = 0
+        for c in codes:
+            m |= self.bit(c)
+        return m
+
+    def evaluate(self, df: pd.DataFrame) -> np.ndarray:
+        out = np.zeros(len(df), dtype=GAP_DTYPE)
+        for i, conds in enumerate(self._compiled):
+            hit = np.ones(len(df), dtype=bool)
+            for cond in conds:
+                hit &= cond(df)
+            out[hit] |= GAP_DTYPE(1 << i)
+        return out
+
+    def bits_matrix(self, gap_mask) -> np.ndarray:
+        """(n × reglas) booleana a partir del bitmask."""
+        m = np.asarray(gap_mask, dtype=GAP_DTYPE)
+        return ((m[:, None] >> np.arange(len(self.rules), dtype=GAP_DTYPE)) & 1).astype(bool)
+
+    def counts(self, gap_mask) -> pd.DataFrame:
+        """Pacientes por brecha -> [code, gap, n]."""
+        n = self.bits_matrix(gap_mask).sum(axis=0)
+        return pd.DataFrame({"code": self.codes, "gap": self.labels, "n": n.astype(int)})
+
+    def labels_for(self, gap_mask) -> List[List[str]]:
+        """Listas de etiquetas por fila (para records / display)."""
+        bits = self.bits_matrix(gap_mask)
+        return [self._labels_arr[row].tolist() for row in bits]
+
+    def joined(self, gap_mask, sep: str = ", ") -> np.ndarray:
+        """Texto legible por fila; una entrada por combinación distinta de bits."""
+        m = np.asarray(gap_mask, dtype=GAP_DTYPE)
+        uniq, inv = np.unique(m, return_inverse=True)
+        text = np.array([sep.join(x) for x in self.labels_for(uniq)], dtype=object)
+        return text[inv]
+
+
+DEFAULT_RULES = GapRuleSet()
+
+def evaluate_gaps(df: pd.DataFrame, rules: Optional[GapRuleSet] = None) -> np.ndarray:
+    return (rules or DEFAULT_RULES).evaluate(df)
+
+def gap_counts(gap_mask, rules: Optional[GapRuleSet] = None) -> pd.DataFrame:
+    return (rules or DEFAULT_RULES).counts(gap_mask)
+
+def has_gaps(gap_mask, codes: Optional[Sequence[str]] = None, rules: Optional[GapRuleSet] = None,
+             require_all: bool = False) -> np.ndarray:
+    """Filtro por brecha: alguna (o todas) de `codes`; sin codes = cualquier brecha."""
+    m = np.asarray(gap_mask, dtype=GAP_DTYPE)
+    if not codes:
+        return m != 0
+    sel = GAP_DTYPE((rules or DEFAULT_RULES).mask_for(codes))
+    return (m & sel) == sel if require_all else (m & sel) != 0
@@ -0,0 +1,332 @@
+# utils/chart_data.py
+# -----------------------------------------------------------------
+# Preparación de datos para los gráficos (sin Streamlit ni Altair).
+# components/charts.py y el Dashboard dibujan a partir de estas
+# funciones; así también se pueden medir/benchmarkear por separado.
+# -----------------------------------------------------------------
+
+import numpy as np
+import pandas as pd
+from typing import Dict, List, Optional
+
+from utils.kernels import group_sums
+
+RISK_BAND_LABELS = ["Bajo (<0.15)", "Medio (0.15–0.30)", "Alto (≥0.30)"]
+RISK_BAND_BINS = [0, 0.15, 0.3, 1.0]
+AGE_BAND_LABELS = ["18–39", "40–55", "56–70", "71–90"]
+AGE_BAND_BINS = [18, 40, 55, 70, 90]
+
+# Formas alternadas para variedad visual (temprano/tardío/mixto)
+SHAPE_CYCLE = [0.8, 1.3, 1.0, 0.7, 1.5]  # k<1 early hazard; k>1 late hazard; k~1 ~ lineal
+MONTHS = np.arange(1, 13, dtype=int)
+
+
+# ---------------------------
+# 1) Histograma de riesgo
+# ---------------------------
+def risk_hist_data(df: pd.DataFrame, weight: Optional[str] = None) -> pd.DataFrame:
+    """Valores válidos de risk_factor (+ la columna de pesos, si la hay)."""
+    return df[["risk_factor"] + ([weight] if weight else [])].dropna(subset=["risk_factor"])
+
+
+# ---------------------------
+# 2) “Heat” por región
+# ---------------------------
+def region_heat_data(df: pd.DataFrame, weight: Optional[str] = None) -> pd.DataFrame:
+    """Riesgo promedio y N por región, ordenado de mayor a menor (con `weight`: ponderados, N estimado)."""
+    out = grouped(df, ["region"], value="risk_factor", weight=weight)
+    if weight:
+        out["size"] = out["size"].round(0)
+    out = out.rename(columns={"size": "n", "mean": "risk_mean"})[["region", "risk_mean", "n"]]
+    return out.sort_values("risk_mean", ascending=False)
+
+
+# -----------------------------------------------
+# 3) Curvas acumuladas por (hasta) 10 “deciles”
+# -----------------------------------------------
+def weibull_cum(c12: float, k: float, months_vec: np.ndarray = MONTHS) -> np.ndarray:
+    """
+    Construye riesgo acumulado mensual con Weibull.
+    c12 = P(evento a 12m). Calculamos lambda para que F(12)=c12 con forma k.
+    """
+    c12 = float(np.clip(c12, 1e-6, 0.999))
+    lam = (-np.log(1.0 - c12)) ** (1.0 / k) / 12.0  # lambda
+    t = months_vec.astype(float)
+    return 1.0 - np.exp(-(lam * t) ** k)
+
+def _segment(risk: pd.Series, cuts=None):
+    """Asigna decil (categórico) a cada riesgo; None si no se puede segmentar."""
+    if cuts is not None:
+        edges = np.unique(np.asarray(cuts, dtype=float))
+        q = len(edges) - 1
+        if q < 2:
+            return None
+        return pd.cut(
+            risk.clip(edges[0], edges[-1]), edges,
+            labels=[f"D{i}" for i in range(1, q + 1)],
+            include_lowest=True,
+        )
+
+    nunique = risk.nunique(dropna=True)
+    q = int(max(2, min(10, nunique, len(risk))))  # 2..10 grupos
+    try:
+        return pd.qcut(risk, q, labels=[f"D{i}" for i in range(1, q + 1)], duplicates="drop")
+    except Exception:
+        try:
+            return pd.cut(risk, q, labels=[f"D{i}" for i in range(1, q + 1)], include_lowest=True)
+        except Exception:
+            return None
+
+def survival_deciles_data(df: pd.DataFrame, cuts=None, rng=None) -> Dict:
+    """
+    Curvas Weibull por decil de riesgo.
+    -> dict con:
+       - data: DataFrame (decile, month, cum_risk)
+       - order: orden de leyenda (None si curva única)
+       - n_in / n_valid: registros de entrada / con riesgo válido
+    `rng` controla el jitter de c12 (por defecto np.random global).
+    """
+    rng = rng or np.random
+    risk = pd.to_numeric(df["risk_factor"], errors="coerce")
+    n_in = len(risk)
+    risk = risk.dropna()
+    out = {"data": pd.DataFrame(columns=["decile", "month", "cum_risk"]),
+           "order": None, "n_in": n_in, "n_valid": len(risk)}
+    if risk.empty:
+        return out
+
+    deciles = _segment(risk, cuts)
+    records = []
+    if deciles is None or deciles.isna().all():
+        # Curva única usando la media de riesgo como objetivo a 12m
+        c12 = float(np.clip(risk.mean(), 0.03, 0.85))
+        cum = weibull_cum(c12, 1.0)  # forma neutra
+        for m, c in zip(MONTHS, cum):
+            records.append({"decile": "Cohorte", "month": int(m), "cum_risk": float(np.clip(c, 0, 0.95))})
+        out["data"] = pd.DataFrame(records)
+        return out
+
+    if isinstance(deciles.dtype, pd.CategoricalDtype):
+        order = deciles.cat.categories.astype(str).tolist()
+    else:
+        order = sorted(deciles.dropna().astype(str).unique().tolist())
+    shape_by_rank = {i + 1: SHAPE_CYCLE[i % len(SHAPE_CYCLE)] for i in range(len(order))}
+
+    # Curvas por grupo: forzamos contraste usando el rango del decil
+    means = risk.groupby(deciles, observed=True).mean()
+    for idx, (d, mean_rf) in enumerate(means.items(), start=1):
+        # Target de riesgo 12m por decil: de ~5% a ~65%, con jitter.
+        r = (idx - 1) / max(1, (len(order) - 1))  # 0..1
+        base_c12 = 0.05 + 0.60 * r
+        jitter = rng.uniform(-0.02, 0.02)
+        c12 = float(np.clip(base_c12 + jitter, 0.02, 0.90))
+
+        # Forma (k): alterna según rank; si el grupo ya tiene riesgo medio
+        # alto, empuja un poco a k<1 (temprano)
+        k = float(shape_by_rank[idx])
+        mean_rf = float(np.clip(mean_rf, 0.01, 0.95))
+        k = float(np.clip(k - 0.25 * (mean_rf - 0.5), 0.6, 1.7))
+
+        cum = weibull_cum(c12, k)
+        for m, c in zip(MONTHS, cum):
+            records.append({"decile": str(d), "month": int(m), "cum_risk": float(np.clip(c, 0, 0.95))})
+
+    out["data"] = pd.DataFrame(records)
+    out["order"] = order
+    return out
+
+
+# ---------------------------------------------------
+# 4) Barras de “feature contributions”
+# ---------------------------------------------------
+def top_features_data(contribs, top_n: int = 10) -> pd.DataFrame:
+    """
+    Normaliza contribuciones a (feature, contribution, abs, sign) y toma top_n por |valor|.
+    Acepta dict, Series (índice = feature), lista de {name, contrib} o el
+    DataFrame de risk_api.attribution_summary.
+    """
+    if isinstance(contribs, pd.Series):
+        contribs = contribs.to_dict()
+    if isinstance(contribs, dict):
+        df = pd.DataFrame({"feature": list(contribs.keys()), "contribution": list(contribs.values())})
+    else:
+        df = pd.DataFrame(contribs).copy()
+        if df.empty:
+            return pd.DataFrame(columns=["feature", "contribution"])
+        # Intento de inferir nombres
+        cols = {c.lower(): c for c in df.columns}
+        fcol = cols.get("feature") or cols.get("name") or list(df.columns)[0]
+        vcol = cols.get("contribution") or cols.get("value") or list(df.columns)[1]
+        df = df.rename(columns={fcol: "feature", vcol: "contribution"})[["feature", "contribution"]]
+
+    if df.empty:
+        return df
+    df["abs"] = df["contribution"].abs()
+    df = df.sort_values("abs", ascending=False).head(top_n)
+    df["sign"] = np.where(df["contribution"] >= 0, "Aumenta riesgo", "Disminuye riesgo")
+    return df
+
+
+# --------------------------------------------
+# 5) Escenarios (formato largo scenario/metric/value)
+# --------------------------------------------
+def scenario_long(data, x=None, y=None, color=None) -> Optional[pd.DataFrame]:
+    """Normaliza datos de escenarios a formato largo; None si no se reconoce."""
+    if isinstance(data, dict):
+        df = pd.DataFrame([{"scenario": k, "value": v} for k, v in data.items()])
+    elif isinstance(data, list):
+        df = pd.DataFrame(data)
+    else:
+        df = pd.DataFrame(data).copy()
+
+    if df.empty:
+        return df
+
+    cols_low = [c.lower() for c in df.columns]
+    colmap = {c.lower(): c for c in df.columns}
+
+    if {"scenario", "metric", "value"}.issubset(set(cols_low)):
+        scenario_col = colmap["scenario"]
+        metric_col = colmap["metric"]
+        value_col = colmap["value"]
+        long_df = df[[scenario_col, metric_col, value_col]].rename(columns={
+            scenario_col: "scenario", metric_col: "metric", value_col: "value"
+        })
+    else:
+        if "scenario" in cols_low:
+            scenario_col = colmap["scenario"]
+            metric_cols = [c for c in df.columns if c != scenario_col]
+            if len(metric_cols) == 0:
+                long_df = df.rename(columns={df.columns[0]: "scenario", df.columns[1]: "value"})
+                long_df["metric"] = "valor"
+                long_df = long_df[["scenario", "metric", "value"]]
+            else:
+                long_df = df.melt(id_vars=[scenario_col], var_name="metric", value_name="value")
+                long_df = long_df.rename(columns={scenario_col: "scenario"})
+        else:
+            if set(["name", "value"]).issubset(set(cols_low)):
+                long_df = df.rename(columns={colmap["name"]: "scenario", colmap["value"]: "value"})
+                long_df["metric"] = "valor"
+                long_df = long_df[["scenario", "metric", "value"]]
+            elif df.shape[1] >= 2:
+                long_df = df.iloc[:, :2].copy()
+                long_df.columns = ["scenario", "value"]
+                long_df["metric"] = "valor"
+                long_df = long_df[["scenario", "metric", "value"]]
+            else:
+                return None
+
+    if x: long_df = long_df.rename(columns={x: "scenario"})
+    if y: long_df = long_df.rename(columns={y: "value"})
+    if color: long_df = long_df.rename(columns={color: "metric"})
+    return long_df
+
+
+# --------------------------------------------
+# Exploraciones del Dashboard (bandas y agregados)
+# --------------------------------------------
+def dashboard_bands(src) -> Dict[str, object]:
+    """
+    risk_band, age_band y has_gap como columnas nuevas (sin mutar `src`).
+    `src` puede ser un DataFrame o una utils.cohort_view.CohortView.
+    has_gap sale del bitmask `gap_mask` (utils/care_gaps) si existe.
+    """
+    out = {
+        "risk_band": pd.cut(src["risk_factor"], bins=RISK_BAND_BINS, labels=RISK_BAND_LABELS,
+                            include_lowest=True).array,
+        "age_band": pd.cut(src["age"], bins=AGE_BAND_BINS, labels=AGE_BAND_LABELS,
+                           include_lowest=True).array,
+    }
+    if "gap_mask" in src:
+        out["has_gap"] = np.asarray(src["gap_mask"]) != 0
+    else:
+        out["has_gap"] = src["care_gaps"].fillna("").str.len().gt(0).to_numpy()
+    return out
+
+def add_dashboard_bands(df: pd.DataFrame) -> pd.DataFrame:
+    """Agrega risk_band, age_band y has_gap (in place) y devuelve el df."""
+    for k, v in dashboard_bands(df).items():
+        df[k] = v
+    return df
+
+def grouped(df: pd.DataFrame, keys: List[str], value: Optional[str] = None,
+            weight: Optional[str] = None, dropna: bool = True) -> pd.DataFrame:
+    """
+    groupby(keys, as_index=False, observed=False) -> size (Σ pesos) y, con
+    `value`, mean (media ponderada sin NaN), en una pasada de
+    utils.kernels.group_sums. Claves categóricas conservan su dtype; el
+    resto queda como valores planos. Como pandas: con alguna clave
+    categórica salen todas las combinaciones; si ninguna lo es, sólo las
+    observadas.
+    """
+    cats, codes, n_groups = [], np.zeros(len(df), dtype=np.int64), 1
+    for k in keys:
+        col = df[k]
+        c = col.array if isinstance(col.dtype, pd.CategoricalDtype) else pd.Categorical(col)
+        kc = np.asarray(c.codes, dtype=np.int64)
+        m = len(c.categories)
+        has_na = (not dropna) and bool((kc < 0).any())
+        if (kc < 0).any():
+            kc = np.where(kc < 0, m if has_na else -1, kc)
+            codes = np.where((codes < 0) | (kc < 0), -1, codes * (m + has_na) + kc)
+        else:
+            codes = np.where(codes < 0, -1, codes * (m + has_na) + kc) if (codes < 0).any() \
+                else codes * (m + has_na) + kc
+        n_groups *= m + has_na
+        cats.append((k, c, m + has_na, isinstance(col.dtype, pd.CategoricalDtype)))
+
+    agg = group_sums(codes, n_groups,
+                     None if value is None else df[value].to_numpy(dtype=float),
+                     None if weight is None else df[weight].to_numpy(dtype=float))
+    out, rep = {}, n_groups
+    for k, c, m, is_cat in cats:
+        if n_groups:
+            rep //= m
+            pos = np.arange(n_groups) // rep % m
+            cat_codes = np.where(pos < len(c.categories), pos, -1)
+        else:
+            cat_codes = np.zeros(0, dtype=np.int64)
+        if is_cat:
+            out[k] = pd.Categorical.from_codes(cat_codes, dtype=c.dtype)
+        elif (cat_codes < 0).any():  # grupo NaN (dropna=False)
+            out[k] = pd.Series(c.categories.to_numpy(dtype=object)).reindex(cat_codes).to_numpy()
+        else:
+            out[k] = c.categories.to_numpy()[cat_codes].astype(df[k].dtype)
+    out = pd.DataFrame(out)
+    out["size"] = agg["size"] if weight is not None else agg["size"].astype(np.int64)
+    if value is not None:
+        with np.errstate(invalid="ignore", divide="ignore"):
+            out["mean"] = agg["vsum"] / agg["vn"]
+    if len(keys) > 1 and not any(is_cat for *_, is_cat in cats):   # producto -> sólo observadas
+        seen = np.bincount(codes[codes >= 0], minlength=n_groups) > 0
+        out = out[seen].reset_index(drop=True)
+    return out
+
+def band_counts(df: pd.DataFrame, weight: Optional[str] = None) -> pd.DataFrame:
+    """Pacientes por banda; con `weight` (muestra) suma pesos = conteo estimado."""
+    out = grouped(df, ["risk_band"], weight=weight, dropna=False)
+    return out.round({"size": 0}) if weight else out
+
+def band_means(df: pd.DataFrame, weight: Optional[str] = None) -> pd.DataFrame:
+    out = grouped(df, ["risk_band"], value="risk_factor", weight=weight, dropna=False)
+    return out.rename(columns={"mean": "risk_mean"})[["risk_band", "risk_mean"]]
+
+def gap_by_band(df: pd.DataFrame, weight: Optional[str] = None) -> pd.DataFrame:
+    agg = grouped(df, ["risk_band", "has_gap"], weight=weight)
+    if weight:
+        agg = agg.round({"size": 0})
+    agg["has_gap_label"] = agg["has_gap"].map({True: "Con brecha", False: "Sin brecha"})
+    return agg
+
+def gap_counts_by_band(df: pd.DataFrame, rules=None, weight: Optional[str] = None) -> pd.DataFrame:
+    """Pacientes por brecha × banda de riesgo, desde el bitmask -> [risk_band, gap, n]."""
+    from utils.care_gaps import DEFAULT_RULES
+    rules = rules or DEFAULT_RULES
+    bits = rules.bits_matrix(df["gap_mask"].to_numpy())
+    if weight is not None:
+        bits = bits * df[weight].to_numpy()[:, None]
+    bits = pd.DataFrame(bits, columns=rules.labels, index=df.index)
+    agg = bits.groupby(df["risk_band"], observed=False).sum()
+    if weight is not None:
+        agg = agg.round(0)
+    return agg.rename_axis("risk_band").reset_index().melt(id_vars="risk_band", var_name="gap", value_name="n")
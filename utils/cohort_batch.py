@@ -0,0 +1,204 @@
+# utils/cohort_batch.py
+# ---------------------------------------------------------------------
+# Evaluación de muchas cohortes en una pasada (reportes actuariales).
+# - Cada spec de cohorte usa los mismos filtros que utils.cohorts.
+#   cohort_mask (edad, sexo, región, dx, banda de riesgo, brechas).
+# - La población se agrupa UNA vez en celdas: combinaciones observadas
+#   de los valores que los filtros miran (edad, sexo, región, bits de dx,
+#   clase de riesgo, gap_mask). Por celda se acumulan las sumas del
+#   KPIAccumulator (utils.kernels.group_sums).
+# - Matriz de pertenencia cohorte × celda (compartida por cohortes que
+#   se solapan, por bloques) = AND de tablas por dimensión; los KPIs de
+#   todas las cohortes salen de un producto matriz × sumas por celda.
+# Así un reporte de 500 cohortes cuesta ~ un par de pasadas completas.
+# ---------------------------------------------------------------------
+
+import itertools
+from typing import Dict, Iterable, List, Mapping, Sequence
+
+import numpy as np
+import pandas as pd
+
+from utils.care_gaps import has_gaps
+from utils.cohorts import cohort_description
+from utils.kernels import group_sums
+from utils.kpis import HIGH_RISK_CUT, KPIAccumulator
+from utils.profiling import span, traced
+
+SPEC_KEYS = ("age_range", "sex", "region", "dx", "risk_band", "gaps")
+BLOCK = 64  # cohortes por bloque de la matriz de pertenencia
+
+# Clase de riesgo por fila: los bordes de cohort_mask se solapan en 0.3
+# (Medio = between(0.15, 0.3), Alto = >= 0.3), así que 0.3 es su propia clase.
+_RISK_CLASSES = {"Bajo (<0.15)": (0,), "Medio (0.15-0.3)": (1, 2), "Alto (≥0.3)": (2, 3)}
+_N_RISK_CLASSES = 5  # 0 bajo, 1 medio, 2 == 0.3, 3 alto, 4 NaN
+
+_SUMS = ("n", "n_high", "cost_12m_sum", "hta_control_n", "risk_sum", "risk_n",
+         "cost_event_sum", "cost_event_n")
+
+
+def cohort_grid(name_prefix: str = "", **dims: Sequence) -> List[Dict]:
+    """
+    Producto cartesiano de filtros -> lista de specs con `name`, p.ej.
+    cohort_grid(region=[["Valle"], ["Bogotá"]], age_range=[(18, 44), (45, 90)],
+                dx=[[], ["E11"]])
+    """
+    bad = set(dims) - set(SPEC_KEYS)
+    if bad:
+        raise ValueError(f"Filtros desconocidos: {sorted(bad)}")
+    keys = list(dims)
+    specs = []
+    for combo in itertools.product(*(dims[k] for k in keys)):
+        spec = dict(zip(keys, combo))
+        label = " · ".join(_label(k, v) for k, v in spec.items())
+        spec["name"] = f"{name_prefix}{label}" if label else (name_prefix or "Población")
+        specs.append(spec)
+    return specs
+
+def _label(key: str, value) -> str:
+    if key == "age_range":
+        return f"{value[0]}-{value[1]}"
+    if value is None or isinstance(value, (list, tuple)):
+        return "+".join(map(str, value)) if value else f"{key}:todos"
+    return str(value)
+
+def _normalize(spec: Mapping, i: int) -> Dict:
+    """Spec con los defaults de cohort_mask (None/[] = sin filtro)."""
+    bad = set(spec) - set(SPEC_KEYS) - {"name"}
+    if bad:
+        raise ValueError(f"Cohorte {i}: filtros desconocidos {sorted(bad)}")
+    out = {"age_range": (18, 90), "sex": None, "region": None, "dx": None, "risk_band": "Todos", "gaps": None}
+    out.update({k: v for k, v in spec.items() if k in SPEC_KEYS})
+    if out["risk_band"] != "Todos" and out["risk_band"] not in _RISK_CLASSES:
+        raise ValueError(f"Cohorte {i}: banda de riesgo desconocida {out['risk_band']!r}")
+    out["name"] = spec.get("name", f"cohorte_{i}")
+    return out
+
+
+# ---------------------------
+# Dimensiones (códigos por fila + tabla de pertenencia por spec)
+# ---------------------------
+def _factorize(values) -> tuple:
+    codes, uniques = pd.factorize(pd.Series(values), use_na_sentinel=False)
+    return codes.astype(np.int64), pd.Series(uniques)
+
+def _dimensions(df: pd.DataFrame, specs: List[Dict]) -> List[tuple]:
+    """[(códigos por fila, n valores, filtro, fn spec -> tabla bool por valor)] de los filtros usados."""
+    codes, uniq = _factorize(df["age"].to_numpy())    # cohort_mask siempre filtra por edad
+    dims = [(codes, len(uniq), "age_range", lambda s, u=uniq: u.between(*s["age_range"]).to_numpy())]
+    for col in ("sex", "region"):
+        if any(s[col] is not None for s in specs):
+            codes, uniq = _factorize(df[col].to_numpy())
+            dims.append((codes, len(uniq), col, lambda s, u=uniq, c=col:
+                         np.ones(len(u), bool) if s[c] is None else u.isin(list(s[c])).to_numpy()))
+    dx_codes = sorted({d for s in specs for d in (s["dx"] or [])})
+    if dx_codes:
+        if len(dx_codes) > 62:
+            raise ValueError("Más de 62 códigos dx distintos en un mismo lote.")
+        dx_col = df["dx_cie10"].astype(str)
+        bits = np.zeros(len(df), dtype=np.int64)
+        for j, d in enumerate(dx_codes):
+            bits |= dx_col.str.contains(d, regex=False).to_numpy().astype(np.int64) << j
+        codes, uniq = _factorize(bits)
+        bit_of = {d: 1 << j for j, d in enumerate(dx_codes)}
+        dims.append((codes, len(uniq), "dx", lambda s, u=uniq.to_numpy(np.int64):
+                     np.ones(len(u), bool) if not s["dx"] else
+                     (u & sum(bit_of[d] for d in set(s["dx"]))) != 0))
+    if any(s["risk_band"] != "Todos" for s in specs):
+        risk = df["risk_factor"].to_numpy(dtype=float)
+        cls = np.select([risk < 0.15, risk < 0.3, risk == 0.3, risk > 0.3], [0, 1, 2, 3], default=4)
+        dims.append((cls.astype(np.int64), _N_RISK_CLASSES, "risk_band", lambda s:
+                     np.ones(_N_RISK_CLASSES, bool) if s["risk_band"] == "Todos" else
+                     np.isin(np.arange(_N_RISK_CLASSES), _RISK_CLASSES[s["risk_band"]])))
+    if any(s["gaps"] for s in specs):
+        codes, uniq = _factorize(df["gap_mask"].to_numpy())
+        dims.append((codes, len(uniq), "gaps", lambda s, u=uniq.to_numpy():
+                     np.ones(len(u), bool) if not s["gaps"] else has_gaps(u, s["gaps"])))
+    return dims
+
+def _cells(dims: List[tuple], n: int) -> tuple:
+    """Código de celda por fila (compacto 0..C-1) y, por dimensión, el valor de cada celda."""
+    key = np.zeros(n, dtype=np.int64)
+    radix = 1
+    for codes, size, _, _ in dims:
+        key = key * size + codes
+        radix *= size
+    if radix <= 4 * max(n, 1):
+        present = np.bincount(key, minlength=radix) > 0
+        uniq = np.flatnonzero(present)
+        cell = (np.cumsum(present) - 1)[key]
+    else:
+        uniq, cell = np.unique(key, return_inverse=True)
+    values, rest = [], uniq
+    for _, size, _, _ in reversed(dims):
+        values.append(rest % size)
+        rest = rest // size
+    return cell.astype(np.int64), values[::-1]
+
+
+# ---------------------------
+# Evaluación
+# ---------------------------
+def _cell_sums(df: pd.DataFrame, cell: np.ndarray, n_cells: int) -> np.ndarray:
+    """Sumas del KPIAccumulator por celda -> matriz (n_cells, len(_SUMS))."""
+    out = np.zeros((n_cells, len(_SUMS)))
+    out[:, 0] = group_sums(cell, n_cells)["size"]
+    if "risk_factor" in df:
+        risk = df["risk_factor"].to_numpy(dtype=float)
+        g = group_sums(cell, n_cells, risk)
+        out[:, 4], out[:, 5] = g["vsum"], g["vn"]
+        out[:, 1] = group_sums(cell, n_cells, (risk >= HIGH_RISK_CUT).astype(float))["vsum"]
+    if "cost_12m" in df:
+        out[:, 2] = group_sums(cell, n_cells, df["cost_12m"].to_numpy(dtype=float))["vsum"]
+    if "hta_control" in df:
+        out[:, 3] = group_sums(cell, n_cells, (df["hta_control"].to_numpy(dtype=float) == 1).astype(float))["vsum"]
+    if "cost_event" in df:
+        g = group_sums(cell, n_cells, df["cost_event"].to_numpy(dtype=float))
+        out[:, 6], out[:, 7] = g["vsum"], g["vn"]
+    return out
+
+@traced("cohort.batch", "cohort")
+def evaluate_cohorts(df: pd.DataFrame, specs: Iterable[Mapping]) -> pd.DataFrame:
+    """
+    KPIs de muchas cohortes en una pasada agrupada. `specs`: dicts con
+    los argumentos de cohort_mask (+ `name`). -> DataFrame tidy, una fila
+    por cohorte: cohort, description, n, los KPIs de KPIAccumulator.values
+    (high_risk, pmpm, loss_ratio, controlled_htn, event_rate_12m =
+    riesgo medio, severity) y expected_events_12m (Σ risk_factor).
+    Mismos valores que cohort_mask + compute_core_kpis cohorte por cohorte.
+    """
+    specs = [_normalize(s, i) for i, s in enumerate(specs)]
+    with span("cohort.batch.cells", "cohort", cohorts=len(specs)):
+        dims = _dimensions(df, specs)
+        cell, cell_values = _cells(dims, len(df))
+        n_cells = int(cell.max()) + 1 if len(cell) else 0
+        sums = _cell_sums(df, cell, n_cells)
+    has_hta = "hta_control" in df
+
+    with span("cohort.batch.members", "cohort", cells=n_cells):
+        totals = np.zeros((len(specs), len(_SUMS)))
+        tables = [{} for _ in dims]   # tabla por valor de filtro (compartida entre cohortes)
+        for b in range(0, len(specs), BLOCK):
+            block = specs[b:b + BLOCK]
+            member = np.ones((len(block), n_cells), dtype=bool)
+            for (_, _, field, table), values, memo in zip(dims, cell_values, tables):
+                rows = []
+                for s in block:
+                    k = repr(s[field])
+                    if k not in memo:
+                        memo[k] = table(s)
+                    rows.append(memo[k])
+                member &= np.stack(rows)[:, values]
+            totals[b:b + len(block)] = member.astype(np.float64) @ sums
+
+    rows = []
+    for s, t in zip(specs, totals):
+        state = dict(zip(_SUMS, t))
+        for k in ("n", "n_high", "hta_control_n", "risk_n", "cost_event_n"):
+            state[k] = int(round(state[k]))
+        acc = KPIAccumulator.from_dict({**state, "has_hta_control": has_hta and state["n"] > 0})
+        rows.append({"cohort": s["name"],
+                     "description": cohort_description(s["age_range"], s["sex"], s["region"], s["dx"],
+                                                       s["risk_band"], s["gaps"]),
+                     **acc.values(), "expected_events_12m": float(t[4])})
+    return pd.DataFrame(rows)
@@ -0,0 +1,152 @@
+# utils/cohort_view.py
+# ---------------------------------------------------------------------
+# Vista de cohorte sin copias: frame base compartido + posiciones de
+# fila. Las columnas se leen bajo demanda (gather de UNA columna) y las
+# columnas derivadas (bandas, flags) viven sólo en la vista, con largo
+# = filas de la cohorte; el frame base (compartido por el warm-up entre
+# sesiones) nunca se muta ni se duplica completo.
+# frame(cols) materializa sólo las columnas que un gráfico/tabla usa.
+# signature() = huella de la cohorte para caches (specs de gráficos).
+# ---------------------------------------------------------------------
+
+import hashlib
+import itertools
+import threading
+import weakref
+from typing import Dict, Iterable, List, Optional, Sequence, Union
+
+import numpy as np
+import pandas as pd
+
+_BASE_TOKENS: Dict[int, tuple] = {}   # id(base) -> (weakref, token)
+_TOKEN_SEQ = itertools.count(1)
+_TOKEN_LOCK = threading.Lock()
+
+
+def _base_token(base: pd.DataFrame) -> int:
+    """Token único por frame base vivo (id() solo puede reutilizarse tras el GC)."""
+    with _TOKEN_LOCK:
+        hit = _BASE_TOKENS.get(id(base))
+        if hit is not None and hit[0]() is base:
+            return hit[1]
+        for k in [k for k, (ref, _) in _BASE_TOKENS.items() if ref() is None]:
+            del _BASE_TOKENS[k]
+        token = next(_TOKEN_SEQ)
+        _BASE_TOKENS[id(base)] = (weakref.ref(base), token)
+        return token
+
+
+class CohortView:
+    """Cohorte = `base` (read-only) + `rows` (posiciones) + columnas derivadas."""
+
+    __slots__ = ("base", "rows", "derived", "_cache")
+
+    def __init__(self, base: pd.DataFrame, rows=None, derived: Optional[Dict[str, np.ndarray]] = None):
+        self.base = base
+        if rows is None:
+            rows = np.arange(len(base))
+        else:
+            rows = np.asarray(rows)
+            if rows.dtype == bool:
+                rows = np.flatnonzero(rows)
+        self.rows = rows.astype(np.int64, copy=False)
+        self.derived: Dict[str, np.ndarray] = dict(derived or {})
+        self._cache: Dict[str, np.ndarray] = {}
+
+    # --- forma ---
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    @property
+    def empty(self) -> bool:
+        return len(self.rows) == 0
+
+    @property
+    def columns(self) -> List[str]:
+        return list(self.base.columns) + [c for c in self.derived if c not in self.base.columns]
+
+    @property
+    def index(self) -> pd.Index:
+        return self.base.index[self.rows]
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.derived or name in self.base.columns
+
+    # --- lectura ---
+    def col(self, name: str) -> np.ndarray:
+        """Valores de la columna para las filas de la vista (cacheados)."""
+        if name in self.derived:
+            return self.derived[name]
+        arr = self._cache.get(name)
+        if arr is None:
+            src = self.base[name]
+            if isinstance(src.dtype, pd.CategoricalDtype):
+                arr = src.array.take(self.rows)
+            else:
+                arr = src.to_numpy()[self.rows]
+            self._cache[name] = arr
+        return arr
+
+    def __getitem__(self, name: str) -> pd.Series:
+        return pd.Series(self.col(name), index=self.index, name=name)
+
+    def frame(self, columns: Optional[Sequence[str]] = None) -> pd.DataFrame:
+        """DataFrame sólo con `columns` (todas si None) para las filas de la vista."""
+        cols = list(columns) if columns is not None else self.columns
+        return pd.DataFrame({c: self.col(c) for c in cols}, index=self.index)
+
+    # --- derivación ---
+    def filter(self, mask) -> "CohortView":
+        """Sub-vista (mask booleana alineada a la vista o posiciones relativas)."""
+        sel = np.asarray(mask)
+        pos = np.flatnonzero(sel) if sel.dtype == bool else sel
+        derived = {k: v[pos] for k, v in self.derived.items()}
+        return CohortView(self.base, self.rows[pos], derived)
+
+    def assign(self, **cols) -> "CohortView":
+        """Nueva vista con columnas derivadas (largo = len(vista)); no toca el base."""
+        derived = dict(self.derived)
+        for k, v in cols.items():
+            if isinstance(v, pd.Series):  # categóricas -> Categorical (indexable por posición)
+                v = v.array if isinstance(v.dtype, pd.CategoricalDtype) else v.to_numpy()
+            if len(v) != len(self):
+                raise ValueError(f"Columna derivada {k!r} con largo {len(v)} != {len(self)}")
+            derived[k] = v
+        out = CohortView(self.base, self.rows, derived)
+        out._cache = self._cache
+        return out
+
+    def top(self, n: int, by: Union[str, Sequence[str]], ascending: Union[bool, Sequence[bool]] = False,
+            columns: Optional[Iterable[str]] = None) -> pd.DataFrame:
+        """Top-n ordenado (orden estable) materializando sólo n filas."""
+        by = [by] if isinstance(by, str) else list(by)
+        asc = [ascending] * len(by) if isinstance(ascending, bool) else list(ascending)
+        keys = []
+        for c, a in zip(reversed(by), reversed(asc)):
+            v = np.asarray(self.col(c), dtype=float)
+            keys.append(v if a else -v)
+        order = np.lexsort(keys)[:n] if keys else np.arange(min(n, len(self)))
+        return self.filter(order).frame(columns)
+
+    # --- identidad ---
+    def signature(self) -> str:
+        """Huella (base, filas, columnas derivadas): misma cohorte => misma huella."""
+        h = hashlib.blake2b(digest_size=16)
+        h.update(_base_token(self.base).to_bytes(8, "little"))
+        h.update(self.rows.tobytes())
+        for k in sorted(self.derived):
+            v = self.derived[k]
+            h.update(k.encode())
+            if isinstance(v, np.ndarray) and v.dtype.kind in "biuf":
+                h.update(np.ascontiguousarray(v).tobytes())
+            else:
+                h.update(pd.util.hash_pandas_object(pd.Series(v), index=False).to_numpy().tobytes())
+        return h.hexdigest()
+
+    # --- memoria ---
+    def nbytes(self) -> int:
+        """Bytes propios de la vista (posiciones + derivadas + columnas leídas); el base no cuenta."""
+        total = self.rows.nbytes
+        for v in list(self.derived.values()) + list(self._cache.values()):
+            total += int(getattr(v, "nbytes", 0))
+        return total
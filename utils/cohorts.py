@@ -0,0 +1,54 @@
+# utils/cohorts.py
+import pandas as pd
+from typing import Iterable, Optional, Sequence, Tuple
+
+from utils.care_gaps import DEFAULT_RULES as GAP_RULES, has_gaps
+from utils.profiling import traced
+
+DX_OPTIONS = ["I10", "E11", "N18", "I21", "E78"]
+RISK_BAND_OPTIONS = ["Todos", "Bajo (<0.15)", "Medio (0.15-0.3)", "Alto (≥0.3)"]
+GAP_OPTIONS = dict(zip(GAP_RULES.labels, GAP_RULES.codes))  # etiqueta -> código
+
+@traced("cohort.mask", "cohort")
+def cohort_mask(
+    df: pd.DataFrame,
+    age_range: Tuple[int, int] = (18, 90),
+    sex: Optional[Sequence[str]] = None,
+    region: Optional[Iterable[str]] = None,
+    dx: Optional[Sequence[str]] = None,
+    risk_band: str = "Todos",
+    gaps: Optional[Sequence[str]] = None,
+) -> pd.Series:
+    """
+    Máscara booleana de cohorte (misma lógica que cohort_builder, sin UI).
+    `sex`/`region` en None = sin filtro; `dx`/`gaps` vacíos = sin filtro.
+    `gaps`: códigos de brecha (alguna de ellas), vía el bitmask `gap_mask`.
+    """
+    age_min, age_max = age_range
+    mask = df["age"].between(age_min, age_max)
+    if sex is not None:
+        mask &= df["sex"].isin(sex)
+    if region is not None:
+        mask &= df["region"].isin(region)
+    if dx:
+        mask &= df["dx_cie10"].str.contains("|".join(dx))
+    if risk_band == "Bajo (<0.15)":
+        mask &= df["risk_factor"] < 0.15
+    elif risk_band == "Medio (0.15-0.3)":
+        mask &= df["risk_factor"].between(0.15, 0.3)
+    elif risk_band == "Alto (≥0.3)":
+        mask &= df["risk_factor"] >= 0.3
+    if gaps:
+        mask &= has_gaps(df["gap_mask"].to_numpy(), gaps)
+    return mask
+
+def cohort_description(age_range, sex, region, dx, risk_band, gaps=None) -> str:
+    age_min, age_max = age_range
+    n_regions = len(region) if region is not None else "todas"
+    desc = (
+        f"Edad {age_min}-{age_max}, Sexos {','.join(sex or [])}, Regiones {n_regions}, "
+        f"Dx {','.join(dx) if dx else '—'}, Banda {risk_band}"
+    )
+    if gaps:
+        desc += f", Brechas {','.join(gaps)}"
+    return desc
@@ -0,0 +1,208 @@
+# utils/kernels.py
+# ---------------------------------------------------------------------
+# Kernels opcionales con Numba (JIT, parallel=True) y fallback NumPy.
+# - score_curves: score lineal + sigmoide + clip + forma k por banda +
+#   λ Weibull + curva 12m + ventana 25/75 % en UNA pasada por fila (sin
+#   los temporales (n,) / (n, 12) de la versión vectorizada).
+# - group_sums: conteo/suma por grupo (código entero plano) con
+#   histogramas parciales por hilo; base de los groupbys del Dashboard.
+# Backend: CORPUS_KERNELS = numpy (defecto) | numba (opt-in; sin Numba
+# instalado o sin OpenMP cae a numpy). Medido con Numba 0.68 (omp) en
+# 1 CPU, 1e6 filas: score_curves 0,71 s contra 0,39 s en NumPy
+# (exp/log/pow vectorizados le ganan al bucle por fila con un solo
+# hilo) y grouped 20 ms contra 32 ms. Por eso Numba no se activa solo;
+# con varios núcleos conviene medir con benchmarks/kernels.py antes.
+# Numba se importa y compila en el primer uso, no al importar este
+# módulo. Cada kernel sale de una fábrica que recibe `prange`:
+# con range es Python válido (referencia de las comprobaciones de
+# equivalencia, benchmarks/kernels.py) y con numba.prange es lo que se
+# compila; el estado del módulo no cambia al compilar.
+# ---------------------------------------------------------------------
+
+import math
+import os
+from typing import Dict, Optional
+
+import numpy as np
+
+BACKEND_ENV = "CORPUS_KERNELS"
+
+_STATE: Dict[str, object] = {"backend": None}
+_JIT: Dict[str, object] = {}
+
+
+def _numba_usable() -> bool:
+    """
+    Numba importable y con capa de hilos OpenMP. Streamlit corre cada
+    sesión en su propio hilo, y con las capas workqueue / tbb (medido con
+    Numba 0.68) el proceso se cuelga al salir si el pool arrancó fuera
+    del hilo principal; omp no. NUMBA_THREADING_LAYER explícita manda.
+    """
+    try:
+        import numba
+        if "NUMBA_THREADING_LAYER" not in os.environ:
+            import numba.np.ufunc.omppool  # noqa: F401  (ImportError sin libgomp)
+            numba.config.THREADING_LAYER = "omp"
+    except ImportError:
+        return False
+    return True
+
+def backend() -> str:
+    """'numba' o 'numpy' (leído una vez de CORPUS_KERNELS; ver set_backend)."""
+    if _STATE["backend"] is None:
+        want = os.environ.get(BACKEND_ENV, "numpy").strip().lower()
+        _STATE["backend"] = "numba" if want == "numba" and _numba_usable() else "numpy"
+    return _STATE["backend"]
+
+def set_backend(name: Optional[str]) -> str:
+    """Fuerza 'numba'/'numpy' (None = volver a detectar). 'numba' sin Numba -> 'numpy'."""
+    _STATE["backend"] = None
+    if name is None:
+        return backend()
+    if name == "numba" and not _numba_usable():
+        name = "numpy"
+    _STATE["backend"] = name
+    return name
+
+def _jit(factory):
+    """Kernel de `factory(prange)` compilado con numba.prange (njit parallel, cache en disco)."""
+    compiled = _JIT.get(factory.__name__)
+    if compiled is None:
+        import numba
+        compiled = numba.njit(parallel=True, cache=True, nogil=True)(factory(numba.prange))
+        _JIT[factory.__name__] = compiled
+    return compiled
+
+
+# ---------------------------
+# Scoring + curvas Weibull
+# ---------------------------
+def _score_curves_factory(prange):
+    """Kernel por fila de score_curves; `prange` = range (Python) o numba.prange."""
+    def _score_curves_kernel(X, w, intercept, uplift, scale, lo, hi, noise, cuts, kvals, months,
+                             out, cum):
+        n, p = X.shape
+        nc = cuts.shape[0]
+        for i in prange(n):
+            s = intercept
+            for j in range(p):
+                s += w[j] * X[i, j]
+            s = (s + uplift[i]) * scale
+            r = 1.0 / (1.0 + math.exp(-s))
+            r = min(max(r, lo), hi)
+            kb = kvals[nc]
+            for c in range(nc):
+                if r < cuts[c]:
+                    kb = kvals[c]
+                    break
+            k = min(max(kb + noise[i], 0.6), 1.7)
+            c12 = min(max(r, 0.02), 0.95)
+            lam = (-math.log1p(-min(max(c12, 1e-6), 0.999))) ** (1.0 / k) / 12.0
+            for m in range(months.shape[0]):
+                cum[i, m] = min(-math.expm1(-(lam * months[m]) ** k), 0.95)
+            out[0, i] = r
+            out[1, i] = k
+            out[2, i] = lam
+            out[3, i] = (-math.log1p(-0.25 * c12)) ** (1.0 / k) / lam
+            out[4, i] = (-math.log1p(-0.75 * c12)) ** (1.0 / k) / lam
+    return _score_curves_kernel
+
+_score_curves_kernel = _score_curves_factory(range)   # referencia en Python puro
+
+def _score_curves_numpy(X, w, intercept, uplift, scale, lo, hi, noise, cuts, kvals, months):
+    from utils import weibull
+    s = np.full(X.shape[0], intercept, dtype=float)
+    for j in range(X.shape[1]):
+        s += w[j] * X[:, j]
+    s = (s + uplift) * scale
+    risk = np.clip(1.0 / (1.0 + np.exp(-s)), lo, hi)
+    k = np.select([risk < c for c in cuts], kvals[:-1], default=kvals[-1])
+    k = np.clip(k + noise, 0.6, 1.7)
+    c12 = np.clip(risk, 0.02, 0.95)
+    lam = weibull.weibull_lambda(c12, k)
+    cum = np.fmin(0.95, weibull.cum_risk(months[None, :], lam[:, None], k[:, None]))
+    tw_start, tw_end = weibull.risk_window(c12, lam, k)
+    return {"risk": risk, "k": k, "lam": lam, "cum": cum, "tw_start": tw_start, "tw_end": tw_end}
+
+def score_curves(X, w, intercept, uplift, scale, clip, noise, cuts, kvals, months) -> Dict[str, np.ndarray]:
+    """
+    X (n, p) features, w (p,) pesos, uplift (n,) regional, noise (n,) jitter de k.
+    -> {risk, k, lam, cum (n, m), tw_start, tw_end}. Mismo resultado con
+    ambos backends (salvo el último ulp de exp/log).
+    """
+    X = np.ascontiguousarray(X, dtype=np.float64)
+    args = (np.asarray(w, dtype=np.float64), float(intercept), np.asarray(uplift, dtype=np.float64),
+            float(scale), float(clip[0]), float(clip[1]), np.asarray(noise, dtype=np.float64),
+            np.asarray(cuts, dtype=np.float64), np.asarray(kvals, dtype=np.float64),
+            np.asarray(months, dtype=np.float64))
+    if backend() != "numba":
+        return _score_curves_numpy(X, *args)
+    n = X.shape[0]
+    out = np.empty((5, n))
+    cum = np.empty((n, len(args[-1])))
+    _jit(_score_curves_factory)(X, *args, out, cum)
+    return {"risk": out[0], "k": out[1], "lam": out[2], "cum": cum, "tw_start": out[3], "tw_end": out[4]}
+
+
+# ---------------------------
+# Agregación por grupo
+# ---------------------------
+def _group_sums_factory(prange):
+    """Histogramas parciales por chunk (un chunk por hilo con numba.prange)."""
+    def _group_sums_kernel(codes, n_groups, values, weights, n_chunks, part):
+        n = codes.shape[0]
+        step = (n + n_chunks - 1) // n_chunks
+        for t in prange(n_chunks):
+            for i in range(t * step, min(n, (t + 1) * step)):
+                g = codes[i]
+                if g < 0:
+                    continue
+                wi = weights[i]
+                part[t, 0, g] += wi
+                v = values[i]
+                if v == v:  # no NaN
+                    part[t, 1, g] += wi * v
+                    part[t, 2, g] += wi
+    return _group_sums_kernel
+
+_group_sums_kernel = _group_sums_factory(range)
+
+def group_sums(codes, n_groups: int, values=None, weights=None) -> Dict[str, np.ndarray]:
+    """
+    Por grupo (códigos 0..n_groups-1; < 0 se ignora):
+      size  = Σ pesos (conteo si no hay pesos)
+      vsum  = Σ peso·valor (valores no-NaN)
+      vn    = Σ pesos con valor no-NaN   (media = vsum / vn)
+    """
+    codes = np.asarray(codes, dtype=np.int64)
+    n = len(codes)
+    if backend() == "numba" and n:
+        import numba
+        vals = np.zeros(n) if values is None else np.asarray(values, dtype=np.float64)
+        wts = np.ones(n) if weights is None else np.asarray(weights, dtype=np.float64)
+        n_chunks = max(1, min(numba.get_num_threads(), n // 50_000 + 1))
+        part = np.zeros((n_chunks, 3, n_groups))
+        _jit(_group_sums_factory)(codes, n_groups, vals, wts, n_chunks, part)
+        size, vsum, vn = part.sum(axis=0)
+        return {"size": size, "vsum": vsum, "vn": vn}
+
+    # NumPy: np.bincount, filtrando sólo si hace falta (códigos < 0 / NaN)
+    vals = None if values is None else np.asarray(values, dtype=np.float64)
+    wts = None if weights is None else np.asarray(weights, dtype=np.float64)
+    ok = codes >= 0
+    if not ok.all():
+        codes = codes[ok]
+        vals = None if vals is None else vals[ok]
+        wts = None if wts is None else wts[ok]
+    size = np.bincount(codes, weights=wts, minlength=n_groups).astype(np.float64)
+    if vals is None:
+        return {"size": size, "vsum": np.zeros(n_groups), "vn": np.zeros(n_groups)}
+    valid = ~np.isnan(vals)
+    if valid.all():
+        vn = size
+    else:
+        codes, vals = codes[valid], vals[valid]
+        wts = None if wts is None else wts[valid]
+        vn = np.bincount(codes, weights=wts, minlength=n_groups).astype(np.float64)
+    vsum = np.bincount(codes, weights=vals if wts is None else wts * vals, minlength=n_groups)
+    return {"size": size, "vsum": vsum, "vn": vn}
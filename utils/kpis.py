@@ -1,36 +1,212 @@
 # utils/kpis.py
 import numpy as np
-import pandas as pd
+
+from utils.profiling import traced
+
+HIGH_RISK_CUT = 0.3
+UPC_MENSUAL = 30.0  # dummy: UPC mensual promedio
 
 def pct(x):
     return f"{100*x:.1f}%"
 
-def compute_core_kpis(df, country="Colombia - EPS"):
-    n = len(df)
-    high_risk = (df["risk_factor"] >= 0.3).mean() if n else 0
-    pmpm = float(df["cost_12m"].sum() / max(1, n) / 12)
-    upc = 30.0  # dummy: UPC mensual promedio
-    loss_ratio = float(df["cost_12m"].sum() / (n * 12 * upc)) if n else 0.0
-    controlled_htn = (df["hta_control"] == 1).mean() if "hta_control" in df else 0.0
-    event_rate_12m = df["risk_factor"].mean() if "risk_factor" in df else 0.0
-
-    if "México" in country:
-        return {
-            "Población": n,
-            "% Alto riesgo": pct(high_risk),
-            "Loss ratio (sim.)": pct(loss_ratio),
-            "Severidad prom. siniestro": f"${df['cost_event'].mean():,.0f}",
-            "Eventos esperados 12m": f"{event_rate_12m*n:,.0f}",
-        }
-    else:
+def _div(num, den, default=float("nan")):
+    return num / den if den else default
+
+def _col(df, name):
+    """Columna como ndarray float (None si no existe)."""
+    if name not in df:
+        return None
+    return np.asarray(df[name], dtype=float)
+
+# ---------------------------------------------------------------------
+# Acumulador de KPIs: una sola pasada columnar y estados combinables.
+# Cada chunk/partición/proceso llena su propio acumulador y luego se
+# combinan con merge(); los conteos son enteros y las sumas float64,
+# de modo que el resultado no depende del orden de los chunks (salvo
+# el redondeo de punto flotante de las sumas).
+# ---------------------------------------------------------------------
+class KPIAccumulator:
+    """Estado parcial de los KPIs EPS/SGMM (sumas y conteos)."""
+
+    __slots__ = (
+        "n", "n_high", "cost_12m_sum", "hta_control_n", "has_hta_control",
+        "risk_sum", "risk_n", "cost_event_sum", "cost_event_n",
+    )
+
+    def __init__(self):
+        self.n = 0                   # filas (afiliados)
+        self.n_high = 0              # risk_factor >= HIGH_RISK_CUT
+        self.cost_12m_sum = 0.0
+        self.hta_control_n = 0       # hta_control == 1
+        self.has_hta_control = False
+        self.risk_sum = 0.0          # suma de risk_factor válidos
+        self.risk_n = 0
+        self.cost_event_sum = 0.0    # suma de cost_event válidos
+        self.cost_event_n = 0
+
+    def update(self, df) -> "KPIAccumulator":
+        """Agrega un DataFrame (o chunk) recorriendo cada columna una vez."""
+        n = len(df)
+        self.n += n
+        if n == 0:
+            return self
+
+        risk = _col(df, "risk_factor")
+        if risk is not None:
+            valid = ~np.isnan(risk)
+            self.risk_n += int(valid.sum())
+            self.risk_sum += float(risk[valid].sum())
+            self.n_high += int((risk[valid] >= HIGH_RISK_CUT).sum())
+
+        cost = _col(df, "cost_12m")
+        if cost is not None:
+            self.cost_12m_sum += float(np.nansum(cost))
+
+        hta = _col(df, "hta_control")
+        if hta is not None:
+            self.has_hta_control = True
+            self.hta_control_n += int((hta == 1).sum())
+
+        sev = _col(df, "cost_event")
+        if sev is not None:
+            valid = ~np.isnan(sev)
+            self.cost_event_n += int(valid.sum())
+            self.cost_event_sum += float(sev[valid].sum())
+        return self
+
+    def merge(self, other: "KPIAccumulator") -> "KPIAccumulator":
+        """Combina otro estado parcial en este (in place)."""
+        for k in self.__slots__:
+            if k == "has_hta_control":
+                self.has_hta_control = self.has_hta_control or other.has_hta_control
+            else:
+                setattr(self, k, getattr(self, k) + getattr(other, k))
+        return self
+
+    def __add__(self, other: "KPIAccumulator") -> "KPIAccumulator":
+        return KPIAccumulator().merge(self).merge(other)
+
+    def subtract(self, other: "KPIAccumulator") -> "KPIAccumulator":
+        """Quita filas ya agregadas (p.ej. las que cambian entre snapshots), in place."""
+        for k in self.__slots__:
+            if k != "has_hta_control":
+                setattr(self, k, getattr(self, k) - getattr(other, k))
+        return self
+
+    def __sub__(self, other: "KPIAccumulator") -> "KPIAccumulator":
+        return KPIAccumulator().merge(self).subtract(other)
+
+    def to_dict(self) -> dict:
+        """Estado serializable (p.ej. para devolverlo desde un worker)."""
+        return {k: getattr(self, k) for k in self.__slots__}
+
+    @classmethod
+    def from_dict(cls, state: dict) -> "KPIAccumulator":
+        acc = cls()
+        for k in cls.__slots__:
+            if k in state:
+                setattr(acc, k, state[k])
+        return acc
+
+    def values(self) -> dict:
+        """KPIs numéricos (sin formato)."""
+        n = self.n
         return {
-            "Población": n,
-            "% Alto riesgo": pct(high_risk),
-            "PMPM": f"${pmpm:,.0f}",
-            "Siniestralidad UPC (sim.)": pct(loss_ratio),
-            "% HTA control": pct(controlled_htn),
+            "n": n,
+            "high_risk": _div(self.n_high, n, 0),
+            "pmpm": float(self.cost_12m_sum / max(1, n) / 12),
+            "loss_ratio": float(_div(self.cost_12m_sum, n * 12 * UPC_MENSUAL, 0.0)),
+            "controlled_htn": _div(self.hta_control_n, n) if self.has_hta_control else 0.0,
+            "event_rate_12m": _div(self.risk_sum, self.risk_n, 0.0),
+            "severity": _div(self.cost_event_sum, self.cost_event_n),
         }
 
+    def format(self, country="Colombia - EPS") -> dict:
+        """KPIs con el formato de tarjetas según país/modelo."""
+        v = self.values()
+        n = v["n"]
+        if "México" in country:
+            return {
+                "Población": n,
+                "% Alto riesgo": pct(v["high_risk"]),
+                "Loss ratio (sim.)": pct(v["loss_ratio"]),
+                "Severidad prom. siniestro": f"${v['severity']:,.0f}",
+                "Eventos esperados 12m": f"{v['event_rate_12m']*n:,.0f}",
+            }
+        else:
+            return {
+                "Población": n,
+                "% Alto riesgo": pct(v["high_risk"]),
+                "PMPM": f"${v['pmpm']:,.0f}",
+                "Siniestralidad UPC (sim.)": pct(v["loss_ratio"]),
+                "% HTA control": pct(v["controlled_htn"]),
+            }
+
+def accumulate_kpis(chunks) -> KPIAccumulator:
+    """Acumula un iterable de DataFrames (chunks) en un solo estado."""
+    acc = KPIAccumulator()
+    for chunk in chunks:
+        acc.update(chunk)
+    return acc
+
+@traced("kpis.core", "kpis")
+def compute_core_kpis(df, country="Colombia - EPS"):
+    return KPIAccumulator().update(df).format(country)
+
+# ---------------------------------------------------------------------
+# KPIs de la cohorte activa (Dashboard): exactos sobre todas las filas o
+# estimados con IC 95 % desde una utils.sampling.StratifiedSample.
+# ---------------------------------------------------------------------
+COHORT_KPI_FORMATS = {
+    "Riesgo medio 12m": "{:.3f}".format,
+    "% Alto riesgo": pct,
+    "Costo 12m medio": "${:,.0f}".format,
+    "% Con brecha": pct,
+}
+
+def _cohort_metrics(src) -> dict:
+    risk = _col(src, "risk_factor")
+    out = {
+        "Riesgo medio 12m": risk,
+        "% Alto riesgo": (risk >= HIGH_RISK_CUT).astype(float),
+        "Costo 12m medio": _col(src, "cost_12m"),
+    }
+    if "gap_mask" in src:
+        out["% Con brecha"] = (np.asarray(src["gap_mask"]) != 0).astype(float)
+    return {k: v for k, v in out.items() if v is not None}
+
+def cohort_kpis(src, sample=None) -> dict:
+    """
+    {kpi: {value, lo, hi}} de la cohorte `src` (DataFrame o CohortView).
+    Con `sample`, `src` son las filas muestreadas y lo/hi es el IC 95 %;
+    sin ella, valor exacto (lo = hi = None).
+    """
+    out = {}
+    for k, v in _cohort_metrics(src).items():
+        if sample is not None:
+            out[k] = sample.mean(v)
+        else:
+            out[k] = {"value": float(np.nanmean(v)) if len(v) else float("nan"), "lo": None, "hi": None}
+    return out
+
+def format_cohort_kpis(values: dict) -> tuple:
+    """-> (tarjetas {kpi: texto}, ayudas {kpi: 'IC 95 %: lo – hi'})."""
+    cards, helps = {}, {}
+    for k, v in values.items():
+        fmt = COHORT_KPI_FORMATS.get(k, "{:,.3f}".format)
+        cards[k] = fmt(v["value"])
+        if v.get("lo") is not None:
+            cards[k] = f"≈ {cards[k]}"
+            helps[k] = f"IC 95 %: {fmt(max(v['lo'], 0.0))} – {fmt(v['hi'])}"
+    return cards, helps
+
+def risk_percentile_cards(dist) -> dict:
+    """Tarjetas de percentiles de riesgo desde una RiskDistribution combinada."""
+    cards = {"Afiliados (sketch)": f"{dist.n:,}"}
+    for name, v in dist.percentiles([0.25, 0.50, 0.75, 0.90, 0.99]).items():
+        cards[f"Riesgo {name.upper()}"] = f"{v:.3f}"
+    return cards
+
 def quick_roi(events_avoided, cost_event=2_000_000, program_cost=50_000_000):
     ahorro_bruto = events_avoided * cost_event
     roi = (ahorro_bruto - program_cost) / max(1, program_cost)
@@ -0,0 +1,79 @@
+# utils/memory.py
+# ---------------------------------------------------------------------
+# Contabilidad de memoria: bytes retenidos por sesión (st.session_state)
+# y por caches del proceso (compartidas entre sesiones).
+# - sizeof(obj): tamaño profundo aproximado (DataFrame/Series con
+#   memory_usage(deep=True), ndarray/Arrow con nbytes, CohortView con
+#   sus bytes propios, contenedores recursivos).
+# - register_cache(name, fn): hook para que una cache reporte sus bytes
+#   (fn() -> objeto a medir, o int con bytes ya calculados).
+# ---------------------------------------------------------------------
+
+import sys
+from typing import Any, Callable, Dict, List, Mapping
+
+_CACHES: Dict[str, Callable[[], Any]] = {}
+
+
+def sizeof(obj: Any, _seen=None) -> int:
+    """Bytes aproximados retenidos por `obj` (sin contar objetos ya vistos)."""
+    seen = _seen if _seen is not None else set()
+    oid = id(obj)
+    if oid in seen:
+        return 0
+    seen.add(oid)
+
+    nbytes_fn = getattr(obj, "nbytes", None)
+    mod = type(obj).__module__ or ""
+    if mod.startswith("pandas"):
+        if hasattr(obj, "memory_usage"):
+            mu = obj.memory_usage(deep=True, index=True)
+            return int(mu.sum() if hasattr(mu, "sum") else mu)
+        return sys.getsizeof(obj)
+    if callable(nbytes_fn):  # CohortView
+        return int(nbytes_fn())
+    if nbytes_fn is not None and (mod.startswith("numpy") or mod.startswith("pyarrow")):
+        return int(nbytes_fn)
+    if isinstance(obj, Mapping):
+        return sys.getsizeof(obj) + sum(sizeof(k, seen) + sizeof(v, seen) for k, v in obj.items())
+    if isinstance(obj, (list, tuple, set, frozenset)):
+        return sys.getsizeof(obj) + sum(sizeof(v, seen) for v in obj)
+    slots = getattr(type(obj), "__slots__", None)
+    if slots and not isinstance(obj, (str, bytes)):
+        return sys.getsizeof(obj) + sum(sizeof(getattr(obj, s, None), seen) for s in slots)
+    if hasattr(obj, "__dict__") and not isinstance(obj, type):
+        return sys.getsizeof(obj) + sizeof(vars(obj), seen)
+    return sys.getsizeof(obj)
+
+def session_memory(state: Mapping) -> List[Dict]:
+    """Bytes por clave de la sesión, de mayor a menor."""
+    rows = []
+    for k in list(state.keys()):
+        try:
+            v = state[k]
+        except KeyError:
+            continue
+        rows.append({"clave": str(k), "tipo": type(v).__name__, "bytes": sizeof(v)})
+    return sorted(rows, key=lambda r: -r["bytes"])
+
+def register_cache(name: str, fn: Callable[[], Any]) -> None:
+    """Registra una cache del proceso; `fn` devuelve el objeto (o los bytes)."""
+    _CACHES[name] = fn
+
+def cache_memory() -> List[Dict]:
+    """Bytes por cache registrada (compartidas por todas las sesiones)."""
+    rows = []
+    for name, fn in list(_CACHES.items()):
+        try:
+            obj = fn()
+            b = obj if isinstance(obj, int) else sizeof(obj)
+        except Exception:
+            b = 0
+        rows.append({"cache": name, "bytes": int(b)})
+    return sorted(rows, key=lambda r: -r["bytes"])
+
+def fmt_bytes(n: float) -> str:
+    for unit in ("B", "KB", "MB", "GB"):
+        if abs(n) < 1024 or unit == "GB":
+            return f"{n:,.0f} {unit}" if unit == "B" else f"{n:,.1f} {unit}"
+        n /= 1024
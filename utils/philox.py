@@ -0,0 +1,48 @@
+# utils/philox.py
+# ---------------------------------------------------------------------
+# Philox4x32-10 (Random123, Salmon et al. 2011) vectorizado en NumPy.
+# RNG basado en contador: la salida es una función pura de
+# (clave, contador), así que el número j del afiliado i se calcula
+# directamente, sin recorrer los afiliados 0..i-1 ni compartir estado.
+#   clave    = semilla (64 bits)
+#   contador = (índice lo, índice hi, bloque, stream)
+# Cada bloque entrega 4 palabras de 32 bits.
+# ---------------------------------------------------------------------
+
+import numpy as np
+
+_M0 = np.uint64(0xD2511F53)
+_M1 = np.uint64(0xCD9E8D57)
+_W0 = 0x9E3779B9
+_W1 = 0xBB67AE85
+_MASK = np.uint64(0xFFFFFFFF)
+_SHIFT = np.uint64(32)
+ROUNDS = 10
+
+
+def philox4x32(c0, c1, c2, c3, key: int, rounds: int = ROUNDS):
+    """Bloques Philox4x32 (arrays uint32 con broadcasting) -> 4 arrays uint32."""
+    c0, c1, c2, c3 = (np.asarray(c, dtype=np.uint64) for c in (c0, c1, c2, c3))
+    c0, c1, c2, c3 = np.broadcast_arrays(c0, c1, c2, c3)
+    k0, k1 = key & 0xFFFFFFFF, (key >> 32) & 0xFFFFFFFF
+    for r in range(rounds):
+        if r:
+            k0, k1 = (k0 + _W0) & 0xFFFFFFFF, (k1 + _W1) & 0xFFFFFFFF
+        p0 = _M0 * c0
+        p1 = _M1 * c2
+        c0, c1, c2, c3 = ((p1 >> _SHIFT) ^ c1 ^ np.uint64(k0), p1 & _MASK,
+                          (p0 >> _SHIFT) ^ c3 ^ np.uint64(k1), p0 & _MASK)
+    return tuple(c.astype(np.uint32) for c in (c0, c1, c2, c3))
+
+def uniforms(key: int, index, n_words: int, stream: int = 0) -> np.ndarray:
+    """
+    Uniformes en (0, 1) -> array (n_words, len(index)); la fila j es el
+    número j de cada índice. Misma (key, índice, stream) => mismos valores,
+    sin importar qué otros índices se pidan ni en qué orden.
+    """
+    idx = np.asarray(index, dtype=np.uint64).ravel()
+    blocks = -(-n_words // 4)
+    b = np.arange(blocks, dtype=np.uint64)[:, None]
+    words = philox4x32(idx & _MASK, idx >> _SHIFT, b, stream, int(key))
+    out = np.stack(words, axis=1).reshape(blocks * 4, len(idx))[:n_words]
+    return (out + 0.5) * (1.0 / 4294967296.0)
@@ -0,0 +1,155 @@
+# utils/profiling.py
+# ---------------------------------------------------------------------
+# Instrumentación ligera de rutas calientes (spans + contadores).
+# - Una traza por rerun y por hilo (Streamlit ejecuta cada sesión en su
+#   propio hilo), activada con begin_trace(...). Sin traza activa,
+#   span() devuelve un context manager nulo compartido: el costo en
+#   producción es un getattr por llamada.
+# - Exporta a JSON o a formato Chrome trace (chrome://tracing, Perfetto).
+# ---------------------------------------------------------------------
+
+import functools
+import json
+import os
+import threading
+import time
+from typing import Dict, List, Optional
+
+_local = threading.local()
+
+ENV_FLAG = "CORPUS_PROFILING"
+
+
+def enabled_by_env() -> bool:
+    return os.environ.get(ENV_FLAG, "").strip().lower() in ("1", "true", "yes", "on")
+
+
+class Trace:
+    """Spans y contadores de un rerun."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.t0 = time.perf_counter()
+        self.wall_start = time.time()
+        self.spans: List[Dict] = []
+        self.counters: Dict[str, float] = {}
+        self._depth = 0
+        self.tid = threading.get_ident()
+
+    @property
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.t0
+
+    def count(self, name: str, value: float = 1) -> None:
+        self.counters[name] = self.counters.get(name, 0) + value
+
+    def to_dict(self) -> Dict:
+        return {
+            "name": self.name,
+            "wall_start": self.wall_start,
+            "total_ms": self.elapsed * 1e3,
+            "spans": self.spans,
+            "counters": self.counters,
+        }
+
+    def to_json(self) -> str:
+        return json.dumps(self.to_dict(), indent=2, default=str)
+
+    def to_chrome_trace(self) -> str:
+        """Eventos 'X' (complete) en microsegundos, formato Trace Event."""
+        events = [{
+            "name": s["name"], "cat": s["cat"] or "app", "ph": "X",
+            "ts": s["start_ms"] * 1e3, "dur": s["dur_ms"] * 1e3,
+            "pid": os.getpid(), "tid": self.tid, "args": s["args"],
+        } for s in self.spans]
+        for k, v in self.counters.items():
+            events.append({"name": k, "ph": "C", "ts": self.elapsed * 1e6,
+                           "pid": os.getpid(), "tid": self.tid, "args": {k: v}})
+        return json.dumps({"traceEvents": events, "displayTimeUnit": "ms",
+                           "otherData": {"trace": self.name}}, default=str)
+
+
+class _Span:
+    __slots__ = ("trace", "name", "cat", "args", "start", "depth")
+
+    def __init__(self, trace: Trace, name: str, cat: str, args: Dict):
+        self.trace, self.name, self.cat, self.args = trace, name, cat, args
+
+    def set(self, **kw) -> None:
+        self.args.update(kw)
+
+    def __enter__(self):
+        self.depth = self.trace._depth
+        self.trace._depth += 1
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        end = time.perf_counter()
+        tr = self.trace
+        tr._depth -= 1
+        tr.spans.append({
+            "name": self.name, "cat": self.cat, "depth": self.depth,
+            "start_ms": (self.start - tr.t0) * 1e3, "dur_ms": (end - self.start) * 1e3,
+            "args": self.args,
+        })
+        return False
+
+
+class _NullSpan:
+    __slots__ = ()
+
+    def set(self, **kw) -> None:
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL = _NullSpan()
+
+
+# ---------------------------
+# API pública
+# ---------------------------
+def begin_trace(name: str, enabled: bool = True) -> Optional[Trace]:
+    """Inicia la traza del hilo actual (o la desactiva si enabled=False)."""
+    tr = Trace(name) if enabled else None
+    _local.trace = tr
+    return tr
+
+def end_trace() -> Optional[Trace]:
+    tr = getattr(_local, "trace", None)
+    _local.trace = None
+    return tr
+
+def current_trace() -> Optional[Trace]:
+    return getattr(_local, "trace", None)
+
+def span(name: str, cat: str = "", **args):
+    """Context manager de timing; no-op si no hay traza activa."""
+    tr = getattr(_local, "trace", None)
+    if tr is None:
+        return _NULL
+    return _Span(tr, name, cat, args)
+
+def count(name: str, value: float = 1) -> None:
+    tr = getattr(_local, "trace", None)
+    if tr is not None:
+        tr.count(name, value)
+
+def traced(name: str, cat: str = ""):
+    """Decorador: envuelve la función en un span con el nombre dado."""
+    def deco(fn):
+        @functools.wraps(fn)
+        def wrapper(*a, **kw):
+            tr = getattr(_local, "trace", None)
+            if tr is None:
+                return fn(*a, **kw)
+            with _Span(tr, name, cat, {}):
+                return fn(*a, **kw)
+        return wrapper
+    return deco
@@ -0,0 +1,125 @@
+# utils/sampling.py
+# ---------------------------------------------------------------------
+# Muestreo estratificado determinista + estimadores con IC (modo
+# progresivo del Dashboard).
+# - Estratos = combinaciones de columnas categóricas (p.ej. región ×
+#   banda de riesgo); asignación proporcional con un mínimo por estrato.
+# - Determinista: dentro de cada estrato se toman las filas de menor
+#   prioridad Philox(seed, posición en el frame base), así la muestra de
+#   una cohorte es estable entre reruns y entre filtros que la contienen.
+# - Estimadores de media/proporción/total con varianza estratificada y
+#   corrección por población finita.
+# ---------------------------------------------------------------------
+
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Dict, Sequence
+
+import numpy as np
+import pandas as pd
+
+from utils.philox import uniforms
+
+Z95 = 1.959963984540054
+
+_REFINE = ThreadPoolExecutor(max_workers=2, thread_name_prefix="refine")
+
+
+def stratum_codes(src, columns: Sequence[str]) -> np.ndarray:
+    """Código entero de estrato por fila (`src` = DataFrame o CohortView)."""
+    codes = np.zeros(len(src), dtype=np.int64)
+    for c in columns:
+        col = pd.Categorical(src[c])
+        codes = codes * (len(col.categories) + 1) + (col.codes + 1)
+    if not len(codes):
+        return codes
+    present = np.bincount(codes) > 0          # compacta a 0..H-1 (sin ordenar n filas)
+    return (np.cumsum(present) - 1)[codes]
+
+
+class StratifiedSample:
+    """Posiciones muestreadas + tamaños por estrato (N_h, n_h) y pesos N_h/n_h."""
+
+    __slots__ = ("positions", "strata", "N_h", "n_h")
+
+    def __init__(self, positions: np.ndarray, strata: np.ndarray, N_h: np.ndarray, n_h: np.ndarray):
+        self.positions = positions
+        self.strata = strata
+        self.N_h = N_h
+        self.n_h = n_h
+
+    def __len__(self) -> int:
+        return len(self.positions)
+
+    @property
+    def N(self) -> int:
+        return int(self.N_h.sum())
+
+    @property
+    def weights(self) -> np.ndarray:
+        return (self.N_h / np.maximum(self.n_h, 1))[self.strata]
+
+    def mean(self, values) -> Dict[str, float]:
+        """Media estratificada -> {value, se, lo, hi} (IC 95 %)."""
+        y = np.asarray(values, dtype=float)
+        h = len(self.N_h)
+        n_h = np.bincount(self.strata, minlength=h).astype(float)
+        s1 = np.bincount(self.strata, weights=y, minlength=h)
+        s2 = np.bincount(self.strata, weights=y * y, minlength=h)
+        ok = n_h > 0
+        ybar = np.divide(s1, n_h, out=np.zeros(h), where=ok)
+        var_h = np.divide(s2 - n_h * ybar ** 2, n_h - 1, out=np.zeros(h), where=n_h > 1)
+        W = self.N_h / max(self.N, 1)
+        est = float((W * ybar).sum())
+        fpc = 1.0 - np.divide(n_h, self.N_h, out=np.ones(h), where=self.N_h > 0)
+        se = float(np.sqrt(np.sum(np.divide(W ** 2 * fpc * np.maximum(var_h, 0.0), n_h,
+                                            out=np.zeros(h), where=ok))))
+        return {"value": est, "se": se, "lo": est - Z95 * se, "hi": est + Z95 * se}
+
+    def proportion(self, mask) -> Dict[str, float]:
+        return self.mean(np.asarray(mask, dtype=float))
+
+    def total(self, values) -> Dict[str, float]:
+        return {k: v * self.N for k, v in self.mean(values).items()}
+
+
+def stratified_sample(strata: np.ndarray, n: int, seed: int = 0, keys=None,
+                      min_per_stratum: int = 2) -> StratifiedSample:
+    """
+    Muestra estratificada de ~`n` filas (asignación proporcional, al menos
+    `min_per_stratum` por estrato si hay). `keys` = posiciones estables de
+    las filas (p.ej. CohortView.rows) para la prioridad Philox.
+    """
+    strata = np.asarray(strata, dtype=np.int64)
+    N = len(strata)
+    N_h = np.bincount(strata).astype(np.int64) if N else np.zeros(0, dtype=np.int64)
+    if N == 0 or n >= N:
+        return StratifiedSample(np.arange(N), strata, N_h, N_h.copy())
+    alloc = np.maximum(np.round(n * N_h / N).astype(np.int64), min_per_stratum)
+    n_h = np.minimum(alloc, N_h)
+
+    keys = np.arange(N) if keys is None else np.asarray(keys)
+    prio = uniforms(seed, keys, 1)[0]
+    order = np.argsort(strata + prio)  # estrato, luego prioridad (prio en (0, 1))
+    start = np.concatenate([[0], np.cumsum(N_h)[:-1]])
+    rank = np.arange(N) - start[strata[order]]
+    take = np.sort(order[rank < n_h[strata[order]]])
+    return StratifiedSample(take, strata[take], N_h, n_h)
+
+def accuracy_rows(estimates: Dict[str, Dict[str, float]], exact: Dict[str, float]) -> list:
+    """Estimado vs exacto por métrica: error absoluto/relativo y si el IC cubre al exacto."""
+    rows = []
+    for k, e in estimates.items():
+        x = exact.get(k)
+        if x is None:
+            continue
+        rows.append({
+            "métrica": k, "estimado": e["value"], "exacto": x,
+            "error_abs": abs(e["value"] - x),
+            "error_rel": abs(e["value"] - x) / abs(x) if x else float("nan"),
+            "en_IC95": bool(e["lo"] <= x <= e["hi"]),
+        })
+    return rows
+
+def refine_in_background(fn: Callable, *args) -> Future:
+    """Cálculo exacto en un hilo aparte mientras se pinta la versión aproximada."""
+    return _REFINE.submit(fn, *args)
@@ -0,0 +1,57 @@
+# utils/weibull.py
+# ---------------------------------------------------------------------
+# Consultas en forma cerrada sobre curvas Weibull (vectorizadas):
+#   F(t) = 1 − exp(−(λ t)^k)            riesgo acumulado al mes t
+#   t(p) = (−ln(1 − p))^(1/k) / λ        mes en que F cruza p (inversa)
+#   h(t) = k λ (λ t)^(k−1)               hazard instantáneo
+#   E[eventos en (t0, t1]] = F(t1) − F(t0)   (por paciente; suma = población)
+# λ se fija para que F(12) = c12 (misma parametrización que
+# chart_data.weibull_cum). Todas aceptan escalares o arrays (n,).
+# ---------------------------------------------------------------------
+
+import numpy as np
+
+HORIZON = 12.0
+K_BOUNDS = (0.6, 1.7)
+C12_BOUNDS = (1e-6, 0.999)
+
+
+def weibull_lambda(c12, k):
+    """λ tal que F(12) = c12 (c12 y k recortados a C12_BOUNDS / K_BOUNDS)."""
+    c12 = np.clip(np.asarray(c12, dtype=float), *C12_BOUNDS)
+    k = np.clip(np.asarray(k, dtype=float), *K_BOUNDS)
+    return (-np.log1p(-c12)) ** (1.0 / k) / HORIZON
+
+def cum_risk(t, lam, k):
+    """F(t); con t (m,) y parámetros (n,) usa broadcasting explícito: t[None, :]."""
+    return -np.expm1(-(np.asarray(lam) * np.asarray(t, dtype=float)) ** np.asarray(k))
+
+def time_to_risk(p, lam, k, horizon: float = None):
+    """
+    Mes en que el riesgo acumulado cruza `p` (inversa cerrada).
+    p >= 1 -> inf. Con `horizon`, los cruces posteriores quedan en NaN.
+    """
+    p = np.asarray(p, dtype=float)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        t = (-np.log1p(-np.minimum(p, 1.0))) ** (1.0 / np.asarray(k)) / np.asarray(lam)
+    if horizon is not None:
+        t = np.where(t <= horizon, t, np.nan)
+    return t
+
+def hazard(t, lam, k):
+    """h(t) = k λ (λ t)^(k−1) (por mes)."""
+    lam, k = np.asarray(lam), np.asarray(k)
+    with np.errstate(divide="ignore"):
+        return k * lam * (lam * np.asarray(t, dtype=float)) ** (k - 1.0)
+
+def expected_events(t0, t1, lam, k):
+    """Probabilidad de evento en (t0, t1] por paciente (sumar = eventos esperados)."""
+    return cum_risk(t1, lam, k) - cum_risk(t0, lam, k)
+
+def risk_window(c12, lam, k, lo: float = 0.25, hi: float = 0.75):
+    """
+    Ventana temporal continua: meses en que se acumula del `lo` al `hi`
+    del riesgo a 12 meses (cuantiles de la curva truncada al horizonte).
+    """
+    c12 = np.asarray(c12, dtype=float)
+    return time_to_risk(lo * c12, lam, k), time_to_risk(hi * c12, lam, k)